@@ -0,0 +1,96 @@
+"""Time array work written as bim loops vs the native array methods (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+SIZE = 100000
+
+#built with typed array operations so that it takes little of the time measured
+SETUP = f'''
+a = ((from(range({SIZE})) * 37 + 11) / 3).to_array()
+a.reverse()
+function double(x) {{
+    return x * 2
+}}
+function big(x) {{
+    return x > {SIZE}
+}}
+function add(x, y) {{
+    return x + y
+}}
+'''
+
+PROGRAMS = {
+    "loop sum": '''
+total = 0
+for (x in a) {
+    total = total + x
+}
+''',
+    "native sum": '''
+total = a.sum()
+''',
+    "loop index_of": '''
+found = -1
+i = 0
+for (x in a) {
+    if (found == -1) {
+        if (x == 7) {
+            found = i
+        }
+    }
+    i = i + 1
+}
+''',
+    "native index_of": '''
+found = a.index_of(7)
+''',
+    "loop reverse": '''
+b = []
+i = a.length() - 1
+while (i >= 0) {
+    b.push(a[i])
+    i = i - 1
+}
+''',
+    "native reverse": '''
+b = a.slice(0)
+b.reverse()
+''',
+    "native sort": '''
+b = a.slice(0)
+b.sort()
+''',
+    "loop map+filter": '''
+b = []
+for (x in a) {
+    y = double(x)
+    if (big(y)) {
+        b.push(y)
+    }
+}
+''',
+    "native map+filter": '''
+b = a.map("double").filter("big")
+''',
+    "loop reduce": '''
+total = 0
+for (x in a) {
+    total = add(total, x)
+}
+''',
+    "native reduce": '''
+total = a.reduce("add", 0)
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(SETUP + PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>18}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""Measure the memory used by the parsed AST of a large program"""
+import sys
+import tracemalloc
+from bench_lexer import generate_source
+from bim.lexer import Lexer
+from bim.parser import Parser
+
+def ast_size(tokens, **parser_options):
+    """Return (statement count, bytes allocated while parsing that are still alive)"""
+    tracemalloc.start()
+    ast = Parser(tokens, **parser_options).parse_program()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(ast.statements), size
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = generate_source(copies)
+    tokens = Lexer(text).tokenize()
+    print(f"source size: {len(text) / 1e6:.2f} MB")
+
+    for label, options in (("interned constants", {}), ("no interning", {"intern_constants": False})):
+        statements, size = ast_size(tokens, **options)
+        print(f"{label:>18}: {statements} top-level statements, AST {size / 1e6:.1f} MB ({size / len(text):.1f}x source)")
+
+if __name__ == "__main__":
+    main()
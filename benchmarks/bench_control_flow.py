@@ -0,0 +1,77 @@
+"""Time continue-heavy loops and return-heavy recursion (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+PROGRAMS = {
+    "continue loop": '''
+count = 0
+for (i in range(200000)) {
+    if (i > 0) {
+        continue
+    }
+    count = count + 1
+}
+''',
+    "while continue": '''
+i = 0
+while (i < 100000) {
+    i = i + 1
+    if (i > 10) {
+        continue
+    }
+}
+''',
+    "break loops": '''
+found = 0
+for (i in range(2000)) {
+    for (j in range(100)) {
+        if (j == 3) {
+            break
+        }
+    }
+    found = found + 1
+}
+''',
+    "return recursion": '''
+function depth(n) {
+    if (n == 0) {
+        return 0
+    }
+    return depth(n - 1) + 1
+}
+total = 0
+for (k in range(2000)) {
+    total = total + depth(20)
+}
+''',
+    "small returns": '''
+function sign(x) {
+    if (x < 0) {
+        return -1
+    }
+    if (x > 0) {
+        return 1
+    }
+    return 0
+}
+total = 0
+for (i in range(60000)) {
+    total = total + sign(i - 30000)
+}
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    total = 0
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        total += elapsed
+        print(f"{name:>16}: {elapsed:.3f}s")
+    print(f"{'total':>16}: {total:.3f}s")
+
+if __name__ == "__main__":
+    main()
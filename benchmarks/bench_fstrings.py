@@ -0,0 +1,30 @@
+"""Time formatting log lines with + chains vs f-strings (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+LINES = 50000
+
+PROGRAMS = {
+    "+ chain": f'''
+for (i in range({LINES})) {{
+    line = "step " + i + ": x=" + i / 4 + ", y=" + i * 2 + ", ok=" + true
+}}
+''',
+    "f-string": f'''
+for (i in range({LINES})) {{
+    line = f"step {{i}}: x={{i / 4}}, y={{i * 2}}, ok={{true}}"
+}}
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>10}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Time loop-heavy programs on the interpreter (or another engine with --engine)"""
+import argparse
+import time
+from bim.lexer import Lexer
+from bim.parser import Parser
+from bim.interpreter import Interpreter
+from bim.closure_engine import ClosureInterpreter
+from bim.vm import VirtualMachine
+from bim.transpiler import TranspilingInterpreter
+
+ENGINES = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'vm': VirtualMachine,
+    'transpile': TranspilingInterpreter,
+}
+
+PROGRAMS = {
+    "while loop": '''
+i = 0
+total = 0
+while (i < 200000) {
+    total = total + i * 2 - 1
+    i = i + 1
+}
+''',
+    "nested for": '''
+count = 0
+for (i in range(300)) {
+    for (j in range(300)) {
+        if (j > i) {
+            count = count + 1
+        }
+    }
+}
+''',
+    "function calls": '''
+function fib(n) {
+    if (n < 2) {
+        return n
+    }
+    return fib(n - 1) + fib(n - 2)
+}
+result = fib(20)
+''',
+    "function loop": '''
+function sum_to(n) {
+    total = 0
+    i = 0
+    while (i < n) {
+        total = total + i * 2 - 1
+        i = i + 1
+    }
+    return total
+}
+result = 0
+for (k in range(20)) {
+    result = result + sum_to(10000)
+}
+''',
+    "array work": '''
+arr = []
+for (i in range(50000)) {
+    arr.push(i * 3)
+}
+total = 0
+for (v in arr) {
+    total = total + arr[0] + v
+}
+''',
+    #every call used to copy all live variables, so calls got slower the more globals a script had
+    "many globals": "\n".join(f"g{i} = {i}" for i in range(500)) + '''
+function fib(n) {
+    if (n < 2) {
+        return n
+    }
+    return fib(n - 1) + fib(n - 2)
+}
+result = fib(18)
+''',
+}
+
+def run(source, make_interpreter=Interpreter):
+    """Return the time taken to interpret an already parsed program"""
+    ast = Parser(Lexer(source).tokenize()).parse_program()
+    interpreter = make_interpreter()
+    start = time.perf_counter()
+    interpreter.run(ast)
+    return time.perf_counter() - start
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    total = 0
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        total += elapsed
+        print(f"{name:>15}: {elapsed:.3f}s")
+    print(f"{'total':>15}: {total:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare tokens/sec of the character-scanning and regex lexer backends"""
+import sys
+import time
+from bim.lexer import Lexer
+from bim.bim_token import TokenType
+
+SNIPPET = '''function area(width, height) {
+    return width * height / 2.5
+}
+total = 0
+names = ["alpha", "beta\\tgamma", "delta"]
+for (i in range(100)) {
+    if (i >= 50) {
+        total = total + area(i, 3.75)
+    } else if (i != 7) {
+        total = total - 1
+    } else {
+        names.push("item " + i)
+    }
+}
+print(total, names[0], len("hello world"))
+'''
+
+def generate_source(copies):
+    """Repeat a representative snippet to build a large program"""
+    return SNIPPET * copies
+
+def count_tokens(text, backend):
+    """Lex the whole text and return the number of tokens produced"""
+    lexer = Lexer(text, backend)
+    count = 0
+    while lexer.get_next_token().type != TokenType.EOF:
+        count += 1
+    return count
+
+def bench(text, backend, repeat=3):
+    """Return (tokens, best time in seconds) for a backend"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = count_tokens(text, backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return tokens, best
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = generate_source(copies)
+    print(f"source size: {len(text) / 1e6:.2f} MB")
+
+    results = {}
+    for backend in ("char", "regex"):
+        tokens, elapsed = bench(text, backend)
+        results[backend] = elapsed
+        print(f"{backend:>6}: {tokens} tokens in {elapsed:.3f}s ({tokens / elapsed:,.0f} tokens/sec)")
+
+    print(f"speedup: {results['char'] / results['regex']:.2f}x")
+
+if __name__ == "__main__":
+    main()
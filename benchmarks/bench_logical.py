@@ -0,0 +1,58 @@
+"""Time a guarded filter loop evaluating every check vs nested ifs vs short-circuit `and` (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+ITEMS = 100000
+
+#check() stands for an expensive test that the cheap guard rules out for 90% of the items
+CHECK = '''
+function check(x) {
+    y = x / 7
+    return y * 7 == x
+}
+'''
+
+PROGRAMS = {
+    "eager": CHECK + f'''
+count = 0
+for (i in range({ITEMS})) {{
+    guard = i >= {ITEMS * 9 // 10}
+    passed = check(i)
+    if (guard) {{
+        if (passed) {{
+            count = count + 1
+        }}
+    }}
+}}
+''',
+    "nested if": CHECK + f'''
+count = 0
+for (i in range({ITEMS})) {{
+    if (i >= {ITEMS * 9 // 10}) {{
+        if (check(i)) {{
+            count = count + 1
+        }}
+    }}
+}}
+''',
+    "and": CHECK + f'''
+count = 0
+for (i in range({ITEMS})) {{
+    if (i >= {ITEMS * 9 // 10} and check(i)) {{
+        count = count + 1
+    }}
+}}
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>10}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Time a word-frequency count with parallel arrays and linear scans vs a map (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+VOCABULARY = 500
+
+def text(word_count):
+    """word_count space separated words drawn from VOCABULARY distinct ones"""
+    return " ".join(f"w{i * 7919 % VOCABULARY}" for i in range(word_count))
+
+def arrays_program(word_count):
+    return f'''
+words = "{text(word_count)}".split()
+keys = []
+counts = []
+for (w in words) {{
+    found = -1
+    i = 0
+    for (k in keys) {{
+        if (k == w) {{
+            found = i
+            break
+        }}
+        i = i + 1
+    }}
+    if (found == -1) {{
+        keys.push(w)
+        counts.push(1)
+    }} else {{
+        counts[found] = counts[found] + 1
+    }}
+}}
+'''
+
+def map_program(word_count):
+    return f'''
+words = "{text(word_count)}".split()
+counts = {{}}
+for (w in words) {{
+    if (w in counts) {{
+        counts[w] = counts[w] + 1
+    }} else {{
+        counts[w] = 1
+    }}
+}}
+'''
+
+#the linear scans cost O(words * vocabulary), so they only run on the small input
+PROGRAMS = {
+    "arrays 5k words": arrays_program(5000),
+    "map 5k words": map_program(5000),
+    "map 500k words": map_program(500000),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>16}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
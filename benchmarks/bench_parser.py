@@ -0,0 +1,36 @@
+"""Time parsing of an expression-heavy program"""
+import sys
+import time
+from bim.lexer import Lexer
+from bim.parser import Parser
+
+SNIPPET = '''a = (x + y * 2 - z / 4) * (w - 1) + -v * 3
+b = a * a - 4 * x * z + (y - (z - (w + 2))) / 7
+c = a + b + x + y + z + w + v + 1 + 2 + 3 + 4 + 5
+if (a * 2 + b >= c - 1 * x) { d = arr[i + 1] * f(a + 1, b - 2) + s.length() }
+e = a < b
+g = a + b * c / d - e + f(1) * -2 == h * 4 - 1
+'''
+
+def generate_source(copies):
+    return SNIPPET * copies
+
+def bench(tokens, repeat=5):
+    """Return the best time to parse an already tokenized program"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Parser(tokens).parse_program()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = generate_source(copies)
+    tokens = Lexer(text).tokenize()
+    elapsed = bench(tokens)
+    print(f"parsed {len(tokens)} tokens in {elapsed:.3f}s ({len(tokens) / elapsed:,.0f} tokens/sec)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Time deep recursion on the default tree engine and on the VM's explicit call stack (or one engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+from bim.vm import VirtualMachine, MAX_CALL_DEPTH
+
+DEPTH = 100000
+
+PROGRAMS = {
+    "naive fib": '''
+function fib(n) {
+    if (n < 2) {
+        return n
+    }
+    return fib(n - 1) + fib(n - 2)
+}
+result = fib(22)
+''',
+    "deep sum": f'''
+function sum_to(n) {{
+    if (n == 0) {{
+        return 0
+    }}
+    return n + sum_to(n - 1)
+}}
+result = sum_to({DEPTH})
+''',
+    #return f(...) reuses the frame, so this never holds more than one frame
+    "tail calls": f'''
+function count(n, acc) {{
+    if (n == 0) {{
+        return acc
+    }}
+    return count(n - 1, acc + 1)
+}}
+result = count({DEPTH}, 0)
+''',
+    #a degenerate tree (a linked list of [value, child] pairs) walked recursively to its leaf
+    "tree walk": f'''
+tree = []
+for (i in range({DEPTH})) {{
+    tree = [i, tree]
+}}
+function walk(node) {{
+    if (node.length() == 0) {{
+        return 0
+    }}
+    return node[0] + walk(node[1])
+}}
+result = walk(tree)
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES),
+                            help="engine to run them on (default: the tree engine bim uses by default, then the VM)")
+    arg_parser.add_argument("--max-depth", type=int, default=MAX_CALL_DEPTH)
+    args = arg_parser.parse_args()
+    for engine in [args.engine] if args.engine else ["tree", "vm"]:
+        if engine == 'vm':
+            make_interpreter = lambda: VirtualMachine(max_depth=args.max_depth)
+        else:
+            make_interpreter = ENGINES[engine]
+        print(f"{engine}:")
+        for name in args.programs or list(PROGRAMS):
+            try:
+                elapsed = min(run(PROGRAMS[name], make_interpreter) for _ in range(3))
+            except (Exception, RecursionError) as e:
+                print(f"{name:>10}: failed ({e})")
+                continue
+            print(f"{name:>10}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Compare bim start-up time without the program cache, with a cold cache and with a warm cache"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bench_lexer import SNIPPET
+
+def run_bim(path, env, *flags):
+    """Run bim on a file in a fresh process and return the wall time"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "bim.main", *flags, path], env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "startup.bim")
+        with open(path, "w", encoding="utf-8") as file:
+            #only function definitions, so the run time is dominated by lexing and parsing
+            for i in range(copies):
+                file.write(f"function wrap{i}() {{\n{SNIPPET}}}\n")
+        print(f"source size: {os.path.getsize(path) / 1e6:.2f} MB")
+
+        env = dict(os.environ, BIM_CACHE_DIR=os.path.join(directory, "cache"), PYTHONPATH=repo_root)
+        no_cache = min(run_bim(path, env, "--no-cache") for _ in range(3))
+        cold = run_bim(path, env)
+        warm = min(run_bim(path, env) for _ in range(3))
+
+    print(f"no cache: {no_cache:.3f}s")
+    print(f"cold:     {cold:.3f}s (parse + write cache)")
+    print(f"warm:     {warm:.3f}s ({no_cache / warm:.1f}x faster than no cache)")
+
+if __name__ == "__main__":
+    main()
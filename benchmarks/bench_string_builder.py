@@ -0,0 +1,44 @@
+"""Time building a long string with s = s + piece vs a string builder (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+PIECE = "0123456789" * 10
+MEGABYTE = 1000000
+
+def concat_program(size):
+    return f'''
+s = ""
+for (i in range({size // len(PIECE)})) {{
+    s = s + "{PIECE}"
+}}
+'''
+
+def builder_program(size):
+    return f'''
+b = builder()
+for (i in range({size // len(PIECE)})) {{
+    b.append("{PIECE}")
+}}
+s = b.toString()
+'''
+
+#s = s + piece copies the whole string each time, so it is only run up to a few megabytes
+PROGRAMS = {
+    "concat 1 MB": concat_program(MEGABYTE),
+    "builder 1 MB": builder_program(MEGABYTE),
+    "concat 2 MB": concat_program(2 * MEGABYTE),
+    "builder 2 MB": builder_program(2 * MEGABYTE),
+    "builder 10 MB": builder_program(10 * MEGABYTE),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>14}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time parsing CSV text with charAt loops vs the native string methods (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+
+ROWS = 2000
+
+#id,name,score rows joined with \n escapes so the text is one bim string literal
+CSV = "\\n".join(f"{i},name{i % 97},{i * 37 % 1000}.{i % 10}" for i in range(ROWS))
+
+PROGRAMS = {
+    "charAt loops": f'''
+function digit(c) {{
+    for (d in range(10)) {{
+        if ("0123456789".charAt(d) == c) {{
+            return d
+        }}
+    }}
+    return -1
+}}
+function number(field) {{
+    value = 0
+    scale = 0
+    for (i in range(field.length())) {{
+        c = field.charAt(i)
+        if (c == ".") {{
+            scale = 1
+        }} else {{
+            value = value * 10 + digit(c)
+            scale = scale * 10
+        }}
+    }}
+    if (scale == 0) {{
+        return value
+    }}
+    return value / scale
+}}
+text = "{CSV}"
+rows = []
+fields = []
+field = ""
+for (i in range(text.length())) {{
+    c = text.charAt(i)
+    if (c == ",") {{
+        fields.push(field)
+        field = ""
+    }} else if (c == "\\n") {{
+        fields.push(field)
+        rows.push(fields)
+        fields = []
+        field = ""
+    }} else {{
+        field = field + c
+    }}
+}}
+fields.push(field)
+rows.push(fields)
+total = 0
+for (row in rows) {{
+    total = total + number(row[2])
+}}
+''',
+    "string methods": f'''
+text = "{CSV}"
+total = 0
+for (line in text.split("\\n")) {{
+    fields = line.split(",")
+    total = total + fields[2].to_number()
+}}
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>14}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Compare memory and time of a list of Token objects against Lexer.tokenize()"""
+import sys
+import time
+import tracemalloc
+from bench_lexer import generate_source
+from bim.lexer import Lexer
+from bim.bim_token import TokenType
+
+def token_list(text):
+    """Collect every token as a Token object (the pre-tokenize() approach)"""
+    lexer = Lexer(text)
+    tokens = []
+    while True:
+        token = lexer.get_next_token()
+        tokens.append(token)
+        if token.type == TokenType.EOF:
+            return tokens
+
+def token_stream(text):
+    return Lexer(text).tokenize()
+
+def measure(build, text):
+    """Return (result, seconds, peak bytes) for building the token sequence"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(text)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = generate_source(copies)
+    print(f"source size: {len(text) / 1e6:.2f} MB")
+
+    peaks = {}
+    for name, build in (("Token list", token_list), ("tokenize()", token_stream)):
+        result, elapsed, peak = measure(build, text)
+        peaks[name] = peak
+        print(f"{name:>10}: {len(result)} tokens in {elapsed:.3f}s, peak {peak / 1e6:.1f} MB ({peak / len(result):.1f} bytes/token)")
+        del result
+
+    print(f"memory reduction: {peaks['Token list'] / peaks['tokenize()']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Time element-wise array work written as bim loops vs typed array operations (or another engine with --engine)"""
+import argparse
+from bench_interpreter import ENGINES, run
+from bim import typed_array
+
+SIZE = 100000
+
+PROGRAMS = {
+    "loop a * 2 + b": f'''
+a = []
+b = []
+for (i in range({SIZE})) {{
+    a.push(i)
+    b.push(1)
+}}
+c = []
+for (i in range({SIZE})) {{
+    c.push(a[i] * 2 + b[i])
+}}
+total = 0
+for (x in c) {{
+    total = total + x
+}}
+''',
+    "typed a * 2 + b": f'''
+a = from(range({SIZE}))
+b = fill({SIZE}, 1)
+c = a * 2 + b
+total = c.sum()
+''',
+    "loop dot": f'''
+a = []
+for (i in range({SIZE})) {{
+    a.push(i / 1000)
+}}
+total = 0
+for (i in range({SIZE})) {{
+    total = total + a[i] * a[i]
+}}
+''',
+    "typed dot": f'''
+a = from(range({SIZE})) / 1000
+total = a.dot(a)
+''',
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("programs", nargs="*", help=f"programs to run (default: all of {list(PROGRAMS)})")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    args = arg_parser.parse_args()
+    print(f"typed array backend: {'numpy' if typed_array.numpy is not None else 'array'}")
+    for name in args.programs or list(PROGRAMS):
+        elapsed = min(run(PROGRAMS[name], ENGINES[args.engine]) for _ in range(3))
+        print(f"{name:>16}: {elapsed:.3f}s")
+
+if __name__ == "__main__":
+    main()
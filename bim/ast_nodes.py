@@ -1,9 +1,55 @@
+from bim.bim_token import Token, TokenType
+
+#small-int operator codes stored on UnaryOpNode/BinaryOpNode instead of the operator Token
+OP_PLUS = 0
+OP_MINUS = 1
+OP_MULTIPLY = 2
+OP_DIVIDE = 3
+OP_EQUAL = 4
+OP_NOT_EQUAL = 5
+OP_LESS_THAN = 6
+OP_GREATER_THAN = 7
+OP_LESS_EQUAL = 8
+OP_GREATER_EQUAL = 9
+OP_IN = 10
+OP_NOT = 11
+OP_AND = 12
+OP_OR = 13
+
+#operator token type <-> operator code
+OPERATOR_CODES = {
+    TokenType.PLUS: OP_PLUS,
+    TokenType.MINUS: OP_MINUS,
+    TokenType.MULTIPLY: OP_MULTIPLY,
+    TokenType.DIVIDE: OP_DIVIDE,
+    TokenType.EQUAL: OP_EQUAL,
+    TokenType.NOT_EQUAL: OP_NOT_EQUAL,
+    TokenType.LESS_THAN: OP_LESS_THAN,
+    TokenType.GREATER_THAN: OP_GREATER_THAN,
+    TokenType.LESS_EQUAL: OP_LESS_EQUAL,
+    TokenType.GREATER_EQUAL: OP_GREATER_EQUAL,
+    TokenType.IN: OP_IN,
+    TokenType.NOT: OP_NOT,
+    TokenType.AND: OP_AND,
+    TokenType.OR: OP_OR,
+}
+OPERATOR_TYPES = {code: token_type for token_type, code in OPERATOR_CODES.items()}
+OPERATOR_SYMBOLS = ['+', '-', '*', '/', '==', '!=', '<', '>', '<=', '>=', 'in', 'not', 'and', 'or']
+
+def operator_code(operator):
+    """Operator code for an operator Token (codes are passed through)"""
+    if isinstance(operator, Token):
+        return OPERATOR_CODES[operator.type]
+    return operator
+
 class ASTNode:
     """Base class for all AST nodes"""
-    pass
+    __slots__ = ()
 
 class NumberNode(ASTNode):
     """Represents numbers (including decimals)"""
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = float(value)
     
@@ -11,6 +57,8 @@ class NumberNode(ASTNode):
         return f"NumberNode({self.value})"
     
 class StringNode(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = str(value)
     
@@ -18,6 +66,8 @@ class StringNode(ASTNode):
         return f"StringNode('{self.value}')"
     
 class BooleanNode(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = bool(value)
     
@@ -25,43 +75,91 @@ class BooleanNode(ASTNode):
         return f"BooleanNode({self.value})"
     
 class UnaryOpNode(ASTNode):
-    """Represents the +/- in front of number to signify signs"""
+    """Represents the +/- in front of number to signify signs, and `not`"""
+    __slots__ = ('op', 'operand')
+
     def __init__(self, operator, operand):
-        self.operator = operator
+        self.op = operator_code(operator)  # operator code (OP_PLUS, OP_MINUS)
         self.operand = operand
+
+    @property
+    def operator(self):
+        return Token(OPERATOR_TYPES[self.op], OPERATOR_SYMBOLS[self.op])
     
     def __repr__(self):
-        return f"UnaryOpNode({self.operator.type}, {self.operand})"
+        return f"UnaryOpNode({OPERATOR_TYPES[self.op]}, {self.operand})"
 
 class BinaryOpNode(ASTNode):
     """Represents an operations (ex: 3+4 or 10-6)"""
+    __slots__ = ('left', 'op', 'right', 'cache')
+
     def __init__(self, left, operator, right):
         self.left = left      # Left side (type is another AST node)
-        self.operator = operator  # The operator (+, -, etc)
+        self.op = operator_code(operator)  # The operator code (OP_PLUS, OP_MINUS, etc)
         self.right = right    # Right side (type is another AST node)
+        self.cache = None     # InlineCache of the operand types seen here (set by the tree walker)
+
+    @property
+    def operator(self):
+        return Token(OPERATOR_TYPES[self.op], OPERATOR_SYMBOLS[self.op])
     
     def __repr__(self):
-        return f"BinaryOpNode({self.left}, {self.operator.type}, {self.right})"
+        return f"BinaryOpNode({self.left}, {OPERATOR_TYPES[self.op]}, {self.right})"
+
+class LogicalNode(ASTNode):
+    """Represents `a and b` / `a or b`: the right side is only evaluated when the left does not decide the result"""
+    __slots__ = ('left', 'op', 'right')
+
+    def __init__(self, left, operator, right):
+        self.left = left
+        self.op = operator_code(operator)  # OP_AND or OP_OR
+        self.right = right
+
+    @property
+    def operator(self):
+        return Token(OPERATOR_TYPES[self.op], OPERATOR_SYMBOLS[self.op])
+
+    def operands(self):
+        """Operands of a chain of the same operator, in order: `a and b and c` gives [a, b, c]"""
+        operands = []
+        node = self
+        while type(node) is LogicalNode and node.op == self.op:
+            operands.append(node.right)
+            node = node.left
+        operands.append(node)
+        operands.reverse()
+        return operands
+
+    def __repr__(self):
+        return f"LogicalNode({self.left}, {OPERATOR_TYPES[self.op]}, {self.right})"
 
 class VariableNode(ASTNode):
     """Represents variable names"""
+    __slots__ = ('name', 'slot')
+
     def __init__(self, name):
         self.name = name
+        self.slot = None  # frame slot of a local variable, None for a global (set by the resolver)
     
     def __repr__(self):
         return f"VariableNode({self.name})"
 
 class AssignmentNode(ASTNode):
     """Represents variables"""
+    __slots__ = ('variable_name', 'value', 'slot')
+
     def __init__(self, variable_name, value):
         self.variable_name = variable_name
         self.value = value
+        self.slot = None  # frame slot of a local variable, None for a global (set by the resolver)
     
     def __repr__(self):
         return f"AssignmentNode({self.variable_name} = {self.value})"
 
 class FunctionCallNode(ASTNode):
     """Represents function calls (like print())"""
+    __slots__ = ('function_name', 'arguments')
+
     def __init__(self, function_name, arguments):
         self.function_name = function_name
         self.arguments = arguments
@@ -71,6 +169,8 @@ class FunctionCallNode(ASTNode):
 
 class IfNode(ASTNode):
     """Represents if statements"""
+    __slots__ = ('condition', 'if_body', 'else_body', 'elif_clauses')
+
     def __init__(self, condition, if_body, elif_clauses = None, else_body=None):
         self.condition = condition
         self.if_body = if_body
@@ -88,6 +188,8 @@ class IfNode(ASTNode):
 
 class BlockNode(ASTNode):
     """Represents statement blocks"""
+    __slots__ = ('statements',)
+
     def __init__(self, statements):
         self.statements = statements
     
@@ -96,6 +198,8 @@ class BlockNode(ASTNode):
 
 class WhileNode(ASTNode):
     """Represents while loops"""
+    __slots__ = ('condition', 'body')
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -105,16 +209,21 @@ class WhileNode(ASTNode):
 
 class ForNode(ASTNode):
     """Represents for loops"""
+    __slots__ = ('variable', 'iterable', 'body', 'slot')
+
     def __init__(self, variable, iterable, body):
         self.variable = variable
         self.iterable = iterable
         self.body = body
+        self.slot = None  # frame slot of the loop variable (set by the resolver)
     
     def __repr__(self):
         return f"ForNode(variable={self.variable}, iterable={self.iterable}, body={self.body})"
 
 class RangeNode(ASTNode):
     """Represents range ndoe in for loops"""
+    __slots__ = ('start', 'stop', 'step')
+
     def __init__(self, start, stop, step=None):
         self.start = start
         self.stop = stop
@@ -125,6 +234,8 @@ class RangeNode(ASTNode):
 
 class BreakNode(ASTNode):
     """Represents break node"""
+    __slots__ = ()
+
     def __init__(self):
         pass
     
@@ -133,6 +244,8 @@ class BreakNode(ASTNode):
 
 class ContinueNode(ASTNode):
     """Represents continue node"""
+    __slots__ = ()
+
     def __init__(self):
         pass
     
@@ -141,14 +254,39 @@ class ContinueNode(ASTNode):
     
 class ArrayNode(ASTNode):
     """Represents arrays"""
-    def __init__(self, elements):
+    __slots__ = ('elements', 'constant')
+
+    def __init__(self, elements, constant=None):
         self.elements = elements
+        self.constant = constant  # tuple of element values when every element is a literal (set by the optimizer)
     
     def __repr__(self):
         return f"ArrayNode({self.elements})"
 
+class FStringNode(ASTNode):
+    """Represents interpolated strings (f"x={x}"): the text and expressions whose values are joined"""
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = parts  # StringNodes for the text and the expressions between braces, in order
+
+    def __repr__(self):
+        return f"FStringNode({self.parts})"
+
+class MapNode(ASTNode):
+    """Represents map literals ({key: value, ...})"""
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items  # keys and values alternating: [key1, value1, key2, value2, ...]
+
+    def __repr__(self):
+        return f"MapNode({self.items})"
+
 class IndexNode(ASTNode):
     """Represents index node"""
+    __slots__ = ('array', 'index')
+
     def __init__(self, array, index):
         self.array = array
         self.index = index
@@ -158,6 +296,8 @@ class IndexNode(ASTNode):
 
 class IndexAssignmentNode(ASTNode):
     """Node for index assignments"""
+    __slots__ = ('array', 'index', 'value')
+
     def __init__(self, array, index, value):
         self.array = array
         self.index = index
@@ -168,6 +308,8 @@ class IndexAssignmentNode(ASTNode):
 
 class MethodCallNode(ASTNode):
     """Node representing method calls"""
+    __slots__ = ('object_expr', 'method_name', 'arguments')
+
     def __init__(self, object_expr, method_name, arguments):
         self.object_expr = object_expr
         self.method_name = method_name
@@ -178,16 +320,23 @@ class MethodCallNode(ASTNode):
     
 class FunctionDefNode(ASTNode):
     """Represents function definitions"""
-    def __init__(self, name, parameters, body):
+    __slots__ = ('name', 'parameters', 'body', 'slot_names', 'memo')
+
+    def __init__(self, name, parameters, body, memo=False):
         self.name = name
         self.parameters = parameters
         self.body = body
+        self.slot_names = None  # variable name of each slot in a call's frame (set by the resolver)
+        self.memo = memo  # declared with `memo function`: results are cached by argument values
     
     def __repr__(self):
-        return f"FunctionDefNode(name={self.name}, params={self.parameters}, body={self.body})"
+        memo = ", memo=True" if self.memo else ""
+        return f"FunctionDefNode(name={self.name}, params={self.parameters}, body={self.body}{memo})"
 
 class ReturnNode(ASTNode):
     """Represents return statements"""
+    __slots__ = ('value',)
+
     def __init__(self, value=None):
         self.value = value
     
@@ -1,7 +1,11 @@
+import sys
+from array import array
 from enum import Enum
 
 #Token contains type and actual value
 class Token:
+    __slots__ = ('type', 'value')
+
     def __init__(self, type, value):
         self.type = type
         self.value = value
@@ -48,4 +52,50 @@ class TokenType(Enum):
     RBRACKET = "RBRACKET"
     DOT = "DOT" #for dot methods (like array.push)
     FUNCTION = "FUNCTION" 
-    RETURN = "RETURN"
\ No newline at end of file
+    RETURN = "RETURN"
+    COLON = "COLON" #between a key and its value in a map literal
+    FSTRING = "FSTRING" #f"x={x}", value is a tuple of literal text and expression source alternating
+    #logical operators; `and`/`&&`, `or`/`||` and `not`/`!` are the same tokens
+    AND = "AND"
+    OR = "OR"
+    NOT = "NOT"
+
+#small-int codes for token types (used by the compact TokenStream)
+TOKEN_TYPES = tuple(TokenType)
+TOKEN_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+EOF_CODE = TOKEN_CODES[TokenType.EOF]
+
+class TokenStream:
+    """Compact token stream: parallel arrays of token kinds, interned values and source offsets"""
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = []
+        self.offsets = array('q')
+
+    def append(self, token_type, value, offset):
+        """Add a token to the end of the stream"""
+        self.kinds.append(TOKEN_CODES[token_type])
+        self.values.append(sys.intern(value) if type(value) is str else value)
+        self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, index):
+        """Token type at index (EOF past the end)"""
+        if index < len(self.kinds):
+            return TOKEN_TYPES[self.kinds[index]]
+        return TokenType.EOF
+
+    def token(self, index):
+        """Build a Token object for the token at index (EOF past the end)"""
+        if index < len(self.kinds):
+            return Token(TOKEN_TYPES[self.kinds[index]], self.values[index])
+        return Token(TokenType.EOF, "")
+
+    def __iter__(self):
+        for code, value in zip(self.kinds, self.values):
+            yield Token(TOKEN_TYPES[code], value)
+
+    def __repr__(self):
+        return f"TokenStream({len(self)} tokens)"
@@ -0,0 +1,196 @@
+import marshal
+from array import array
+from bim.ast_nodes import OPERATOR_SYMBOLS
+
+#instructions are stored as two ints: opcode, argument (0 when unused); jump arguments are instruction indexes
+#the VM tests opcodes roughly in order of how often they run
+LOAD_NAME = 0           # push the global names[arg]
+LOAD_CONST = 1          # push consts[arg]
+STORE_NAME = 2          # global names[arg] = pop()
+BINARY_ADD = 3
+COMPARE_OP = 4          # arg is the OP_ comparison code
+POP_JUMP_IF_FALSE = 5   # jump to arg if pop() is not truthy
+JUMP = 6                # jump to arg
+BINARY_SUBTRACT = 7
+BINARY_MULTIPLY = 8
+BINARY_DIVIDE = 9
+FOR_ITER = 10           # push the next item of the iterator on top, or jump to arg when it is exhausted
+LOAD_FUNCTION = 11      # check the call consts[arg] = (name, argc) and push the function
+CALL_FUNCTION = 12      # call the function below the arg arguments on top of the stack
+RETURN_VALUE = 13
+BINARY_INDEX = 14
+CALL_METHOD = 15        # consts[arg] = (method name, argc); the object is below the arguments
+POP_TOP = 16
+STORE_INDEX = 17        # array, index, value = pop 3; array[index] = value
+BUILD_ARRAY = 18        # pop arg values into a new array
+COPY_CONST_ARRAY = 19   # push a new array with the elements of the tuple consts[arg]
+UNARY_NEGATIVE = 20
+UNARY_POSITIVE = 21
+GET_ITER = 22           # replace the iterable with an iterator over it
+LOAD_FAST = 23          # push frame[arg], or the global of the same name if the slot is unset
+MAKE_FUNCTION = 24      # define the function whose CodeObject is consts[arg]
+RETURN_NONE = 25        # end of a code object
+BREAK_OUT = 26          # break with no enclosing loop in this code: unwind into the caller's loop
+CONTINUE_OUT = 27
+BUILD_RANGE = 28        # pop arg values (start, stop[, step]) into a range
+#superinstructions for common pairs
+BINARY_ADD_CONST = 29   # LOAD_CONST arg; BINARY_ADD
+BINARY_SUBTRACT_CONST = 30
+COMPARE_JUMP_IF_FALSE = 31  # COMPARE_OP; POP_JUMP_IF_FALSE with arg = target << COMPARE_SHIFT | comparison code
+INCREMENT_NAME = 32     # name = name + number, with consts[arg] = (name, number)
+STORE_FAST = 33         # frame[arg] = pop()
+INCREMENT_FAST = 34     # frame[slot] = frame[slot] + number, with consts[arg] = (slot, number)
+TAIL_CALL = 35          # return f(...): like CALL_FUNCTION, but a user function takes over the current frame
+BUILD_MAP = 36          # pop arg key, value pairs into a new map
+BUILD_STRING = 37       # pop arg values and push them joined as one string, each formatted like print
+POP_JUMP_IF_TRUE = 38   # jump to arg if pop() is truthy
+JUMP_IF_FALSE_OR_POP = 39  # `and`: jump to arg keeping the top if it is not truthy, else pop it
+JUMP_IF_TRUE_OR_POP = 40   # `or`: jump to arg keeping the top if it is truthy, else pop it
+UNARY_NOT = 41
+
+COMPARE_SHIFT = 4
+
+OPCODE_NAMES = [
+    'LOAD_NAME', 'LOAD_CONST', 'STORE_NAME', 'BINARY_ADD', 'COMPARE_OP', 'POP_JUMP_IF_FALSE', 'JUMP',
+    'BINARY_SUBTRACT', 'BINARY_MULTIPLY', 'BINARY_DIVIDE', 'FOR_ITER', 'LOAD_FUNCTION', 'CALL_FUNCTION',
+    'RETURN_VALUE', 'BINARY_INDEX', 'CALL_METHOD', 'POP_TOP', 'STORE_INDEX', 'BUILD_ARRAY', 'COPY_CONST_ARRAY',
+    'UNARY_NEGATIVE', 'UNARY_POSITIVE', 'GET_ITER', 'LOAD_FAST', 'MAKE_FUNCTION', 'RETURN_NONE', 'BREAK_OUT',
+    'CONTINUE_OUT', 'BUILD_RANGE', 'BINARY_ADD_CONST', 'BINARY_SUBTRACT_CONST', 'COMPARE_JUMP_IF_FALSE',
+    'INCREMENT_NAME', 'STORE_FAST', 'INCREMENT_FAST', 'TAIL_CALL', 'BUILD_MAP', 'BUILD_STRING',
+    'POP_JUMP_IF_TRUE', 'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP', 'UNARY_NOT',
+]
+
+#opcodes whose argument is a jump target, an index into names, a frame slot or an index into consts
+JUMP_OPCODES = (POP_JUMP_IF_FALSE, JUMP, FOR_ITER, COMPARE_JUMP_IF_FALSE, POP_JUMP_IF_TRUE, JUMP_IF_FALSE_OR_POP,
+                JUMP_IF_TRUE_OR_POP)
+NAME_OPCODES = (LOAD_NAME, STORE_NAME)
+SLOT_OPCODES = (LOAD_FAST, STORE_FAST)
+CONST_OPCODES = (LOAD_CONST, LOAD_FUNCTION, CALL_METHOD, COPY_CONST_ARRAY, MAKE_FUNCTION,
+                 BINARY_ADD_CONST, BINARY_SUBTRACT_CONST, INCREMENT_NAME, INCREMENT_FAST)
+
+def jump_target(opcode, arg):
+    """Instruction index a jump instruction goes to"""
+    if opcode == COMPARE_JUMP_IF_FALSE:
+        return arg >> COMPARE_SHIFT
+    return arg
+
+#bump when the instruction set or the serialized layout changes
+BYTECODE_MAGIC = b"BIMB"
+BYTECODE_VERSION = 7
+
+#name of the top-level code object
+PROGRAM_NAME = "<program>"
+
+class CodeObject:
+    """Compiled bytecode for a program or a function body"""
+    __slots__ = ('name', 'parameters', 'code', 'consts', 'names', 'slot_names', 'loops', 'memo', 'purity',
+                 '_instructions', 'decoded')
+
+    def __init__(self, name, parameters=(), code=None, consts=None, names=None, loops=None, slot_names=None,
+                 memo=False, purity=(None, ())):
+        self.name = name
+        self.parameters = list(parameters)
+        self.code = code if code is not None else array('i')  # opcode, argument pairs
+        self.consts = consts if consts is not None else []
+        self.names = names if names is not None else []  # global names
+        #variable name of each frame slot; a call's frame has len(slot_names) slots, parameters first
+        self.slot_names = slot_names if slot_names is not None else list(parameters)
+        #(start, end, break_target, continue_target, stack_depth, continue_start) for every loop, innermost first;
+        #used when break/continue unwinds out of a called function into a loop of this code
+        self.loops = loops if loops is not None else []
+        self.memo = memo  # declared with `memo function`
+        #(reason the function is impure or None, names of the functions it calls), see bim.memo.function_purity
+        self.purity = purity
+        self._instructions = None
+        self.decoded = None  # instructions with their operands resolved, filled in by the VM
+
+    @property
+    def instructions(self):
+        """The code as a list of (opcode, argument) tuples, which is what the VM runs"""
+        if self._instructions is None:
+            code = self.code
+            self._instructions = [(code[i], code[i + 1]) for i in range(0, len(code), 2)]
+        return self._instructions
+
+    def __repr__(self):
+        return f"CodeObject({self.name}, {len(self.code) // 2} instructions)"
+
+    def find_loop(self, pc, is_continue=False):
+        """Innermost loop whose body (or, for break, condition) contains pc"""
+        for loop in self.loops:
+            start = loop[5] if is_continue else loop[0]
+            if start <= pc < loop[1]:
+                return loop
+        return None
+
+    def to_tuple(self):
+        """Plain-data form of the code object (nested function code included)"""
+        consts = tuple(('code', const.to_tuple()) if isinstance(const, CodeObject) else ('value', const)
+                       for const in self.consts)
+        return (self.name, tuple(self.parameters), self.code.tobytes(), consts, tuple(self.names), tuple(self.loops),
+                tuple(self.slot_names), self.memo, (self.purity[0], tuple(self.purity[1])))
+
+    @classmethod
+    def from_tuple(cls, data):
+        name, parameters, code_bytes, consts, names, loops, slot_names, memo, purity = data
+        code = array('i')
+        code.frombytes(code_bytes)
+        consts = [cls.from_tuple(value) if kind == 'code' else value for kind, value in consts]
+        return cls(name, parameters, code, consts, list(names), [tuple(loop) for loop in loops], list(slot_names),
+                   memo, purity)
+
+def serialize(code):
+    """Serialize a code object to bytes"""
+    return BYTECODE_MAGIC + marshal.dumps((BYTECODE_VERSION, code.to_tuple()))
+
+def deserialize(data):
+    """Load a code object written by serialize(), or None if it is from another bytecode version"""
+    if data[:len(BYTECODE_MAGIC)] != BYTECODE_MAGIC:
+        return None
+    version, code_tuple = marshal.loads(data[len(BYTECODE_MAGIC):])
+    if version != BYTECODE_VERSION:
+        return None
+    return CodeObject.from_tuple(code_tuple)
+
+def disassemble(code, out=None):
+    """Return a listing of a code object and every function defined in it"""
+    lines = out if out is not None else []
+    label = code.name if code.name == PROGRAM_NAME else f"{code.name}({', '.join(code.parameters)})"
+    if code.memo:
+        label = f"memo {label}"
+    lines.append(f"Disassembly of {label}:")
+    targets = {jump_target(opcode, arg) for opcode, arg in code.instructions if opcode in JUMP_OPCODES}
+    functions = []
+    for pc, (opcode, arg) in enumerate(code.instructions):
+        marker = ">>" if pc in targets else "  "
+        text = f"{marker} {pc:4d} {OPCODE_NAMES[opcode]:<21} "
+        if opcode == COMPARE_JUMP_IF_FALSE:
+            text += f"to {jump_target(opcode, arg)} unless {OPERATOR_SYMBOLS[arg & ((1 << COMPARE_SHIFT) - 1)]}"
+        elif opcode in JUMP_OPCODES:
+            text += f"to {arg}"
+        elif opcode in NAME_OPCODES:
+            text += f"{arg} ({code.names[arg]})"
+        elif opcode in SLOT_OPCODES:
+            text += f"{arg} ({code.slot_names[arg]})"
+        elif opcode in CONST_OPCODES:
+            const = code.consts[arg]
+            if isinstance(const, CodeObject):
+                functions.append(const)
+                text += f"{arg} (function {const.name})"
+            elif opcode == LOAD_FUNCTION or opcode == CALL_METHOD:
+                text += f"{arg} ({const[0]}, {const[1]} args)"
+            elif opcode == INCREMENT_NAME:
+                text += f"{arg} ({const[0]} += {const[1]!r})"
+            elif opcode == INCREMENT_FAST:
+                text += f"{arg} ({code.slot_names[const[0]]} += {const[1]!r})"
+            else:
+                text += f"{arg} ({const!r})"
+        elif opcode == COMPARE_OP:
+            text += f"{arg} ({OPERATOR_SYMBOLS[arg]})"
+        elif opcode in (CALL_FUNCTION, TAIL_CALL, BUILD_ARRAY, BUILD_MAP, BUILD_STRING, BUILD_RANGE):
+            text += f"{arg}"
+        lines.append(text.rstrip())
+    for function in functions:
+        lines.append("")
+        disassemble(function, lines)
+    return lines
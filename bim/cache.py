@@ -0,0 +1,172 @@
+import hashlib
+import os
+import pickle
+import re
+import stat
+import sys
+
+#compiled programs are cached next to the source in this directory (like __pycache__)
+CACHE_DIR_NAME = "__bimcache__"
+CACHE_SUFFIX = ".bimc"
+CACHE_MAGIC = b"BIMC"
+#bump when the AST classes change so old cache files are ignored
+CACHE_FORMAT = 9
+INTERPRETER_VERSION = "1.0.0"
+#total size of a cache directory before the least recently used entries are evicted
+DEFAULT_MAX_CACHE_BYTES = 64 * 1024 * 1024
+#characters of the source hash in a cache file's name
+KEY_LENGTH = 16
+
+def cache_key(source):
+    """Hash of the source text together with everything that affects the parsed program"""
+    digest = hashlib.sha256()
+    digest.update(f"{INTERPRETER_VERSION}:{CACHE_FORMAT}:{sys.version_info[:2]}".encode())
+    digest.update(source.encode('utf-8'))
+    return digest.hexdigest()
+
+def default_cache_dir(filename):
+    """The __bimcache__ directory next to a source file"""
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR_NAME)
+
+def cache_dir_for(filename, cache_dir=None):
+    """Directory holding the cache files for a source file (BIM_CACHE_DIR overrides the default)"""
+    if cache_dir is None:
+        cache_dir = os.environ.get("BIM_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = default_cache_dir(filename)
+    return cache_dir
+
+def entry_prefix(filename, cache_dir=None):
+    """Start of the names of a source file's cache files.
+
+    A shared cache directory can hold files with the same name from different directories (a/main.bim and
+    b/main.bim), so there the prefix also has a hash of the source's full path; otherwise storing one would
+    remove the other's entry as stale.
+    """
+    name = os.path.basename(filename)
+    if os.path.abspath(cache_dir_for(filename, cache_dir)) != default_cache_dir(filename):
+        path_hash = hashlib.sha256(os.path.abspath(filename).encode('utf-8')).hexdigest()[:8]
+        name = f"{name}.{path_hash}"
+    return name + "."
+
+def cache_path(filename, key, cache_dir=None, variant=""):
+    """Path of the cache file for a source file with the given key (variant separates e.g. bytecode entries)"""
+    name = f"{entry_prefix(filename, cache_dir)}{key[:KEY_LENGTH]}{variant}{CACHE_SUFFIX}"
+    return os.path.join(cache_dir_for(filename, cache_dir), name)
+
+def is_trusted(file_stat):
+    """Whether a cache file may be unpickled: it is ours and nobody else can write to it.
+
+    Unpickling runs code named in the file, so in a shared cache directory (BIM_CACHE_DIR) an entry planted or
+    changed by another user would run as whoever loads it.
+    """
+    if hasattr(os, 'getuid') and file_stat.st_uid != os.getuid():
+        return False
+    return not file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def load_entry(filename, source, cache_dir=None, variant=""):
+    """Return the cached entry for this source, or None if there is no valid entry"""
+    key = cache_key(source)
+    path = cache_path(filename, key, cache_dir, variant)
+    try:
+        with open(path, 'rb') as file:
+            #checked on the open file, so it cannot be swapped for another one after the check
+            if not is_trusted(os.fstat(file.fileno())):
+                return None
+            if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            entry = pickle.load(file)
+        if entry.get('key') != key:
+            return None
+        #mark as recently used for eviction
+        os.utime(path)
+        return entry
+    except Exception:
+        #a missing, unreadable or corrupt cache entry just means a normal parse
+        return None
+
+def store_entry(filename, source, fields, cache_dir=None, max_bytes=DEFAULT_MAX_CACHE_BYTES, variant=""):
+    """Write a cache entry (failures are ignored)"""
+    key = cache_key(source)
+    path = cache_path(filename, key, cache_dir, variant)
+    directory = os.path.dirname(path)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        entry = dict(fields, key=key)
+        #writable by the owner only whatever the umask, or load_entry would not trust it
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+        with open(os.open(temp_path, flags, 0o644), 'wb') as file:
+            file.write(CACHE_MAGIC)
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except (OSError, pickle.PicklingError, RecursionError):
+        #very deep ASTs or read-only directories are simply not cached
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+    remove_stale_entries(filename, path, cache_dir, variant)
+    evict(directory, max_bytes)
+    return True
+
+def load_program(filename, source, cache_dir=None):
+    """Return the cached (ast, max_depth) for this source, or None if there is no valid entry"""
+    entry = load_entry(filename, source, cache_dir)
+    if entry is None:
+        return None
+    return entry['ast'], entry['max_depth']
+
+def store_program(filename, source, ast, max_depth, cache_dir=None, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """Write the parsed program to the cache (failures are ignored)"""
+    return store_entry(filename, source, {'ast': ast, 'max_depth': max_depth}, cache_dir, max_bytes)
+
+def load_bytecode(filename, source, variant, cache_dir=None):
+    """Return the cached serialized bytecode for this source, or None"""
+    entry = load_entry(filename, source, cache_dir, variant)
+    if entry is None:
+        return None
+    return entry['bytecode']
+
+def store_bytecode(filename, source, variant, data, cache_dir=None, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """Write serialized bytecode to the cache (failures are ignored)"""
+    return store_entry(filename, source, {'bytecode': data}, cache_dir, max_bytes, variant)
+
+def remove_stale_entries(filename, current_path, cache_dir=None, variant=""):
+    """Delete cache files of older versions of the same source file (and the same variant)"""
+    directory = os.path.dirname(current_path)
+    #another version's name differs only in its source hash; other variants and other files' entries do not match
+    entry_name = re.compile(re.escape(entry_prefix(filename, cache_dir)) + f"[0-9a-f]{{{KEY_LENGTH}}}"
+                            + re.escape(variant + CACHE_SUFFIX))
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if entry_name.fullmatch(name) and path != current_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def evict(directory, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+    """Remove least recently used cache files until the directory fits in max_bytes"""
+    entries = []
+    total = 0
+    for name in os.listdir(directory):
+        if not name.endswith(CACHE_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,525 @@
+from bim.exceptions import *
+from bim.ast_nodes import *
+from bim.interpreter import Interpreter, EXPRESSION_NODES, COMPARISONS, UNSET, new_frame, BREAK, CONTINUE, RETURN, \
+    iterate
+from bim.resolver import Resolver
+from bim.containers import build_map
+from bim.memo import MISSING
+
+#nodes that only appear as statements; their closures return a completion signal instead of a value
+STATEMENT_NODES = (AssignmentNode, IndexAssignmentNode, IfNode, BlockNode, WhileNode, ForNode,
+                   BreakNode, ContinueNode, FunctionDefNode, ReturnNode)
+
+#executes the AST by compiling every node once into a closure
+class ClosureInterpreter(Interpreter):
+    """Compiles each node into a specialized Python closure and runs the program by calling the root one.
+
+    Statement closures return None, or BREAK/CONTINUE/RETURN to unwind; expression closures return their value.
+    Builtins, methods and error messages are shared with Interpreter.
+    """
+    def __init__(self):
+        super().__init__()
+        #node class -> bound compile method, filled in on first use
+        self.compilers = {}
+
+    def run(self, node):
+        """Compile and execute a program (or a single top-level statement)"""
+        self.frame = new_frame((), len(Resolver().resolve_program(node)))
+        self.raise_signal(self.compile_statement(node)())
+
+    def enable_explicit_stack(self):
+        """Hand expressions to evaluate() instead of compiling them into nested closures"""
+        super().enable_explicit_stack()
+        for node_type in EXPRESSION_NODES:
+            self.compilers[node_type] = self.compile_fallback
+
+    def compile(self, node):
+        """Compile a node into a closure"""
+        compiler = self.compilers.get(type(node))
+        if compiler is None:
+            compiler = self.resolve_compiler(type(node))
+        return compiler(node)
+
+    def resolve_compiler(self, node_type):
+        """Find the compiler for a node class once and remember it"""
+        compiler = getattr(self, f'compile_{node_type.__name__}', self.compile_fallback)
+        self.compilers[node_type] = compiler
+        return compiler
+
+    def compile_fallback(self, node):
+        """Nodes without a compiler run through the tree walker"""
+        visit = self.visit
+        def fallback():
+            return visit(node)
+        return fallback
+
+    def compile_statement(self, node):
+        """Compile a node whose value is discarded into a closure returning a completion signal"""
+        if isinstance(node, STATEMENT_NODES):
+            return self.compile(node)
+        expression = self.compile(node)
+        def statement():
+            expression()
+        return statement
+
+    def compile_condition(self, node):
+        """Compile an expression into a closure returning its truthiness"""
+        if type(node) is LogicalNode:
+            #only the truthiness of each side matters, so neither side's value is kept
+            conditions = [self.compile_condition(operand) for operand in node.operands()]
+            if len(conditions) == 2:
+                left, right = conditions
+                if node.op == OP_AND:
+                    def both():
+                        return left() and right()
+                    return both
+                def either():
+                    return left() or right()
+                return either
+            if node.op == OP_AND:
+                def all_true():
+                    for condition in conditions:
+                        if not condition():
+                            return False
+                    return True
+                return all_true
+            def any_true():
+                for condition in conditions:
+                    if condition():
+                        return True
+                return False
+            return any_true
+        if type(node) is UnaryOpNode and node.op == OP_NOT:
+            operand = self.compile_condition(node.operand)
+            def negated():
+                return not operand()
+            return negated
+        expression = self.compile(node)
+        if type(node) is BinaryOpNode and node.op in COMPARISONS:
+            #comparisons already produce a bool
+            return expression
+        is_truthy = self.is_truthy
+        def condition():
+            value = expression()
+            if value is True or value is False:
+                return value
+            return is_truthy(value)
+        return condition
+
+    def compile_arguments(self, arguments):
+        """Compile call arguments into a closure returning their values as a list"""
+        arguments = tuple(self.compile(argument) for argument in arguments)
+        if len(arguments) == 0:
+            def no_arguments():
+                return []
+            return no_arguments
+        elif len(arguments) == 1:
+            first, = arguments
+            def one_argument():
+                return [first()]
+            return one_argument
+        elif len(arguments) == 2:
+            first, second = arguments
+            def two_arguments():
+                return [first(), second()]
+            return two_arguments
+        def arguments_list():
+            return [argument() for argument in arguments]
+        return arguments_list
+
+    def compile_NumberNode(self, node):
+        value = node.value
+        def constant():
+            return value
+        return constant
+
+    compile_StringNode = compile_NumberNode
+    compile_BooleanNode = compile_NumberNode
+
+    def compile_VariableNode(self, node):
+        name = node.name
+        if node.slot is not None:
+            slot = node.slot
+            engine = self
+            load_global = self.load_global
+            def local_variable():
+                value = engine.frame[slot]
+                if value is UNSET:
+                    return load_global(name)
+                return value
+            return local_variable
+        variables = self.variables
+        def variable():
+            try:
+                return variables[name]
+            except KeyError:
+                raise Exception(f"Undefined variable: {name}") from None
+        return variable
+
+    def compile_UnaryOpNode(self, node):
+        if node.op == OP_NOT:
+            return self.compile_condition(node)
+        if type(node.operand) is NumberNode:
+            return self.compile(NumberNode(self.unary_operation(node.op, node.operand.value)))
+        operand = self.compile(node.operand)
+        if node.op == OP_MINUS:
+            def negate():
+                return -operand()
+            return negate
+        def positive():
+            return +operand()
+        return positive
+
+    def compile_LogicalNode(self, node):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        is_truthy = self.is_truthy
+        if node.op == OP_AND:
+            def logical_and():
+                left_val = left()
+                if left_val is False or (left_val is not True and not is_truthy(left_val)):
+                    return left_val
+                return right()
+            return logical_and
+        def logical_or():
+            left_val = left()
+            if left_val is True or (left_val is not False and is_truthy(left_val)):
+                return left_val
+            return right()
+        return logical_or
+
+    def compile_BinaryOpNode(self, node):
+        op = node.op
+        left = self.compile(node.left)
+        right_node = node.right
+        right = self.compile(right_node)
+        #literal right operands (i + 1, s + "x") are captured directly
+        constant = right_node.value if type(right_node) in (NumberNode, StringNode) else None
+
+        if op in COMPARISONS:
+            compare = COMPARISONS[op]
+            if constant is not None:
+                def compare_constant():
+                    return compare(left(), constant)
+                return compare_constant
+            def comparison():
+                return compare(left(), right())
+            return comparison
+
+        if op == OP_PLUS:
+            if type(constant) is str:
+                def concat_constant():
+                    return str(left()) + constant
+                return concat_constant
+            if constant is not None:
+                constant_text = str(constant)
+                def plus_constant():
+                    left_val = left()
+                    if isinstance(left_val, str):
+                        return left_val + constant_text
+                    return left_val + constant
+                return plus_constant
+            def plus():
+                left_val = left()
+                right_val = right()
+                if type(left_val) is float and type(right_val) is float:
+                    return left_val + right_val
+                if isinstance(left_val, str) or isinstance(right_val, str):
+                    return str(left_val) + str(right_val)
+                return left_val + right_val
+            return plus
+
+        binary_operation = self.binary_operation
+        if op == OP_MINUS:
+            if type(constant) is float:
+                def minus_constant():
+                    left_val = left()
+                    if type(left_val) is float:
+                        return left_val - constant
+                    return binary_operation(op, left_val, constant)
+                return minus_constant
+            def minus():
+                left_val = left()
+                right_val = right()
+                if type(left_val) is float and type(right_val) is float:
+                    return left_val - right_val
+                return binary_operation(op, left_val, right_val)
+            return minus
+
+        if op == OP_MULTIPLY:
+            def multiply():
+                left_val = left()
+                right_val = right()
+                if type(left_val) is float and type(right_val) is float:
+                    return left_val * right_val
+                return binary_operation(op, left_val, right_val)
+            return multiply
+
+        if op == OP_DIVIDE:
+            def divide():
+                left_val = left()
+                right_val = right()
+                if type(left_val) is float and type(right_val) is float and right_val != 0:
+                    return left_val / right_val
+                return binary_operation(op, left_val, right_val)
+            return divide
+
+        def binary():
+            return binary_operation(op, left(), right())
+        return binary
+
+    def compile_ArrayNode(self, node):
+        if node.constant is not None:
+            constant = node.constant
+            def constant_array():
+                return list(constant)
+            return constant_array
+        return self.compile_arguments(node.elements)
+
+    def compile_FStringNode(self, node):
+        parts = tuple(self.compile(part) for part in node.parts)
+        if len(parts) == 2:
+            #the common "text{x}" and "{x}text" shapes
+            first, second = parts
+            def two_parts():
+                return str(first()) + str(second())
+            return two_parts
+        def fstring():
+            return ''.join([str(part()) for part in parts])
+        return fstring
+
+    def compile_MapNode(self, node):
+        items = self.compile_arguments(node.items)
+        def map_literal():
+            return build_map(items())
+        return map_literal
+
+    def compile_IndexNode(self, node):
+        array = self.compile(node.array)
+        index = self.compile(node.index)
+        index_value = self.index_value
+        def index_expression():
+            array_value = array()
+            index_val = index()
+            if type(array_value) is list and type(index_val) is float:
+                try:
+                    return array_value[int(index_val)]
+                except IndexError:
+                    pass
+            #slow path, also raises the error
+            return index_value(array_value, index_val)
+        return index_expression
+
+    def compile_MethodCallNode(self, node):
+        object_expr = self.compile(node.object_expr)
+        arguments = self.compile_arguments(node.arguments)
+        method_name = node.method_name
+        call_method = self.call_method
+        def method_call():
+            object_value = object_expr()
+            return call_method(object_value, method_name, arguments())
+        return method_call
+
+    def compile_FunctionCallNode(self, node):
+        function_name = node.function_name
+        argument_count = len(node.arguments)
+        arguments = self.compile_arguments(node.arguments)
+        user_functions = self.user_functions
+        builtin_functions = self.builtin_functions
+        check_call = self.check_call
+        call_compiled = self.call_compiled
+        #functions can be defined after this call is compiled, so they are looked up on every call
+        def function_call():
+            function = user_functions.get(function_name)
+            if function is not None:
+                if len(function['parameters']) != argument_count:
+                    check_call(function_name, argument_count)
+                return call_compiled(function, arguments())
+            builtin = builtin_functions.get(function_name)
+            if builtin is None:
+                check_call(function_name, argument_count)
+            return builtin(arguments())
+        return function_call
+
+    def _call_user_function(self, function_name, arg_values):
+        """Call a user-defined function (used by the tree walker fallbacks)"""
+        return self.call_compiled(self.user_functions[function_name], arg_values)
+
+    def call_compiled(self, func_info, arg_values):
+        """Call a compiled function, through its result cache if it is memoized"""
+        memo = func_info['memo']
+        if memo is not None:
+            key = memo.key(arg_values)
+            if key is not None:
+                value = memo.lookup(key)
+                if value is MISSING:
+                    value = self.run_compiled(func_info, arg_values)
+                    memo.store(key, value)
+                return value
+        return self.run_compiled(func_info, arg_values)
+
+    def run_compiled(self, func_info, arg_values):
+        """Run a compiled function body with its parameters bound"""
+        old_frame = self.frame
+        self.frame = new_frame(arg_values, func_info['frame_size'])
+        try:
+            signal = func_info['code']()
+        finally:
+            self.frame = old_frame
+
+        if signal is RETURN:
+            result = self.return_value
+            self.return_value = None
+            return result
+        #break/continue outside a loop unwind into the caller's loop as exceptions
+        self.raise_signal(signal)
+        return None
+
+    def compile_AssignmentNode(self, node):
+        name = node.variable_name
+        value = self.compile(node.value)
+        if node.slot is not None:
+            slot = node.slot
+            engine = self
+            def local_assignment():
+                engine.frame[slot] = value()
+            return local_assignment
+        variables = self.variables
+        def assignment():
+            variables[name] = value()
+        return assignment
+
+    def compile_IndexAssignmentNode(self, node):
+        array = self.compile(node.array)
+        index = self.compile(node.index)
+        value = self.compile(node.value)
+        assign_index = self.assign_index
+        def index_assignment():
+            array_value = array()
+            index_val = index()
+            assign_index(array_value, index_val, value())
+        return index_assignment
+
+    def compile_BlockNode(self, node):
+        statements = tuple(self.compile_statement(statement) for statement in node.statements)
+        if len(statements) == 1:
+            return statements[0]
+        def block():
+            for statement in statements:
+                signal = statement()
+                if signal is not None:
+                    return signal
+        return block
+
+    def compile_IfNode(self, node):
+        branches = [(self.compile_condition(node.condition), self.compile_statement(node.if_body))]
+        for elif_condition, elif_body in node.elif_clauses:
+            branches.append((self.compile_condition(elif_condition), self.compile_statement(elif_body)))
+        else_body = self.compile_statement(node.else_body) if node.else_body else None
+
+        if len(branches) == 1:
+            condition, body = branches[0]
+            if else_body is None:
+                def if_statement():
+                    if condition():
+                        return body()
+                return if_statement
+            def if_else_statement():
+                if condition():
+                    return body()
+                return else_body()
+            return if_else_statement
+
+        def if_chain_statement():
+            for condition, body in branches:
+                if condition():
+                    return body()
+            if else_body is not None:
+                return else_body()
+        return if_chain_statement
+
+    def compile_WhileNode(self, node):
+        condition = self.compile_condition(node.condition)
+        body = self.compile_statement(node.body)
+        def while_statement():
+            #the exceptions only come from break/continue inside a called function
+            try:
+                while condition():
+                    try:
+                        signal = body()
+                    except ContinueException:
+                        continue
+                    if signal is BREAK:
+                        break
+                    elif signal is RETURN:
+                        return signal
+            except BreakException:
+                pass
+        return while_statement
+
+    def compile_ForNode(self, node):
+        iterable = self.compile(node.iterable)
+        body = self.compile_statement(node.body)
+        slot = node.slot
+        engine = self
+        def for_statement():
+            items = iterate(iterable())
+            frame = engine.frame
+            try:
+                for item in items:
+                    frame[slot] = item
+                    try:
+                        signal = body()
+                    except ContinueException:
+                        continue
+                    if signal is BREAK:
+                        break
+                    elif signal is RETURN:
+                        return signal
+            except BreakException:
+                pass
+        return for_statement
+
+    def compile_BreakNode(self, node):
+        def break_statement():
+            return BREAK
+        return break_statement
+
+    def compile_ContinueNode(self, node):
+        def continue_statement():
+            return CONTINUE
+        return continue_statement
+
+    def compile_ReturnNode(self, node):
+        engine = self
+        if node.value is None:
+            def return_none():
+                engine.return_value = None
+                return RETURN
+            return return_none
+        value = self.compile(node.value)
+        def return_statement():
+            engine.return_value = value()
+            return RETURN
+        return return_statement
+
+    def compile_FunctionDefNode(self, node):
+        function_name = node.name
+        parameters = node.parameters
+        body = node.body
+        frame_size = len(node.slot_names)
+        code = self.compile_statement(body)
+        memo = node.memo
+        user_functions = self.user_functions
+        memoize_function = self.memoize_function
+        def function_def():
+            user_functions[function_name] = {
+                'parameters': parameters,
+                'body': body,
+                'code': code,
+                'frame_size': frame_size,
+                'memo': None,
+            }
+            if memo:
+                memoize_function(function_name)
+        return function_def
@@ -0,0 +1,341 @@
+from bim.ast_nodes import *
+from bim.bytecode import *
+from bim.resolver import Resolver
+from bim.memo import function_purity
+
+#binary operator code -> opcode (comparisons share COMPARE_OP)
+BINARY_OPCODES = {
+    OP_PLUS: BINARY_ADD,
+    OP_MINUS: BINARY_SUBTRACT,
+    OP_MULTIPLY: BINARY_MULTIPLY,
+    OP_DIVIDE: BINARY_DIVIDE,
+}
+
+UNARY_OPCODES = {
+    OP_MINUS: UNARY_NEGATIVE,
+    OP_PLUS: UNARY_POSITIVE,
+    OP_NOT: UNARY_NOT,
+}
+
+#marks the point between an and/or node's operands on the expression work stack
+SHORT_CIRCUIT = 'short-circuit'
+
+#binary operators with a dedicated opcode for a literal number on the right (i + 1, n - 1)
+CONSTANT_OPCODES = {
+    OP_PLUS: BINARY_ADD_CONST,
+    OP_MINUS: BINARY_SUBTRACT_CONST,
+}
+
+class LoopContext:
+    """A loop being compiled, for break/continue"""
+    __slots__ = ('continue_target', 'break_jumps')
+
+    def __init__(self, continue_target):
+        self.continue_target = continue_target
+        self.break_jumps = []  # indexes of JUMP instructions to patch with the loop exit
+
+#compiles the AST into bytecode for the VM
+class Compiler:
+    """Compiles a program into a CodeObject; expressions are compiled without recursion"""
+    def __init__(self):
+        self.code = None
+        self.const_index = {}
+        self.name_index = {}
+        self.loop_stack = []
+        #stack slots held by enclosing for loops (their iterators)
+        self.stack_depth = 0
+
+    def compile_program(self, node):
+        """Compile a program (or a single top-level statement)"""
+        slot_names = Resolver().resolve_program(node)
+        return self.compile_code(PROGRAM_NAME, (), node, slot_names)
+
+    def compile_code(self, name, parameters, body, slot_names):
+        """Compile a body into a new code object"""
+        saved = (self.code, self.const_index, self.name_index, self.loop_stack, self.stack_depth)
+        self.code = CodeObject(name, parameters, slot_names=list(slot_names))
+        self.const_index = {}
+        self.name_index = {}
+        self.loop_stack = []
+        self.stack_depth = 0
+        try:
+            self.statement(body)
+            self.emit(RETURN_NONE)
+            return self.code
+        finally:
+            self.code, self.const_index, self.name_index, self.loop_stack, self.stack_depth = saved
+
+    def emit(self, opcode, arg=0):
+        """Append an instruction and return its index"""
+        index = len(self.code.code) // 2
+        self.code.code.append(opcode)
+        self.code.code.append(arg)
+        return index
+
+    def here(self):
+        """Index of the next instruction"""
+        return len(self.code.code) // 2
+
+    def patch(self, index, target):
+        """Point the jump at index to target"""
+        if self.code.code[2 * index] == COMPARE_JUMP_IF_FALSE:
+            target = target << COMPARE_SHIFT | self.code.code[2 * index + 1]
+        self.code.code[2 * index + 1] = target
+
+    def const(self, value):
+        """Index of a value in the constant pool"""
+        #keyed by repr since 1.0 == True and 0.0 == -0.0
+        key = (type(value), repr(value)) if not isinstance(value, CodeObject) else (CodeObject, id(value))
+        index = self.const_index.get(key)
+        if index is None:
+            index = len(self.code.consts)
+            self.code.consts.append(value)
+            self.const_index[key] = index
+        return index
+
+    def name(self, name):
+        """Index of a variable name in the name table"""
+        index = self.name_index.get(name)
+        if index is None:
+            index = len(self.code.names)
+            self.code.names.append(name)
+            self.name_index[name] = index
+        return index
+
+    def statement(self, node):
+        """Compile a statement; expression statements discard their value"""
+        compiler = getattr(self, f'compile_{type(node).__name__}', None)
+        if compiler is not None:
+            compiler(node)
+        else:
+            self.expression(node)
+            self.emit(POP_TOP)
+
+    def expression(self, node):
+        """Compile an expression with an explicit work stack (post-order emission)"""
+        #entries are (node, True) once the node's children have been emitted
+        work = [(node, False)]
+        short_circuits = []  # jumps of the and/or nodes whose right operand is being emitted, innermost last
+        while work:
+            node, expanded = work.pop()
+            node_type = type(node)
+
+            if not expanded:
+                if node_type is NumberNode or node_type is StringNode or node_type is BooleanNode:
+                    self.emit(LOAD_CONST, self.const(node.value))
+                elif node_type is VariableNode:
+                    if node.slot is not None:
+                        self.emit(LOAD_FAST, node.slot)
+                    else:
+                        self.emit(LOAD_NAME, self.name(node.name))
+                elif node_type is BinaryOpNode:
+                    work.append((node, True))
+                    if not (node.op in CONSTANT_OPCODES and type(node.right) is NumberNode):
+                        work.append((node.right, False))
+                    work.append((node.left, False))
+                elif node_type is UnaryOpNode:
+                    work.append((node, True))
+                    work.append((node.operand, False))
+                elif node_type is LogicalNode:
+                    #left, the short-circuit jump, right, then the jump is patched to land after right
+                    work.append((node, True))
+                    work.append((node.right, False))
+                    work.append((node, SHORT_CIRCUIT))
+                    work.append((node.left, False))
+                elif node_type is IndexNode:
+                    work.append((node, True))
+                    work.append((node.index, False))
+                    work.append((node.array, False))
+                elif node_type is ArrayNode:
+                    if node.constant is not None:
+                        self.emit(COPY_CONST_ARRAY, self.const(tuple(node.constant)))
+                    else:
+                        work.append((node, True))
+                        work.extend((element, False) for element in reversed(node.elements))
+                elif node_type is FStringNode:
+                    work.append((node, True))
+                    work.extend((part, False) for part in reversed(node.parts))
+                elif node_type is MapNode:
+                    work.append((node, True))
+                    work.extend((item, False) for item in reversed(node.items))
+                elif node_type is FunctionCallNode:
+                    #the function is checked before its arguments are evaluated
+                    self.emit(LOAD_FUNCTION, self.const((node.function_name, len(node.arguments))))
+                    work.append((node, True))
+                    work.extend((argument, False) for argument in reversed(node.arguments))
+                elif node_type is MethodCallNode:
+                    work.append((node, True))
+                    work.extend((argument, False) for argument in reversed(node.arguments))
+                    work.append((node.object_expr, False))
+                elif node_type is RangeNode:
+                    work.append((node, True))
+                    if node.step:
+                        work.append((node.step, False))
+                    work.append((node.stop, False))
+                    work.append((node.start, False))
+                else:
+                    raise Exception(f"No visit method for {node_type.__name__}")
+                continue
+
+            if node_type is BinaryOpNode:
+                if node.op in CONSTANT_OPCODES and type(node.right) is NumberNode:
+                    #the right operand was not pushed
+                    self.emit(CONSTANT_OPCODES[node.op], self.const(node.right.value))
+                elif node.op in BINARY_OPCODES:
+                    self.emit(BINARY_OPCODES[node.op])
+                else:
+                    self.emit(COMPARE_OP, node.op)
+            elif node_type is UnaryOpNode:
+                self.emit(UNARY_OPCODES[node.op])
+            elif node_type is LogicalNode:
+                if expanded is SHORT_CIRCUIT:
+                    short_circuits.append(self.emit(JUMP_IF_FALSE_OR_POP if node.op == OP_AND else JUMP_IF_TRUE_OR_POP))
+                else:
+                    self.patch(short_circuits.pop(), self.here())
+            elif node_type is IndexNode:
+                self.emit(BINARY_INDEX)
+            elif node_type is ArrayNode:
+                self.emit(BUILD_ARRAY, len(node.elements))
+            elif node_type is MapNode:
+                self.emit(BUILD_MAP, len(node.items) // 2)
+            elif node_type is FStringNode:
+                self.emit(BUILD_STRING, len(node.parts))
+            elif node_type is FunctionCallNode:
+                self.emit(CALL_FUNCTION, len(node.arguments))
+            elif node_type is MethodCallNode:
+                self.emit(CALL_METHOD, self.const((node.method_name, len(node.arguments))))
+            elif node_type is RangeNode:
+                self.emit(BUILD_RANGE, 3 if node.step else 2)
+
+    def compile_BlockNode(self, node):
+        for statement in node.statements:
+            self.statement(statement)
+
+    def compile_AssignmentNode(self, node):
+        value = node.value
+        if (type(value) is BinaryOpNode and value.op == OP_PLUS and type(value.left) is VariableNode
+                and value.left.name == node.variable_name and type(value.right) is NumberNode):
+            #x = x + 1
+            if node.slot is not None:
+                self.emit(INCREMENT_FAST, self.const((node.slot, value.right.value)))
+            else:
+                self.emit(INCREMENT_NAME, self.const((node.variable_name, value.right.value)))
+            return
+        self.expression(value)
+        if node.slot is not None:
+            self.emit(STORE_FAST, node.slot)
+        else:
+            self.emit(STORE_NAME, self.name(node.variable_name))
+
+    def compile_IndexAssignmentNode(self, node):
+        self.expression(node.array)
+        self.expression(node.index)
+        self.expression(node.value)
+        self.emit(STORE_INDEX)
+
+    def compile_IfNode(self, node):
+        branches = [(node.condition, node.if_body)] + list(node.elif_clauses)
+        end_jumps = []
+        for i, (condition, body) in enumerate(branches):
+            skips = self.jump_if(condition, False)
+            self.statement(body)
+            if i < len(branches) - 1 or node.else_body:
+                end_jumps.append(self.emit(JUMP))
+            for skip in skips:
+                self.patch(skip, self.here())
+        if node.else_body:
+            self.statement(node.else_body)
+        for jump in end_jumps:
+            self.patch(jump, self.here())
+
+    def jump_if(self, condition, when):
+        """Compile a condition into jumps to patch, taken when its truthiness is `when`.
+
+        and/or/not become control flow only: no operand value is kept on the stack or converted to a bool.
+        Comparisons fuse with the jump.
+        """
+        node_type = type(condition)
+        if node_type is LogicalNode:
+            *operands, last = condition.operands()
+            if (condition.op == OP_OR) == when:
+                #any operand alone decides: a and b is false if a is, a or b is true if a is
+                return [jump for operand in operands for jump in self.jump_if(operand, when)] + self.jump_if(last, when)
+            #only the last operand decides; the others can only skip past its jump
+            skips = [jump for operand in operands for jump in self.jump_if(operand, not when)]
+            jumps = self.jump_if(last, when)
+            for skip in skips:
+                self.patch(skip, self.here())
+            return jumps
+        if node_type is UnaryOpNode and condition.op == OP_NOT:
+            return self.jump_if(condition.operand, not when)
+        if node_type is BinaryOpNode and condition.op not in BINARY_OPCODES and not when:
+            self.expression(condition.left)
+            self.expression(condition.right)
+            return [self.emit(COMPARE_JUMP_IF_FALSE, condition.op)]
+        self.expression(condition)
+        return [self.emit(POP_JUMP_IF_TRUE if when else POP_JUMP_IF_FALSE)]
+
+    def compile_WhileNode(self, node):
+        start = self.here()
+        exit_jumps = self.jump_if(node.condition, False)
+        body_start = self.here()
+        self.loop_body(node.body, start)
+        self.emit(JUMP, start)
+        self.end_loop(start, body_start, exit_jumps)
+
+    def compile_ForNode(self, node):
+        self.expression(node.iterable)
+        self.emit(GET_ITER)
+        self.stack_depth += 1
+        start = self.emit(FOR_ITER)
+        self.emit(STORE_FAST, node.slot)
+        body_start = self.here()
+        self.loop_body(node.body, start)
+        self.emit(JUMP, start)
+        self.end_loop(body_start, body_start, [start])
+        self.stack_depth -= 1
+        #the loop variable's slot is out of scope, only the iterator is left to drop
+        self.emit(POP_TOP)
+
+    def loop_body(self, body, continue_target):
+        self.loop_stack.append(LoopContext(continue_target))
+        self.statement(body)
+
+    def end_loop(self, start, body_start, exit_jumps):
+        """Patch the loop exit and break jumps and record the loop for unwinding"""
+        loop = self.loop_stack.pop()
+        exit_target = self.here()
+        for jump in exit_jumps + loop.break_jumps:
+            self.patch(jump, exit_target)
+        self.code.loops.append((start, exit_target, exit_target, loop.continue_target, self.stack_depth, body_start))
+
+    def compile_BreakNode(self, node):
+        if self.loop_stack:
+            self.loop_stack[-1].break_jumps.append(self.emit(JUMP))
+        else:
+            self.emit(BREAK_OUT)
+
+    def compile_ContinueNode(self, node):
+        if self.loop_stack:
+            self.emit(JUMP, self.loop_stack[-1].continue_target)
+        else:
+            self.emit(CONTINUE_OUT)
+
+    def compile_ReturnNode(self, node):
+        if type(node.value) is FunctionCallNode and self.code.name != PROGRAM_NAME and not self.loop_stack:
+            #return f(...) outside any loop: nothing of this call is needed after f, so f can reuse its frame
+            #(inside a loop a break/continue leaving f must still reach that loop)
+            self.expression(node.value)
+            self.code.code[-2] = TAIL_CALL
+            return
+        if node.value is not None:
+            self.expression(node.value)
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+        self.emit(RETURN_VALUE)
+
+    def compile_FunctionDefNode(self, node):
+        code = self.compile_code(node.name, node.parameters, node.body, node.slot_names)
+        code.memo = node.memo
+        code.purity = function_purity(node.parameters, node.body)
+        self.emit(MAKE_FUNCTION, self.const(code))
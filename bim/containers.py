@@ -0,0 +1,87 @@
+class BoolKey:
+    """true or false as stored in a map or set, so it is a different key than 1 or 0 (true == 1 in Python)"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is BoolKey and other.value is self.value
+
+    def __hash__(self):
+        return hash((bool, self.value))
+
+    def __repr__(self):
+        return repr(self.value)
+
+TRUE_KEY = BoolKey(True)
+FALSE_KEY = BoolKey(False)
+
+#types that can be map keys and set elements (hashed by value; arrays and maps are mutable, so they cannot)
+KEY_TYPES = frozenset((float, int, str, bool, type(None), range, BoolKey))
+
+def check_key(key):
+    """key as a map or set stores it (booleans apart from numbers), or the error for a value that cannot be one"""
+    key_type = type(key)
+    if key_type not in KEY_TYPES:
+        raise Exception(f"Map keys and set elements must be numbers, strings, booleans or ranges, not {key_type.__name__}")
+    if key_type is bool:
+        return TRUE_KEY if key else FALSE_KEY
+    return key
+
+def key_value(key):
+    """The bim value of a stored map key or set element"""
+    return key.value if type(key) is BoolKey else key
+
+def build_map(items):
+    """Map from a flat list of keys and values (k1, v1, k2, v2, ...), as a {k1: v1, k2: v2} literal builds it"""
+    result = {}
+    for i in range(0, len(items), 2):
+        result[check_key(items[i])] = items[i + 1]
+    return result
+
+class OrderedSet:
+    """Set of keys that iterates in insertion order, so output does not depend on hashing.
+
+    Backed by a dict with None values, which keeps O(1) add, membership and removal.
+    """
+    __slots__ = ('entries',)
+
+    def __init__(self, values=()):
+        self.entries = dict.fromkeys(map(check_key, values))
+
+    def add(self, value):
+        self.entries[check_key(value)] = None
+
+    def delete(self, value):
+        """Remove value; whether it was there"""
+        try:
+            del self.entries[check_key(value)]
+        except KeyError:
+            return False
+        return True
+
+    def tolist(self):
+        return list(map(key_value, self.entries))
+
+    def __contains__(self, value):
+        return check_key(value) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return map(key_value, self.entries)
+
+    def __eq__(self, other):
+        return isinstance(other, OrderedSet) and self.entries.keys() == other.entries.keys()
+
+    __hash__ = None
+
+    def __str__(self):
+        if not self.entries:
+            return "set()"
+        return "{" + ", ".join(map(repr, self.entries)) + "}"
+
+    def __repr__(self):
+        return f"OrderedSet({self.tolist()})"
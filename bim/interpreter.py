@@ -1,12 +1,208 @@
+import operator
+from collections.abc import Iterator
 from bim.bim_token import TokenType
 from bim.exceptions import *
+from bim.ast_nodes import *
+from bim.resolver import Resolver
+from bim.memo import MemoCache, MISSING, DEFAULT_MEMO_SIZE, IMPURE_BUILTINS, function_purity
+from bim.typed_array import NumberArray, is_number
+from bim.string_builder import StringBuilder
+from bim.containers import OrderedSet, build_map, check_key, key_value
+
+#expression nodes evaluated iteratively by Interpreter.evaluate
+EXPRESSION_NODES = (UnaryOpNode, BinaryOpNode, LogicalNode, ArrayNode, IndexNode, FunctionCallNode, MethodCallNode)
+
+def contains(value, container):
+    """value in container: a key of a map, an element of a set, array, range or typed array, or a substring"""
+    if isinstance(container, (dict, OrderedSet)):
+        return check_key(value) in container
+    if isinstance(container, (list, NumberArray)):
+        return value in container
+    if isinstance(container, str):
+        if not isinstance(value, str):
+            raise Exception("'in' with a string needs a string on the left")
+        return value in container
+    if isinstance(container, range):
+        return range_contains(container, value)
+    raise Exception(f"Cannot use 'in' with {type(container).__name__}")
+
+#comparison operator code -> function applying it (for the compiling engines)
+COMPARISONS = {
+    OP_EQUAL: operator.eq,
+    OP_NOT_EQUAL: operator.ne,
+    OP_LESS_THAN: operator.lt,
+    OP_GREATER_THAN: operator.gt,
+    OP_LESS_EQUAL: operator.le,
+    OP_GREATER_EQUAL: operator.ge,
+    OP_IN: contains,
+}
+
+#array methods typed arrays share with arrays (the rest would have to build or hold non-numbers)
+TYPED_ARRAY_SHARED_METHODS = {'push', 'pop', 'length', 'insert', 'remove', 'index_of', 'contains', 'map', 'filter', 'reduce'}
+
+#expressions nested deeper than this are evaluated with the explicit stack
+DEEP_EXPRESSION_DEPTH = 200
+
+#value of a frame slot whose variable has not been assigned yet; reading it reads the global of the same name
+UNSET = object()
+
+def new_frame(arg_values, frame_size):
+    """Frame for a call: the arguments in the parameter slots and every other slot unset"""
+    return list(arg_values) + [UNSET] * (frame_size - len(arg_values))
+
+def iterate(iterable_value):
+    """Iterator a for loop walks, created without copying the iterable.
+
+    Arrays are walked by index, so elements pushed during the loop are visited and removing an element
+    shifts the ones after it. Strings and ranges are immutable. Iterators returned by host functions
+    (such as Python generators) are consumed as they are.
+    """
+    if isinstance(iterable_value, (list, str, range, NumberArray, OrderedSet)):
+        return iter(iterable_value)
+    if isinstance(iterable_value, dict):
+        return map(key_value, iterable_value)
+    if isinstance(iterable_value, Iterator):
+        return iterable_value
+    raise Exception(f"Cannot iterate over {type(iterable_value)}")
+
+def range_length(range_value):
+    """Number of values in a range without producing them"""
+    try:
+        return len(range_value)
+    except OverflowError:
+        #len() is limited to sys.maxsize
+        start, stop, step = range_value.start, range_value.stop, range_value.step
+        if step > 0:
+            return max(0, (stop - start + step - 1) // step)
+        return max(0, (start - stop - step - 1) // -step)
+
+def array_sum(array):
+    """Sum of an array of numbers, added in order like a loop would"""
+    if not all(map(is_number, array)):
+        raise Exception("sum() can only add numbers")
+    return sum(array, 0.0)
+
+def string_argument(value, method_name):
+    """A string method's string argument, or the error for anything else"""
+    if not isinstance(value, str):
+        raise Exception(f"{method_name}() takes a string")
+    return value
+
+def range_contains(range_value, value):
+    """Membership test in constant time; only whole numbers can be in a range"""
+    if isinstance(value, float):
+        if not value.is_integer():
+            return False
+        value = int(value)
+    elif not isinstance(value, int):
+        return False
+    return value in range_value
+
+class Signal:
+    """Completion signal a statement returns to unwind to the enclosing loop or call"""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Signal({self.name})"
+
+BREAK = Signal('break')
+CONTINUE = Signal('continue')
+RETURN = Signal('return')
+
+#a BinaryOpNode specializes after running this many times in a row with the same operand types
+QUICKEN_AFTER = 8
+#a site whose specialization failed its type guard this many times stays generic
+MAX_SPECIALIZATIONS = 4
+
+def divide_numbers(left_val, right_val):
+    """number / number with the language's division by zero error"""
+    if right_val == 0:
+        raise Exception("Division by zero!")
+    return left_val / right_val
+
+def concatenate(left_val, right_val):
+    """+ with a string operand"""
+    return str(left_val) + str(right_val)
+
+def build_specializations():
+    """(operator code, left type, right type) -> function giving the same result as binary_operation"""
+    specializations = {}
+    for left_type in (int, float):
+        for right_type in (int, float):
+            specializations[(OP_PLUS, left_type, right_type)] = operator.add
+            specializations[(OP_MINUS, left_type, right_type)] = operator.sub
+            specializations[(OP_MULTIPLY, left_type, right_type)] = operator.mul
+            specializations[(OP_DIVIDE, left_type, right_type)] = divide_numbers
+            for op, compare in COMPARISONS.items():
+                specializations[(op, left_type, right_type)] = compare
+    for op, compare in COMPARISONS.items():
+        specializations[(op, str, str)] = compare
+    specializations[(OP_PLUS, str, str)] = operator.add
+    return specializations
+
+SPECIALIZATIONS = build_specializations()
+
+def specialization(op, left_type, right_type):
+    """Fast function for an operator on two operand types, or None if the site should stay generic"""
+    if op == OP_EQUAL or op == OP_NOT_EQUAL:
+        #equality never depends on the types
+        return COMPARISONS[op]
+    if op == OP_PLUS and (left_type is str) != (right_type is str):
+        return concatenate
+    return SPECIALIZATIONS.get((op, left_type, right_type))
+
+class InlineCache:
+    """What a BinaryOpNode site has seen: the operand types, its specialized operation and hit/miss counters"""
+    __slots__ = ('left_type', 'right_type', 'operation', 'seen_types', 'warmup', 'specializations', 'hits', 'misses')
+
+    def __init__(self):
+        #the guard: operation is used while both operand types match (None while the site is generic)
+        self.left_type = None
+        self.right_type = None
+        self.operation = None
+        self.seen_types = None  # operand types of the last generic execution
+        self.warmup = 0  # generic executions in a row with seen_types
+        self.specializations = 0
+        self.hits = 0  # executions that took the specialized operation
+        self.misses = 0  # executions that went through binary_operation
+
+    @property
+    def state(self):
+        if self.operation is not None:
+            return f"specialized for {self.left_type.__name__}, {self.right_type.__name__}"
+        if self.specializations >= MAX_SPECIALIZATIONS:
+            return "generic (too many operand types)"
+        return "generic"
+
+def operand_label(node):
+    """Short source-like text for an operand in diagnostics"""
+    if isinstance(node, VariableNode):
+        return node.name
+    if isinstance(node, (NumberNode, StringNode, BooleanNode)):
+        return repr(node.value)
+    return "(...)"
 
 #executes the created AST
 class Interpreter:
     def __init__(self):
-        #stored variables
+        #global variables
         self.variables = {} 
+        #slots of the running function's local variables (for the top level, its for loop variables)
+        self.frame = []
         self.user_functions = {}
+        #node class -> bound visit method, filled in on first use
+        self.dispatch = {}
+        #BinaryOpNodes that have an inline cache, for quickening_report()
+        self.inline_caches = []
+        #value of the last return statement, picked up by the call that receives the RETURN signal
+        self.return_value = None
+        #entries in the result cache of each memoized function
+        self.memo_size = DEFAULT_MEMO_SIZE
+        #MemoCache of every function that has been memoized, for memoization_report()
+        self.memo_caches = []
         self.builtin_functions = {
             'print': self._builtin_print,
             'abs': self._builtin_abs,
@@ -16,19 +212,157 @@ class Interpreter:
             'upper': self._builtin_upper,
             'lower': self._builtin_lower,
             'range': self._builtin_range,
+            'memoize': self._builtin_memoize,
+            'zeros': self._builtin_zeros,
+            'fill': self._builtin_fill,
+            'from': self._builtin_from,
+            'sum': self._builtin_sum,
+            'mean': self._builtin_mean,
+            'dot': self._builtin_dot,
+            'builder': self._builtin_builder,
+            'set': self._builtin_set,
         }
+        #method name -> function(string, args) implementing it
+        self.string_methods = {
+            'length': self._string_length,
+            'charAt': self._string_char_at,
+            'upper': self._string_upper,
+            'lower': self._string_lower,
+            'split': self._string_split,
+            'join': self._string_join,
+            'find': self._string_find,
+            'index_of': self._string_find,
+            'replace': self._string_replace,
+            'substring': self._string_slice,
+            'slice': self._string_slice,
+            'starts_with': self._string_starts_with,
+            'ends_with': self._string_ends_with,
+            'trim': self._string_trim,
+            'to_number': self._string_to_number,
+            'repeat': self._string_repeat,
+        }
+        #value type -> function(value, method name, args) handling its methods
+        self.method_handlers = {
+            list: self._handle_array_method,
+            str: self._handle_string_method,
+            range: self._handle_range_method,
+            NumberArray: self._handle_typed_array_method,
+            StringBuilder: self._handle_builder_method,
+            dict: self._handle_map_method,
+            OrderedSet: self._handle_set_method,
+        }
+
+    def run(self, node):
+        """Execute a program (or a single top-level statement)"""
+        self.frame = new_frame((), len(Resolver().resolve_program(node)))
+        self.raise_signal(self.visit(node))
+
+    def raise_signal(self, signal):
+        """Signals that reach the top level (or leave a function) become the host-visible exceptions"""
+        if signal is BREAK:
+            raise BreakException()
+        elif signal is CONTINUE:
+            raise ContinueException()
+        elif signal is RETURN:
+            raise ReturnException(self.return_value)
 
     def visit(self, node):
         """execute a node and return it"""
-        if isinstance(node, (int, float)):
-            return node
+        visitor = self.dispatch.get(type(node))
+        if visitor is None:
+            visitor = self.resolve_visitor(type(node))
+        return visitor(node)
 
-        method_name = f'visit_{type(node).__name__}'
-        if hasattr(self, method_name):
-            visitor = getattr(self, method_name)
-            return visitor(node)
+    def resolve_visitor(self, node_type):
+        """Find the visitor for a node class once and remember it in the dispatch table"""
+        if issubclass(node_type, (int, float)):
+            visitor = self.visit_number_value
         else:
-            raise Exception(f"No visit method for {type(node).__name__}")
+            visitor = getattr(self, f'visit_{node_type.__name__}', None)
+            if visitor is None:
+                raise Exception(f"No visit method for {node_type.__name__}")
+        self.dispatch[node_type] = visitor
+        return visitor
+
+    def visit_number_value(self, value):
+        """plain numbers evaluate to themselves"""
+        return value
+
+    def enable_explicit_stack(self):
+        """Evaluate expressions with evaluate() instead of recursive visits (for very deeply nested expressions)"""
+        for node_type in EXPRESSION_NODES:
+            setattr(self, f'visit_{node_type.__name__}', self.evaluate)
+        self.dispatch.clear()
+
+    def evaluate(self, node):
+        """Evaluate an expression with an explicit work stack, so nesting depth is not limited by Python recursion"""
+        values = []
+        #entries are (node, True) once the node's children have been pushed
+        work = [(node, False)]
+
+        while work:
+            node, expanded = work.pop()
+            node_type = type(node)
+
+            if not expanded:
+                if node_type is BinaryOpNode:
+                    work.append((node, True))
+                    work.append((node.right, False))
+                    work.append((node.left, False))
+                elif node_type is UnaryOpNode:
+                    work.append((node, True))
+                    work.append((node.operand, False))
+                elif node_type is LogicalNode:
+                    #the right operand is pushed only once the left one turns out not to decide the result
+                    work.append((node, True))
+                    work.append((node.left, False))
+                elif node_type is IndexNode:
+                    work.append((node, True))
+                    work.append((node.index, False))
+                    work.append((node.array, False))
+                elif node_type is ArrayNode and node.constant is not None:
+                    values.append(list(node.constant))
+                elif node_type is ArrayNode or node_type is FunctionCallNode or node_type is MethodCallNode:
+                    if node_type is FunctionCallNode:
+                        self.check_call(node.function_name, len(node.arguments))
+                    work.append((node, True))
+                    work.extend((argument, False) for argument in reversed(node.arguments if node_type is not ArrayNode else node.elements))
+                    if node_type is MethodCallNode:
+                        work.append((node.object_expr, False))
+                elif node_type is NumberNode or node_type is StringNode or node_type is BooleanNode:
+                    values.append(node.value)
+                else:
+                    #statements and leaves go through the normal visitors
+                    values.append(self.visit(node))
+                continue
+
+            if node_type is BinaryOpNode:
+                right_val = values.pop()
+                values[-1] = self.binary_operation(node.op, values[-1], right_val)
+            elif node_type is UnaryOpNode:
+                values[-1] = self.unary_operation(node.op, values[-1])
+            elif node_type is LogicalNode:
+                if self.is_truthy(values[-1]) != (node.op == OP_OR):
+                    values.pop()
+                    work.append((node.right, False))
+            elif node_type is IndexNode:
+                index_val = values.pop()
+                values[-1] = self.index_value(values[-1], index_val)
+            elif node_type is ArrayNode:
+                count = len(node.elements)
+                elements = values[len(values) - count:]
+                del values[len(values) - count:]
+                values.append(elements)
+            else:
+                count = len(node.arguments)
+                arg_values = values[len(values) - count:]
+                del values[len(values) - count:]
+                if node_type is FunctionCallNode:
+                    values.append(self.call_function(node.function_name, arg_values))
+                else:
+                    values[-1] = self.call_method(values[-1], node.method_name, arg_values)
+
+        return values[0]
     
     def visit_NumberNode(self, node):
         """just return the number"""
@@ -43,19 +377,38 @@ class Interpreter:
     
     def visit_UnaryOpNode(self, node):
         """return the value of number along with its sign"""
-        operand_val = self.visit(node.operand)
-        
-        if node.operator.type == TokenType.PLUS:
+        return self.unary_operation(node.op, self.visit(node.operand))
+
+    def unary_operation(self, op, operand_val):
+        """apply a unary operator to an evaluated operand"""
+        if op == OP_PLUS:
             return +operand_val
-        elif node.operator.type == TokenType.MINUS:
+        elif op == OP_MINUS:
             return -operand_val
+        elif op == OP_NOT:
+            return not self.is_truthy(operand_val)
+
+    def visit_LogicalNode(self, node):
+        """a and b / a or b: the value of the side that decides the result; the right side only runs if needed"""
+        left_val = self.visit(node.left)
+        if self.is_truthy(left_val) == (node.op == OP_OR):
+            return left_val
+        return self.visit(node.right)
     
     def visit_VariableNode(self, node):
         """Look up a variable's value"""
-        if node.name in self.variables:
-            return self.variables[node.name]
+        if node.slot is not None:
+            value = self.frame[node.slot]
+            if value is not UNSET:
+                return value
+        return self.load_global(node.name)
+
+    def load_global(self, name):
+        """Look up a global variable"""
+        if name in self.variables:
+            return self.variables[name]
         else:
-            raise Exception(f"Undefined variable: {node.name}")
+            raise Exception(f"Undefined variable: {name}")
         
     def visit_IfNode(self, node):
         """execute if node"""
@@ -76,15 +429,13 @@ class Interpreter:
         return None
         
     def visit_BlockNode(self, node):
-        """Execute block with break/continue propagation"""
-        result = None
+        """Execute block, stopping at the first break/continue/return signal"""
+        visit = self.visit
         for statement in node.statements:
-            try:
-                result = self.visit(statement)
-            except (BreakException, ContinueException):
-                # raise break/continue so that the loop handler can catch it
-                raise
-        return result
+            result = visit(statement)
+            if type(result) is Signal:
+                return result
+        return None
 
     
     def is_truthy(self, value):
@@ -103,30 +454,75 @@ class Interpreter:
         """execute the operation and return its value"""
         left_val = self.visit(node.left)  
         right_val = self.visit(node.right)
-        
-        # Do the operation
+        cache = node.cache
+        #guard: the specialized operation is only valid for the types it was made for
+        if cache is not None and type(left_val) is cache.left_type and type(right_val) is cache.right_type:
+            cache.hits += 1
+            return cache.operation(left_val, right_val)
+        return self.quicken(node, left_val, right_val)
+
+    def quicken(self, node, left_val, right_val):
+        """Generic path of a BinaryOpNode; specializes the node once its operand types are stable"""
+        cache = node.cache
+        if cache is None:
+            cache = node.cache = InlineCache()
+            self.inline_caches.append(node)
+        cache.misses += 1
+        types = (type(left_val), type(right_val))
+
+        if cache.operation is not None:
+            #the guard failed: go back to the generic path until the new types are stable
+            cache.left_type = cache.right_type = cache.operation = None
+        if cache.specializations < MAX_SPECIALIZATIONS:
+            if types == cache.seen_types:
+                cache.warmup += 1
+                if cache.warmup >= QUICKEN_AFTER:
+                    cache.warmup = 0
+                    operation = specialization(node.op, *types)
+                    if operation is not None:
+                        cache.left_type, cache.right_type = types
+                        cache.operation = operation
+                        cache.specializations += 1
+            else:
+                cache.seen_types = types
+                cache.warmup = 1
+        return self.binary_operation(node.op, left_val, right_val)
+
+    def quickening_report(self):
+        """One line per binary operator site that has run: its state and inline cache hits/misses"""
+        lines = []
+        for node in sorted(self.inline_caches, key=lambda node: -(node.cache.hits + node.cache.misses)):
+            cache = node.cache
+            label = f"{operand_label(node.left)} {OPERATOR_SYMBOLS[node.op]} {operand_label(node.right)}"
+            lines.append(f"{label}: {cache.state}, {cache.hits} hits, {cache.misses} misses")
+        return lines
+
+    def binary_operation(self, op, left_val, right_val):
+        """apply a binary operator to two evaluated operands"""
         #math symbols
-        if node.operator.type == TokenType.PLUS:
+        if op == OP_PLUS:
             if isinstance(left_val, str) or isinstance(right_val, str):
                 return str(left_val) + str(right_val)
             return left_val + right_val
         
-        elif node.operator.type == TokenType.MINUS:
+        elif op == OP_MINUS:
             if isinstance(left_val, str) or isinstance(right_val, str):
                 raise Exception("Cannot subtract strings")
             return left_val - right_val
         
-        elif node.operator.type == TokenType.MULTIPLY:
+        elif op == OP_MULTIPLY:
             if isinstance(left_val, str) and isinstance(right_val, (int, float)):
                 return left_val * int(right_val)
             elif isinstance(left_val, (int, float)) and isinstance(right_val, str):
                 return int(left_val) * right_val
             elif isinstance(left_val, (int, float)) and isinstance(right_val, (int, float)):
                 return left_val * right_val
+            elif isinstance(left_val, NumberArray) or isinstance(right_val, NumberArray):
+                return left_val * right_val
             else:
                 raise Exception("Unsupported multiplication operation")
             
-        elif node.operator.type == TokenType.DIVIDE:
+        elif op == OP_DIVIDE:
             if isinstance(left_val, str) or isinstance(right_val, str):
                 raise Exception("Cannot divide strings")
             if right_val == 0:
@@ -134,29 +530,34 @@ class Interpreter:
             return left_val / right_val
         
         #comparisons
-        elif node.operator.type == TokenType.EQUAL:
+        elif op == OP_EQUAL:
             return left_val == right_val
-        elif node.operator.type == TokenType.NOT_EQUAL:
+        elif op == OP_NOT_EQUAL:
             return left_val != right_val
-        elif node.operator.type == TokenType.LESS_THAN:
+        elif op == OP_LESS_THAN:
             return left_val < right_val
-        elif node.operator.type == TokenType.GREATER_THAN:
+        elif op == OP_GREATER_THAN:
             return left_val > right_val
-        elif node.operator.type == TokenType.LESS_EQUAL:
+        elif op == OP_LESS_EQUAL:
             return left_val <= right_val
-        elif node.operator.type == TokenType.GREATER_EQUAL:
+        elif op == OP_GREATER_EQUAL:
             return left_val >= right_val
+        elif op == OP_IN:
+            return contains(left_val, right_val)
 
 
     def visit_AssignmentNode(self, node):
         """Store the assigned variable"""
         value = self.visit(node.value) 
-        self.variables[node.variable_name] = value
+        if node.slot is not None:
+            self.frame[node.slot] = value
+        else:
+            self.variables[node.variable_name] = value
         return value 
     
     def visit_WhileNode(self, node):
         """Execute while loop with break/continue support"""
-        result = None
+        # the exceptions only come from break/continue inside a called function
         try:
             while True:
                 condition_value = self.visit(node.condition)
@@ -164,67 +565,54 @@ class Interpreter:
                     break
                 
                 try:
-                    result = self.visit(node.body)
+                    signal = self.visit(node.body)
                 except ContinueException:
                     continue
-                except BreakException:
+                if signal is BREAK:
                     break
+                elif signal is RETURN:
+                    return signal
                     
         except BreakException:
             pass
         
-        return result
+        return None
 
 
     def visit_ForNode(self, node):
         """Execute for loop with break/continue support"""
-        result = None
+        items = iterate(self.visit(node.iterable))
         
-        iterable_value = self.visit(node.iterable)
-        
-        # Handle different types of iterables
-        if isinstance(iterable_value, list):
-            items = iterable_value
-        elif isinstance(iterable_value, str):
-            items = list(iterable_value)
-        elif isinstance(iterable_value, range):
-            items = list(iterable_value)
-        else:
-            raise Exception(f"Cannot iterate over {type(iterable_value)}")
-        
-        # Save the old value of the loop variable
-        old_value = self.variables.get(node.variable)
+        # The loop variable has its own slot, so the outer variable of the same name is untouched
+        frame = self.frame
+        slot = node.slot
         
         try:
             for item in items:
-                self.variables[node.variable] = item
+                frame[slot] = item
                 
                 try:
-                    result = self.visit(node.body)
+                    signal = self.visit(node.body)
                 except ContinueException:
                     continue
-                except BreakException:
+                if signal is BREAK:
                     break
+                elif signal is RETURN:
+                    return signal
                     
         except BreakException:
             pass
-        finally:
-            # Restore the old value of the loop variable
-            if old_value is not None:
-                self.variables[node.variable] = old_value
-            elif node.variable in self.variables:
-                del self.variables[node.variable]
         
-        return result
+        return None
 
     
     def visit_BreakNode(self, node):
-        """Handle break statement by raising an exception"""
-        raise BreakException()
+        """Handle break statement by signalling the enclosing loop"""
+        return BREAK
 
     def visit_ContinueNode(self, node):
-        """Handle continue statement by raising an exception"""
-        raise ContinueException()
+        """Handle continue statement by signalling the enclosing loop"""
+        return CONTINUE
 
 
     def visit_RangeNode(self, node):
@@ -240,17 +628,34 @@ class Interpreter:
  
     def visit_ArrayNode(self, node):
         """Create an array"""
+        if node.constant is not None:
+            return list(node.constant)
         elements = []
         for element_expr in node.elements:
             elements.append(self.visit(element_expr))
         return elements
 
+    def visit_FStringNode(self, node):
+        """Join the text and expression values of an interpolated string, formatted as print shows them"""
+        visit = self.visit
+        return ''.join([str(visit(part)) for part in node.parts])
+
+    def visit_MapNode(self, node):
+        """Create a map"""
+        return build_map([self.visit(item) for item in node.items])
+
     def visit_IndexNode(self, node):
         """Get element from array by index"""
-        array_value = self.visit(node.array)
-        index_value = self.visit(node.index)
-        
-        if not isinstance(array_value, (list, str)):
+        return self.index_value(self.visit(node.array), self.visit(node.index))
+
+    def index_value(self, array_value, index_value):
+        """Get element from an evaluated array, string, range or typed array, or a map's value for a key"""
+        if type(array_value) is dict:
+            try:
+                return array_value[check_key(index_value)]
+            except KeyError:
+                raise Exception(f"Key not found: {index_value!r}") from None
+        if not isinstance(array_value, (list, str, range, NumberArray)):
             raise Exception(f"Cannot index {type(array_value).__name__}")
         
         if not isinstance(index_value, (int, float)):
@@ -268,8 +673,14 @@ class Interpreter:
         array_value = self.visit(node.array)
         index_value = self.visit(node.index)
         new_value = self.visit(node.value)
-        
-        if not isinstance(array_value, list):
+        return self.assign_index(array_value, index_value, new_value)
+
+    def assign_index(self, array_value, index_value, new_value):
+        """Store a value into an evaluated array or typed array, or under a key of a map"""
+        if type(array_value) is dict:
+            array_value[check_key(index_value)] = new_value
+            return new_value
+        if not isinstance(array_value, (list, NumberArray)):
             raise Exception(f"Cannot assign to index of {type(array_value).__name__}")
         
         if not isinstance(index_value, (int, float)):
@@ -286,74 +697,138 @@ class Interpreter:
     def visit_MethodCallNode(self, node):
         """Handle method calls on objects"""
         object_value = self.visit(node.object_expr)
-        method_name = node.method_name
         arg_values = [self.visit(arg) for arg in node.arguments]
-        
-        if isinstance(object_value, list):
-            return self._handle_array_method(object_value, method_name, arg_values)
-        elif isinstance(object_value, str):
-            return self._handle_string_method(object_value, method_name, arg_values)
-        else:
+        return self.call_method(object_value, node.method_name, arg_values)
+
+    def call_method(self, object_value, method_name, arg_values):
+        """Call a method on an evaluated object"""
+        handler = self.method_handlers.get(type(object_value))
+        if handler is None:
             raise Exception(f"Object of type {type(object_value).__name__} has no methods")
+        return handler(object_value, method_name, arg_values)
         
     def visit_FunctionDefNode(self, node):
         """Define a user function"""
         self.user_functions[node.name] = {
             'parameters': node.parameters,
-            'body': node.body
+            'body': node.body,
+            'frame_size': len(node.slot_names),
+            'memo': None,
         }
+        if node.memo:
+            self.memoize_function(node.name)
         return None
 
     def visit_ReturnNode(self, node):
         """Handle return statement"""
         if node.value:
-            value = self.visit(node.value)
+            self.return_value = self.visit(node.value)
         else:
-            value = None
-        raise ReturnException(value)
+            self.return_value = None
+        return RETURN
 
     def visit_FunctionCallNode(self, node):
         """call functions"""
         function_name = node.function_name
-        
+        self.check_call(function_name, len(node.arguments))
+        arg_values = [self.visit(arg) for arg in node.arguments]
+        #user functions are called directly rather than through call_function: every Python frame a bim call
+        #takes lowers how deep bim functions can recurse
         if function_name in self.user_functions:
-            return self._call_user_function(function_name, node.arguments)
-        elif function_name in self.builtin_functions:
-            arg_values = [self.visit(arg) for arg in node.arguments]
-            return self.builtin_functions[function_name](arg_values)
-        else:
+            return self._call_user_function(function_name, arg_values)
+        return self.builtin_functions[function_name](arg_values)
+
+    def check_call(self, function_name, argument_count):
+        """Validate a call before its arguments are evaluated"""
+        if function_name in self.user_functions:
+            parameters = self.user_functions[function_name]['parameters']
+            if argument_count != len(parameters):
+                raise Exception(f"Function '{function_name}' expects {len(parameters)} arguments, got {argument_count}")
+        elif function_name not in self.builtin_functions:
             raise Exception(f"Unknown function: {function_name}")
 
-    def _call_user_function(self, function_name, arguments):
+    def call_function(self, function_name, arg_values):
+        """Call a user-defined or builtin function with evaluated arguments"""
+        if function_name in self.user_functions:
+            return self._call_user_function(function_name, arg_values)
+        return self.builtin_functions[function_name](arg_values)
+
+    def _call_user_function(self, function_name, arg_values):
         """Call a user-defined function"""
         func_info = self.user_functions[function_name]
-        parameters = func_info['parameters']
+        memo = func_info['memo']
+        if memo is not None:
+            #the cache is consulted here rather than through a wrapper, so a memoized call is no deeper on the
+            #Python stack than a plain one
+            key = memo.key(arg_values)
+            if key is not None:
+                value = memo.lookup(key)
+                if value is MISSING:
+                    value = self.run_user_function(func_info, arg_values)
+                    memo.store(key, value)
+                return value
+        return self.run_user_function(func_info, arg_values)
+
+    def run_user_function(self, func_info, arg_values):
+        """Run a user function's body with its parameters bound"""
         body = func_info['body']
         
-        if len(arguments) != len(parameters):
-            raise Exception(f"Function '{function_name}' expects {len(parameters)} arguments, got {len(arguments)}")
-        
-        arg_values = [self.visit(arg) for arg in arguments]
-        
-        # Save current variable state
-        old_variables = self.variables.copy()
-        
-        # Set up parameters as local variables
-        for param, value in zip(parameters, arg_values):
-            self.variables[param] = value
+        # Parameters and local variables live in a new frame
+        old_frame = self.frame
+        self.frame = new_frame(arg_values, func_info['frame_size'])
         
         try:
-            # Execute function body
-            self.visit(body)
-            # If no return statement, return None
-            result = None
-        except ReturnException as e:
-            result = e.value
+            # Execute function body (always a block, so without going through visit())
+            signal = self.visit_BlockNode(body)
         finally:
-            # Restore variable state
-            self.variables = old_variables
+            self.frame = old_frame
         
-        return result
+        if signal is RETURN:
+            result = self.return_value
+            self.return_value = None
+            return result
+        # break/continue outside a loop unwind into the caller's loop as exceptions
+        self.raise_signal(signal)
+        # If no return statement, return None
+        return None
+
+    def memoize_function(self, function_name):
+        """Cache a user function's results by argument values from now on; it has to be pure"""
+        func_info = self.user_functions.get(function_name)
+        if func_info is None:
+            raise Exception(f"Unknown function: {function_name}")
+        reason = self.impurity(function_name, {function_name})
+        if reason is not None:
+            raise Exception(f"Cannot memoize '{function_name}': it {reason}")
+        if func_info['memo'] is None:
+            func_info['memo'] = MemoCache(function_name, self.memo_size)
+            self.memo_caches.append(func_info['memo'])
+
+    def impurity(self, function_name, checked):
+        """Why a user function (or one it calls) has side effects, or None if it is pure"""
+        func_info = self.user_functions[function_name]
+        if 'purity' not in func_info:
+            func_info['purity'] = function_purity(func_info['parameters'], func_info['body'])
+        reason, callees = func_info['purity']
+        if reason is not None:
+            return reason
+        for callee in callees:
+            if callee in checked:
+                continue
+            checked.add(callee)
+            if callee in self.user_functions:
+                callee_reason = self.impurity(callee, checked)
+                if callee_reason is not None:
+                    return f"calls '{callee}', which {callee_reason}"
+            elif callee in IMPURE_BUILTINS:
+                return f"calls {callee}()"
+            elif callee not in self.builtin_functions:
+                return f"calls '{callee}', which is not defined yet"
+        return None
+
+    def memoization_report(self):
+        """One line per memoized function: its cache hits, misses and evictions"""
+        return [memo.report() for memo in self.memo_caches]
 
     def _builtin_print(self, args):
         """prints all arguments separated by spaces"""
@@ -380,13 +855,15 @@ class Interpreter:
         return max(args)
 
     def _builtin_len(self, args):
-        """returns length of string"""
+        """returns length of string, array, range, typed array, string builder, map or set"""
         if len(args) != 1:
             raise Exception("len() takes exactly 1 argument")
-        if isinstance(args[0], str):
+        if isinstance(args[0], (str, list, NumberArray, StringBuilder, dict, OrderedSet)):
             return len(args[0])
+        elif isinstance(args[0], range):
+            return range_length(args[0])
         else:
-            raise Exception("len() can only be applied to strings")
+            raise Exception("len() can only be applied to strings, arrays, ranges, typed arrays, string builders, maps and sets")
     
     def _builtin_upper(self, args):
         """Convert string to uppercase"""
@@ -417,6 +894,82 @@ class Interpreter:
         else:
             raise Exception("range() takes 1 to 3 arguments")
         
+    def _builtin_memoize(self, args):
+        """memoize("f"): cache the results of the user function f (functions are not values, so it takes the name)"""
+        if len(args) != 1 or not isinstance(args[0], str):
+            raise Exception("memoize() takes exactly 1 argument (the function name as a string)")
+        self.memoize_function(args[0])
+        return None
+
+    def _builtin_zeros(self, args):
+        """zeros(n): typed array of n zeros"""
+        if len(args) != 1:
+            raise Exception("zeros() takes exactly 1 argument")
+        return NumberArray.zeros(self.typed_array_length(args[0], "zeros"))
+
+    def _builtin_fill(self, args):
+        """fill(n, value): typed array of n copies of a number"""
+        if len(args) != 2:
+            raise Exception("fill() takes exactly 2 arguments (length, value)")
+        if not isinstance(args[1], (int, float)) or isinstance(args[1], bool):
+            raise Exception("Typed arrays only hold numbers")
+        return NumberArray.full(self.typed_array_length(args[0], "fill"), args[1])
+
+    def _builtin_from(self, args):
+        """from(arr): typed array with the numbers of an array, range or typed array"""
+        if len(args) != 1:
+            raise Exception("from() takes exactly 1 argument")
+        if not isinstance(args[0], (list, range, NumberArray)):
+            raise Exception("from() takes an array, range or typed array")
+        return NumberArray.from_values(args[0])
+
+    def typed_array_length(self, length, function_name):
+        if not isinstance(length, (int, float)) or isinstance(length, bool) or length < 0:
+            raise Exception(f"{function_name}() length must be a non-negative number")
+        return int(length)
+
+    def _builtin_sum(self, args):
+        """Sum of an array or typed array of numbers"""
+        if len(args) != 1:
+            raise Exception("sum() takes exactly 1 argument")
+        if isinstance(args[0], list):
+            return array_sum(args[0])
+        if not isinstance(args[0], NumberArray):
+            raise Exception("sum() can only be applied to arrays and typed arrays")
+        return args[0].sum()
+
+    def _builtin_mean(self, args):
+        """Mean of a typed array"""
+        if len(args) != 1:
+            raise Exception("mean() takes exactly 1 argument")
+        if not isinstance(args[0], NumberArray):
+            raise Exception("mean() can only be applied to typed arrays")
+        return args[0].mean()
+
+    def _builtin_dot(self, args):
+        """Dot product of two typed arrays of the same length"""
+        if len(args) != 2:
+            raise Exception("dot() takes exactly 2 arguments")
+        if not isinstance(args[0], NumberArray):
+            raise Exception("dot() can only be applied to typed arrays")
+        return args[0].dot(args[1])
+
+    def _builtin_builder(self, args):
+        """builder() or builder(str): string builder to append pieces to"""
+        if len(args) > 1:
+            raise Exception("builder() takes at most 1 argument")
+        return StringBuilder(str(args[0]) if args else "")
+
+    def _builtin_set(self, args):
+        """set() or set(values): set of the elements of an array, range, typed array, map (its keys) or set"""
+        if len(args) > 1:
+            raise Exception("set() takes at most 1 argument")
+        if not args:
+            return OrderedSet()
+        if not isinstance(args[0], (list, range, NumberArray, dict, OrderedSet)):
+            raise Exception("set() takes an array, range, typed array, map or set")
+        return OrderedSet(args[0])
+
     def _handle_array_method(self, array, method_name, args):
         """Handle array methods"""
         if method_name == "push":
@@ -457,33 +1010,350 @@ class Interpreter:
                 return array.pop(int(index))
             except IndexError:
                 raise Exception(f"Array index {int(index)} out of range")
-        
+
+        elif method_name == "sort":
+            # Sort in place, by the results of a key function if one is named
+            if len(args) > 1:
+                raise Exception("sort() takes at most 1 argument (key function name)")
+            try:
+                if args:
+                    key_function = self.function_argument(args[0], "sort", 1)
+                    keys = [self.call_function(key_function, [value]) for value in array]
+                    order = sorted(range(len(array)), key=keys.__getitem__)
+                    array[:] = [array[i] for i in order]
+                else:
+                    array.sort()
+            except TypeError:
+                raise Exception("sort() cannot compare values of different types") from None
+            return None
+
+        elif method_name == "reverse":
+            if len(args) != 0:
+                raise Exception("reverse() takes no arguments")
+            array.reverse()
+            return None
+
+        elif method_name == "sum":
+            if len(args) != 0:
+                raise Exception("sum() takes no arguments")
+            return array_sum(array)
+
+        elif method_name == "index_of":
+            if len(args) != 1:
+                raise Exception("index_of() takes exactly 1 argument")
+            try:
+                return array.index(args[0])
+            except ValueError:
+                return -1
+
+        elif method_name == "contains":
+            if len(args) != 1:
+                raise Exception("contains() takes exactly 1 argument")
+            return args[0] in array
+
+        elif method_name == "slice":
+            # New array of the elements from start up to (not including) end; negative indexes count from the end
+            if not 1 <= len(args) <= 2:
+                raise Exception("slice() takes 1 or 2 arguments (start, end)")
+            if not all(isinstance(index, (int, float)) for index in args):
+                raise Exception("Slice indexes must be numbers")
+            return array[int(args[0]):int(args[1]) if len(args) == 2 else None]
+
+        elif method_name == "extend" or method_name == "concat":
+            # extend appends in place, concat returns a new array
+            if len(args) != 1:
+                raise Exception(f"{method_name}() takes exactly 1 argument")
+            if not isinstance(args[0], (list, range, NumberArray)):
+                raise Exception(f"{method_name}() takes an array, range or typed array")
+            if method_name == "concat":
+                return array + list(args[0])
+            array.extend(args[0])
+            return len(array)
+
+        elif method_name == "map":
+            if len(args) != 1:
+                raise Exception("map() takes exactly 1 argument (function name)")
+            function_name = self.function_argument(args[0], "map", 1)
+            call_function = self.call_function
+            return [call_function(function_name, [value]) for value in array]
+
+        elif method_name == "filter":
+            if len(args) != 1:
+                raise Exception("filter() takes exactly 1 argument (function name)")
+            function_name = self.function_argument(args[0], "filter", 1)
+            call_function = self.call_function
+            is_truthy = self.is_truthy
+            return [value for value in array if is_truthy(call_function(function_name, [value]))]
+
+        elif method_name == "reduce":
+            # reduce("f", initial): f(f(initial, a[0]), a[1])...; without initial the first element starts
+            if not 1 <= len(args) <= 2:
+                raise Exception("reduce() takes 1 or 2 arguments (function name, initial value)")
+            function_name = self.function_argument(args[0], "reduce", 2)
+            values = iter(array)
+            if len(args) == 2:
+                result = args[1]
+            else:
+                result = next(values, UNSET)
+                if result is UNSET:
+                    raise Exception("reduce() of an empty array with no initial value")
+            call_function = self.call_function
+            for value in values:
+                result = call_function(function_name, [result, value])
+            return result
+
         else:
             raise Exception(f"Array has no method '{method_name}'")
 
-    def _handle_string_method(self, string, method_name, args):
-        """Handle string methods"""
+    def function_argument(self, function_name, method_name, argument_count):
+        """Check a function name passed to a method that calls it with argument_count arguments"""
+        if not isinstance(function_name, str):
+            raise Exception(f"{method_name}() takes the function name as a string")
+        self.check_call(function_name, argument_count)
+        return function_name
+
+    def _handle_typed_array_method(self, array, method_name, args):
+        """Handle typed array methods; the methods in TYPED_ARRAY_SHARED_METHODS work like on arrays"""
+        if method_name == "sum":
+            if len(args) != 0:
+                raise Exception("sum() takes no arguments")
+            return array.sum()
+
+        elif method_name == "mean":
+            if len(args) != 0:
+                raise Exception("mean() takes no arguments")
+            return array.mean()
+
+        elif method_name == "dot":
+            if len(args) != 1:
+                raise Exception("dot() takes exactly 1 argument")
+            return array.dot(args[0])
+
+        elif method_name == "to_array":
+            if len(args) != 0:
+                raise Exception("to_array() takes no arguments")
+            return array.tolist()
+
+        elif method_name in TYPED_ARRAY_SHARED_METHODS:
+            return self._handle_array_method(array, method_name, args)
+
+        else:
+            raise Exception(f"Typed array has no method '{method_name}'")
+
+    def _handle_builder_method(self, builder, method_name, args):
+        """Handle string builder methods"""
+        if method_name == "append":
+            # Append each argument as + with a string would; returns the builder so appends can be chained
+            for arg in args:
+                builder.append(arg)
+            return builder
+
+        elif method_name == "length":
+            if len(args) != 0:
+                raise Exception("length takes no arguments")
+            return len(builder)
+
+        elif method_name == "toString":
+            if len(args) != 0:
+                raise Exception("toString() takes no arguments")
+            return builder.to_string()
+
+        else:
+            raise Exception(f"String builder has no method '{method_name}'")
+
+    def _handle_map_method(self, map_value, method_name, args):
+        """Handle map methods; keys(), values() and items() return new arrays in insertion order"""
+        if method_name == "has":
+            if len(args) != 1:
+                raise Exception("has() takes exactly 1 argument")
+            return check_key(args[0]) in map_value
+
+        elif method_name == "get":
+            # get(key, default): the value for key, or default (none if not given) when it is missing
+            if not 1 <= len(args) <= 2:
+                raise Exception("get() takes 1 or 2 arguments (key, default)")
+            return map_value.get(check_key(args[0]), args[1] if len(args) == 2 else None)
+
+        elif method_name == "delete":
+            # Remove a key; returns whether it was there
+            if len(args) != 1:
+                raise Exception("delete() takes exactly 1 argument")
+            key = check_key(args[0])
+            if key not in map_value:
+                return False
+            del map_value[key]
+            return True
+
+        elif method_name == "length":
+            if len(args) != 0:
+                raise Exception("length takes no arguments")
+            return len(map_value)
+
+        elif method_name == "keys":
+            if len(args) != 0:
+                raise Exception("keys() takes no arguments")
+            return list(map(key_value, map_value))
+
+        elif method_name == "values":
+            if len(args) != 0:
+                raise Exception("values() takes no arguments")
+            return list(map_value.values())
+
+        elif method_name == "items":
+            if len(args) != 0:
+                raise Exception("items() takes no arguments")
+            return [[key_value(key), value] for key, value in map_value.items()]
+
+        else:
+            raise Exception(f"Map has no method '{method_name}'")
+
+    def _handle_set_method(self, set_value, method_name, args):
+        """Handle set methods"""
+        if method_name == "add":
+            for arg in args:
+                set_value.add(arg)
+            return len(set_value)
+
+        elif method_name == "has":
+            if len(args) != 1:
+                raise Exception("has() takes exactly 1 argument")
+            return args[0] in set_value
+
+        elif method_name == "delete":
+            # Remove an element; returns whether it was there
+            if len(args) != 1:
+                raise Exception("delete() takes exactly 1 argument")
+            return set_value.delete(args[0])
+
+        elif method_name == "length":
+            if len(args) != 0:
+                raise Exception("length takes no arguments")
+            return len(set_value)
+
+        elif method_name == "values":
+            if len(args) != 0:
+                raise Exception("values() takes no arguments")
+            return set_value.tolist()
+
+        else:
+            raise Exception(f"Set has no method '{method_name}'")
+
+    def _handle_range_method(self, range_value, method_name, args):
+        """Handle range methods; ranges are lazy, so these never produce the values"""
         if method_name == "length":
             if len(args) != 0:
                 raise Exception("length takes no arguments")
-            return len(string)
+            return range_length(range_value)
         
-        elif method_name == "charAt":
+        elif method_name == "contains":
             if len(args) != 1:
-                raise Exception("charAt() takes exactly 1 argument")
-            index = args[0]
-            if not isinstance(index, (int, float)):
-                raise Exception("charAt index must be a number")
-            try:
-                return string[int(index)]
-            except IndexError:
-                raise Exception(f"String index {int(index)} out of range")
-                
+                raise Exception("contains() takes exactly 1 argument")
+            return range_contains(range_value, args[0])
+        
         else:
-            # Fall back to existing string methods
-            if method_name == "upper":
-                return string.upper()
-            elif method_name == "lower":
-                return string.lower()
-            else:
-                raise Exception(f"String has no method '{method_name}'")
+            raise Exception(f"Range has no method '{method_name}'")
+
+    def _handle_string_method(self, string, method_name, args):
+        """Handle string methods through the string_methods table"""
+        method = self.string_methods.get(method_name)
+        if method is None:
+            raise Exception(f"String has no method '{method_name}'")
+        return method(string, args)
+
+    def _string_length(self, string, args):
+        if len(args) != 0:
+            raise Exception("length takes no arguments")
+        return len(string)
+
+    def _string_char_at(self, string, args):
+        if len(args) != 1:
+            raise Exception("charAt() takes exactly 1 argument")
+        index = args[0]
+        if not isinstance(index, (int, float)):
+            raise Exception("charAt index must be a number")
+        try:
+            return string[int(index)]
+        except IndexError:
+            raise Exception(f"String index {int(index)} out of range")
+
+    def _string_upper(self, string, args):
+        #upper() and lower() ignore any arguments, as they always have
+        return string.upper()
+
+    def _string_lower(self, string, args):
+        return string.lower()
+
+    def _string_split(self, string, args):
+        """split(sep): array of the parts between each sep; split() splits on whitespace, split("") into characters"""
+        if len(args) > 1:
+            raise Exception("split() takes at most 1 argument (separator)")
+        if not args:
+            return string.split()
+        separator = string_argument(args[0], "split")
+        if separator == "":
+            return list(string)
+        return string.split(separator)
+
+    def _string_join(self, string, args):
+        """sep.join(arr): the elements of an array joined with sep between them, converted like + with a string"""
+        if len(args) != 1:
+            raise Exception("join() takes exactly 1 argument (array)")
+        if not isinstance(args[0], (list, range, NumberArray)):
+            raise Exception("join() takes an array, range or typed array")
+        return string.join(map(str, args[0]))
+
+    def _string_find(self, string, args):
+        """find(sub) or find(sub, start): index of the first sub (at or after start), or -1"""
+        if not 1 <= len(args) <= 2:
+            raise Exception("find() takes 1 or 2 arguments (substring, start)")
+        substring = string_argument(args[0], "find")
+        if len(args) == 2:
+            if not isinstance(args[1], (int, float)):
+                raise Exception("find() start must be a number")
+            return string.find(substring, int(args[1]))
+        return string.find(substring)
+
+    def _string_replace(self, string, args):
+        """replace(old, new): copy with every old replaced by new"""
+        if len(args) != 2:
+            raise Exception("replace() takes exactly 2 arguments (old, new)")
+        return string.replace(string_argument(args[0], "replace"), string_argument(args[1], "replace"))
+
+    def _string_slice(self, string, args):
+        """slice(start, end): characters from start up to (not including) end; negative indexes count from the end"""
+        if not 1 <= len(args) <= 2:
+            raise Exception("slice() takes 1 or 2 arguments (start, end)")
+        if not all(isinstance(index, (int, float)) for index in args):
+            raise Exception("Slice indexes must be numbers")
+        return string[int(args[0]):int(args[1]) if len(args) == 2 else None]
+
+    def _string_starts_with(self, string, args):
+        if len(args) != 1:
+            raise Exception("starts_with() takes exactly 1 argument")
+        return string.startswith(string_argument(args[0], "starts_with"))
+
+    def _string_ends_with(self, string, args):
+        if len(args) != 1:
+            raise Exception("ends_with() takes exactly 1 argument")
+        return string.endswith(string_argument(args[0], "ends_with"))
+
+    def _string_trim(self, string, args):
+        if len(args) != 0:
+            raise Exception("trim() takes no arguments")
+        return string.strip()
+
+    def _string_to_number(self, string, args):
+        if len(args) != 0:
+            raise Exception("to_number() takes no arguments")
+        try:
+            return float(string)
+        except ValueError:
+            raise Exception(f"Cannot convert '{string}' to a number") from None
+
+    def _string_repeat(self, string, args):
+        if len(args) != 1:
+            raise Exception("repeat() takes exactly 1 argument")
+        count = args[0]
+        if not isinstance(count, (int, float)) or count < 0:
+            raise Exception("repeat() count must be a non-negative number")
+        return string * int(count)
@@ -1,11 +1,184 @@
-from bim.bim_token import TokenType, Token
+import codecs
+import io
+import mmap
+import re
+import sys
+from bim.bim_token import TokenType, Token, TokenStream, TOKEN_CODES
+
+#keywords recognized by bim, mapped to their token type and value
+KEYWORDS = {
+    'true': (TokenType.TRUE, True),
+    'false': (TokenType.FALSE, False),
+    'if': (TokenType.IF, 'if'),
+    'else': (TokenType.ELSE, 'else'),
+    'while': (TokenType.WHILE, 'while'),
+    'for': (TokenType.FOR, 'for'),
+    'in': (TokenType.IN, 'in'),
+    'break': (TokenType.BREAK, 'break'),
+    'continue': (TokenType.CONTINUE, 'continue'),
+    'function': (TokenType.FUNCTION, 'func'),
+    'return': (TokenType.RETURN, 'return'),
+}
+
+#operators and punctuation, mapped to their token type
+OPERATORS = {
+    '==': TokenType.EQUAL,
+    '!=': TokenType.NOT_EQUAL,
+    '<=': TokenType.LESS_EQUAL,
+    '>=': TokenType.GREATER_EQUAL,
+    '&&': TokenType.AND,
+    '||': TokenType.OR,
+    '!': TokenType.NOT,
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.MULTIPLY,
+    '/': TokenType.DIVIDE,
+    '(': TokenType.LPAREN,
+    ')': TokenType.RPAREN,
+    '=': TokenType.ASSIGN,
+    '<': TokenType.LESS_THAN,
+    '>': TokenType.GREATER_THAN,
+    ',': TokenType.COMMA,
+    '{': TokenType.LBRACE,
+    '}': TokenType.RBRACE,
+    '[': TokenType.LBRACKET,
+    ']': TokenType.RBRACKET,
+    '.': TokenType.DOT,
+    ':': TokenType.COLON,
+}
+
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '"': '"'}
+
+#whitespace skipped between tokens (note: a run starting with a space also swallows newlines)
+WHITESPACE_REGEX = re.compile(r"(?:[ \t\r]\s*)?")
+
+#leading whitespace, then one alternative per token class tried in order
+TOKEN_REGEX = re.compile(r"""
+    (?:[ \t\r]\s*(?!\s))?
+    (?:
+    (?P<FSTRING>f"(?:[^"\\{]|\\.|\{(?:[^{}"]|"(?:[^"\\]|\\.)*")*\})*")
+  | (?P<IDENTIFIER>[^\W\d]\w*)
+  | (?P<OPERATOR>[=!<>]=|&&|\|\||[-+*/()=<>,{}\[\].:!])
+  | (?P<NUMBER>\d[\d.]*)
+  | (?P<NEWLINE>\n)
+  | (?P<STRING>"(?:[^"\\]|\\.)*")
+  | (?P<SEMICOLON>;)
+  | (?P<EOF>\Z)
+    )
+""", re.VERBOSE | re.DOTALL)
+
+#whitespace (and an optional `if`) following an `else` keyword
+ELSE_TAIL_REGEX = re.compile(r"\s*(if\w*)?")
+ESCAPE_REGEX = re.compile(r"\\(.)", re.DOTALL)
+
+class SourceReader:
+    """Reads a source file as incrementally decoded text chunks (plain reads or an mmap)"""
+    def __init__(self, filename, chunk_size=1 << 20, use_mmap=False, encoding='utf-8'):
+        self.chunk_size = chunk_size
+        self.file = None
+        self.map = None
+        self.offset = 0
+        self.decoder = None
+
+        if use_mmap:
+            self.file = open(filename, 'rb')
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                #empty files cannot be mapped
+                self.map = None
+            #translate \r\n and \r like text mode reads do
+            self.decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+        else:
+            self.file = open(filename, 'r', encoding=encoding)
+
+    def read_chunk(self):
+        """Return the next chunk of text ('' once the file is exhausted)"""
+        if self.file is None:
+            return ''
+
+        if self.decoder is None:
+            chunk = self.file.read(self.chunk_size)
+        else:
+            chunk = ''
+            #a chunk can end in the middle of a multi-byte character, so keep reading until text comes out
+            while not chunk and self.file is not None:
+                data = b''
+                if self.map is not None:
+                    data = self.map[self.offset:self.offset + self.chunk_size]
+                    self.offset += len(data)
+                chunk = self.decoder.decode(data, final=not data)
+                if not data:
+                    self.close()
+                    return chunk
+
+        if not chunk:
+            self.close()
+        return chunk
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
 # Break input code into tokens
 class Lexer:
-    def __init__(self, text):
+    def __init__(self, text, backend="regex"):
         self.text = text
         self.pos = 0
         self.current_char = self.text[self.pos] if self.text else None
+
+        #"regex" matches whole tokens with TOKEN_REGEX, "char" scans one character at a time
+        if backend == "regex":
+            self.get_next_token = self.get_next_token_regex
+        elif backend != "char":
+            raise ValueError(f"Unknown lexer backend: {backend}")
+        self.backend = backend
+        self.source = None
+        self.base = 0
+
+    @classmethod
+    def from_file(cls, filename, chunk_size=1 << 20, use_mmap=False, encoding='utf-8'):
+        """Create a lexer that reads the file in chunks instead of loading all of it"""
+        lexer = cls("")
+        lexer.source = SourceReader(filename, chunk_size, use_mmap, encoding)
+        #keep at least this much text buffered ahead of the current position
+        lexer.window = max(chunk_size // 2, 1)
+        lexer.exhausted = False
+        lexer.get_next_token = lexer.get_next_token_streaming
+        return lexer
+
+    def refill(self):
+        """Drop consumed text from the buffer and append the next chunk of the source"""
+        chunk = self.source.read_chunk()
+        if not chunk:
+            self.exhausted = True
+        self.base += self.pos
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+
+    def get_next_token_streaming(self):
+        """get_next_token for file input: refill the buffer when a token may continue past its end"""
+        while True:
+            if not self.exhausted and len(self.text) - self.pos < self.window:
+                self.refill()
+            start = self.pos
+            try:
+                token = self.get_next_token_regex()
+            except Exception:
+                if self.exhausted:
+                    raise
+                token = None
+
+            #one extra character is needed to tell `else i` from `else if`
+            if token is not None and (self.exhausted or self.pos + 1 < len(self.text)):
+                return token
+            #the token failed or reached the end of the buffer, so re-lex it with more text
+            self.pos = start
+            self.refill()
     
     def advance(self):
         """Move to the next character"""
@@ -84,6 +257,15 @@ class Lexer:
 
 
     
+    def read_fstring(self):
+        """Read an f-string (the f is already read) and return its parts"""
+        end = self.fstring_end(self.text, self.pos)
+        body = self.text[self.pos + 1:end - 1]
+        #onto the character after the closing quote
+        self.pos = end - 1
+        self.advance()
+        return self.fstring_parts(body)
+
     def get_next_token(self):
         """Get the next token from the input"""
         while self.current_char:
@@ -127,6 +309,8 @@ class Lexer:
             
             if self.current_char.isalpha() or self.current_char == '_':
                 identifier = self.read_identifier()
+                if identifier == 'f' and self.current_char == '"':
+                    return Token(TokenType.FSTRING, self.read_fstring())
                 if identifier == 'true':
                     return Token(TokenType.TRUE, True)
                 elif identifier == 'false':
@@ -176,7 +360,16 @@ class Lexer:
                     self.advance()
                     return Token(TokenType.NOT_EQUAL, '!=')
                 else:
-                    raise Exception(f"Invalid character: {self.current_char}")
+                    self.advance()
+                    return Token(TokenType.NOT, '!')
+
+            if self.current_char == '&' or self.current_char == '|':
+                char = self.current_char
+                if self.peek() != char:
+                    raise Exception(f"Invalid character: {char}")
+                self.advance()
+                self.advance()
+                return Token(TokenType.AND if char == '&' else TokenType.OR, char * 2)
             
             if self.current_char == '<':
                 if self.peek() == '=':
@@ -224,6 +417,231 @@ class Lexer:
                 self.advance()
                 return Token(TokenType.DOT, '.')
 
+            if self.current_char == ':':
+                self.advance()
+                return Token(TokenType.COLON, ':')
+
         
         # when at end return EOF
         return Token(TokenType.EOF, "")
+
+    def get_next_token_regex(self):
+        """Get the next token from the input using the compiled master regex"""
+        match = TOKEN_REGEX.match(self.text, self.pos)
+        if match is None:
+            return self.regex_error()
+        kind = match.lastgroup
+
+        if kind == 'IDENTIFIER':
+            self.pos = match.end()
+            value = match.group(kind)
+            keyword = KEYWORDS.get(value)
+            if keyword is None:
+                if value == 'f' and self.text.startswith('"', self.pos):
+                    #FSTRING did not match: an expression in it has braces of its own (or it is unterminated)
+                    end = self.fstring_end(self.text, self.pos)
+                    parts = self.fstring_parts(self.text[self.pos + 1:end - 1])
+                    self.pos = end
+                    return Token(TokenType.FSTRING, parts)
+                return Token(TokenType.IDENTIFIER, value)
+            if value == 'else':
+                #whitespace after else is always skipped, then check if its an else if
+                tail = ELSE_TAIL_REGEX.match(self.text, self.pos)
+                self.pos = tail.end()
+                if tail.group(1):
+                    return Token(TokenType.ELIF, 'elif')
+            return Token(*keyword)
+
+        if kind == 'OPERATOR':
+            self.pos = match.end()
+            value = match.group(kind)
+            return Token(OPERATORS[value], value)
+
+        if kind == 'NUMBER':
+            self.pos = match.end()
+            return Token(TokenType.NUMBER, match.group(kind))
+
+        if kind == 'FSTRING':
+            self.pos = match.end()
+            return Token(TokenType.FSTRING, self.fstring_parts(match.group(kind)[2:-1]))
+
+        if kind == 'NEWLINE':
+            self.pos = match.end()
+            return Token(TokenType.NEWLINE, '\n')
+
+        if kind == 'STRING':
+            self.pos = match.end()
+            return Token(TokenType.STRING, self.unescape(match.group(kind)[1:-1]))
+
+        if kind == 'SEMICOLON':
+            #; is treated as end of line (position is not advanced past it)
+            self.pos = match.start(kind)
+            return Token(TokenType.EOF, "")
+
+        # when at end return EOF
+        self.pos = match.end()
+        return Token(TokenType.EOF, "")
+
+    def tokenize(self):
+        """Lex the whole input at once into a compact TokenStream (ending with EOF)"""
+        if self.backend == "regex" and self.source is None:
+            return self.tokenize_regex()
+
+        stream = TokenStream()
+        while True:
+            if self.source is None and self.current_char and self.current_char in ' \t\r':
+                self.skip_whitespace()
+            offset = self.base + self.pos
+            token = self.get_next_token()
+            stream.append(token.type, token.value, offset)
+            if token.type == TokenType.EOF:
+                return stream
+
+    def tokenize_regex(self):
+        """tokenize() for the regex backend, filling the stream arrays directly"""
+        stream = TokenStream()
+        kinds = stream.kinds
+        values = stream.values
+        offsets = stream.offsets
+        text = self.text
+        match_token = TOKEN_REGEX.match
+        intern = sys.intern
+        identifier = TOKEN_CODES[TokenType.IDENTIFIER]
+        number = TOKEN_CODES[TokenType.NUMBER]
+        string = TOKEN_CODES[TokenType.STRING]
+        newline = TOKEN_CODES[TokenType.NEWLINE]
+        fstring = TOKEN_CODES[TokenType.FSTRING]
+        eof = TOKEN_CODES[TokenType.EOF]
+        elif_code = TOKEN_CODES[TokenType.ELIF]
+        keyword_codes = {name: (TOKEN_CODES[token_type], value) for name, (token_type, value) in KEYWORDS.items()}
+        operator_codes = {name: TOKEN_CODES[token_type] for name, token_type in OPERATORS.items()}
+
+        pos = self.pos
+        while True:
+            match = match_token(text, pos)
+            if match is None:
+                self.pos = pos
+                self.regex_error()
+            kind = match.lastgroup
+            start = match.start(kind)
+            pos = match.end()
+
+            if kind == 'IDENTIFIER':
+                value = match.group(kind)
+                keyword = keyword_codes.get(value)
+                if keyword is None:
+                    if value == 'f' and text.startswith('"', pos):
+                        #FSTRING did not match: an expression in it has braces of its own (or it is unterminated)
+                        end = self.fstring_end(text, pos)
+                        kinds.append(fstring)
+                        values.append(self.fstring_parts(text[pos + 1:end - 1]))
+                        pos = end
+                    else:
+                        kinds.append(identifier)
+                        values.append(intern(value))
+                else:
+                    if value == 'else':
+                        tail = ELSE_TAIL_REGEX.match(text, pos)
+                        pos = tail.end()
+                        if tail.group(1):
+                            keyword = (elif_code, 'elif')
+                    kinds.append(keyword[0])
+                    values.append(keyword[1])
+            elif kind == 'OPERATOR':
+                value = match.group(kind)
+                kinds.append(operator_codes[value])
+                values.append(intern(value))
+            elif kind == 'NUMBER':
+                kinds.append(number)
+                values.append(intern(match.group(kind)))
+            elif kind == 'NEWLINE':
+                kinds.append(newline)
+                values.append('\n')
+            elif kind == 'STRING':
+                kinds.append(string)
+                values.append(self.unescape(match.group(kind)[1:-1]))
+            elif kind == 'FSTRING':
+                kinds.append(fstring)
+                values.append(self.fstring_parts(match.group(kind)[2:-1]))
+            else:
+                #; and end of input both finish the stream
+                kinds.append(eof)
+                values.append("")
+                offsets.append(start)
+                self.pos = start
+                return stream
+            offsets.append(start)
+
+    def regex_error(self):
+        """Raise the error for input the master regex cannot match"""
+        match = WHITESPACE_REGEX.match(self.text, self.pos)
+        char = self.text[match.end()]
+        if char == '"':
+            raise Exception("Unterminated string literal")
+        raise Exception(f"Invalid character: {char}")
+
+    @staticmethod
+    def fstring_end(text, pos):
+        """Index just past the f-string whose opening quote is at pos"""
+        pos += 1
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                return pos + 1
+            if char == '\\':
+                pos += 2
+            elif char == '{':
+                pos = Lexer.fstring_expression_end(text, pos + 1) + 1
+            else:
+                pos += 1
+        raise Exception("Unterminated f-string")
+
+    @staticmethod
+    def fstring_expression_end(text, pos):
+        """Index of the } closing the f-string expression that starts at pos.
+
+        Braces nest, so the expression can hold a map literal, and string literals in it are skipped.
+        """
+        depth = 0
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                pos += 1
+                while pos < len(text) and text[pos] != '"':
+                    pos += 2 if text[pos] == '\\' else 1
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                if not depth:
+                    return pos
+                depth -= 1
+            pos += 1
+        raise Exception("Unterminated f-string")
+
+    @staticmethod
+    def fstring_parts(body):
+        """Split an f-string body into (text, expression source, text, ..., text); \\{ is a literal brace"""
+        parts = []
+        text_start = 0
+        pos = 0
+        while pos < len(body):
+            char = body[pos]
+            if char == '\\':
+                pos += 2
+            elif char == '{':
+                end = Lexer.fstring_expression_end(body, pos + 1)
+                parts.append(Lexer.unescape(body[text_start:pos]))
+                parts.append(body[pos + 1:end])
+                pos = text_start = end + 1
+            else:
+                pos += 1
+        parts.append(Lexer.unescape(body[text_start:]))
+        return tuple(parts)
+
+    @staticmethod
+    def unescape(body):
+        """Replace escape sequences in a string literal body"""
+        if '\\' not in body:
+            return body
+        # For unknown escape sequences, just include the character
+        return ESCAPE_REGEX.sub(lambda m: ESCAPES.get(m.group(1), m.group(1)), body)
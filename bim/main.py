@@ -1,8 +1,35 @@
+import argparse
 import sys
 import os
 from bim.lexer import Lexer
 from bim.parser import Parser
-from bim.interpreter import Interpreter
+from bim.interpreter import Interpreter, DEEP_EXPRESSION_DEPTH
+from bim.closure_engine import ClosureInterpreter
+from bim.vm import VirtualMachine, MAX_CALL_DEPTH
+from bim.transpiler import TranspilingInterpreter
+from bim.compiler import Compiler
+from bim.bytecode import serialize, deserialize, disassemble
+from bim.optimizer import Optimizer
+from bim.memo import DEFAULT_MEMO_SIZE
+from bim import cache
+
+#--engine name -> interpreter class
+ENGINES = {
+    'tree': Interpreter,
+    'closure': ClosureInterpreter,
+    'vm': VirtualMachine,
+    'transpile': TranspilingInterpreter,
+}
+
+def create_interpreter(engine, max_depth=MAX_CALL_DEPTH, memo_size=DEFAULT_MEMO_SIZE):
+    """Interpreter for an --engine name; only the VM keeps calls on its own stack and uses max_depth
+    (main() rejects --max-depth for the other engines)"""
+    if engine == 'vm':
+        interpreter = VirtualMachine(max_depth=max_depth)
+    else:
+        interpreter = ENGINES[engine]()
+    interpreter.memo_size = memo_size
+    return interpreter
 
 def read_file(filename):
     """Read the contents of a BIM file"""
@@ -16,47 +43,237 @@ def read_file(filename):
         print(f"Error reading file '{filename}': {e}")
         sys.exit(1)
 
-def run_bim_code(code, filename="<stdin>"):
+def parse_code(code):
+    """Lex and parse BIM code, returning (ast, deepest expression depth)"""
+    lexer = Lexer(code)
+    parser = Parser(lexer.tokenize())
+    ast = parser.parse_program()
+    return ast, parser.max_depth
+
+def load_program(code, filename, use_cache=True, cache_size=cache.DEFAULT_MAX_CACHE_BYTES):
+    """Parse BIM code, reusing the on-disk cache for files that have not changed"""
+    if not use_cache or filename == "<stdin>":
+        return parse_code(code)
+
+    cached = cache.load_program(filename, code)
+    if cached is not None:
+        return cached
+
+    ast, max_depth = parse_code(code)
+    cache.store_program(filename, code, ast, max_depth, max_bytes=cache_size)
+    return ast, max_depth
+
+def report_optimizations(optimizer, filename):
+    """Print what the optimizer folded and removed to stderr"""
+    print(f"Optimizations in {filename}:", file=sys.stderr)
+    for line in optimizer.summary() or ["nothing to optimize"]:
+        print(f"  {line}", file=sys.stderr)
+    for line in optimizer.removed:
+        print(f"    {line}", file=sys.stderr)
+
+def describe_error(error, engine):
+    """Message for an error that stopped a program; hitting Python's recursion limit points to the VM"""
+    if isinstance(error, RecursionError) and engine != 'vm':
+        return (f"{error} (the {engine} engine nests bim calls on Python's stack, so deep recursion needs "
+                f"--engine=vm)")
+    return str(error)
+
+def report_quickening(interpreter, filename):
+    """Print the inline cache counters of the tree walker's binary operator sites to stderr"""
+    print(f"Binary operator sites in {filename}:", file=sys.stderr)
+    for line in interpreter.quickening_report() or ["none ran on the tree walker"]:
+        print(f"  {line}", file=sys.stderr)
+
+def report_memoization(interpreter, filename):
+    """Print the result cache counters of every memoized function to stderr"""
+    print(f"Memoized functions in {filename}:", file=sys.stderr)
+    for line in interpreter.memoization_report() or ["none"]:
+        print(f"  {line}", file=sys.stderr)
+
+def prepare_program(code, filename, interpreter, use_cache=False, cache_size=cache.DEFAULT_MAX_CACHE_BYTES,
+                    optimize=False, opt_report=False):
+    """Parse (and with optimize, optimize) BIM code for the given interpreter"""
+    ast, max_depth = load_program(code, filename, use_cache, cache_size)
+
+    if max_depth > DEEP_EXPRESSION_DEPTH:
+        interpreter.enable_explicit_stack()
+    elif optimize:
+        #the optimizer is recursive, so very deep programs are run as parsed
+        optimizer = Optimizer(interpreter)
+        ast = optimizer.optimize(ast)
+        if opt_report:
+            report_optimizations(optimizer, filename)
+    return ast
+
+def load_bytecode(code, filename, interpreter, use_cache=False, cache_size=cache.DEFAULT_MAX_CACHE_BYTES,
+                  optimize=False, opt_report=False):
+    """Compile BIM code for the VM, reusing cached bytecode for files that have not changed"""
+    variant = ".vm-O" if optimize else ".vm"
+    #a cached program has nothing to report, so --opt-report always recompiles
+    use_bytecode_cache = use_cache and filename != "<stdin>" and not opt_report
+    if use_bytecode_cache:
+        data = cache.load_bytecode(filename, code, variant)
+        program = deserialize(data) if data is not None else None
+        if program is not None:
+            return program
+
+    ast = prepare_program(code, filename, interpreter, use_cache, cache_size, optimize, opt_report)
+    program = Compiler().compile_program(ast)
+    if use_bytecode_cache:
+        cache.store_bytecode(filename, code, variant, serialize(program), max_bytes=cache_size)
+    return program
+
+def run_bim_code(code, filename="<stdin>", use_cache=False, cache_size=cache.DEFAULT_MAX_CACHE_BYTES,
+                 optimize=False, opt_report=False, engine='tree', quicken_stats=False, max_depth=MAX_CALL_DEPTH,
+                 memo_size=DEFAULT_MEMO_SIZE, memo_stats=False):
     """Execute BIM code"""
-    interpreter = Interpreter()
+    interpreter = create_interpreter(engine, max_depth, memo_size)
     
     try:
-        lexer = Lexer(code)
-        parser = Parser(lexer)
-        ast = parser.parse_program()
-        
-        result = interpreter.visit(ast)
+        if engine == 'vm':
+            program = load_bytecode(code, filename, interpreter, use_cache, cache_size, optimize, opt_report)
+            interpreter.execute(program)
+        else:
+            ast = prepare_program(code, filename, interpreter, use_cache, cache_size, optimize, opt_report)
+            interpreter.run(ast)
             
+    except Exception as e:
+        print(f"Error in {filename}: {describe_error(e, engine)}")
+        sys.exit(1)
+    finally:
+        if quicken_stats:
+            report_quickening(interpreter, filename)
+        if memo_stats:
+            report_memoization(interpreter, filename)
+
+def run_bim_file_streaming(filename, use_mmap=False, optimize=False, opt_report=False, engine='tree',
+                           quicken_stats=False, max_depth=MAX_CALL_DEPTH, memo_size=DEFAULT_MEMO_SIZE,
+                           memo_stats=False):
+    """Execute a BIM file statement by statement without loading the whole source"""
+    interpreter = create_interpreter(engine, max_depth, memo_size)
+    optimizer = Optimizer(interpreter) if optimize else None
+
+    try:
+        lexer = Lexer.from_file(filename, use_mmap=use_mmap)
+        parser = Parser(lexer)
+        for statement in parser.iter_statements():
+            if parser.max_depth > DEEP_EXPRESSION_DEPTH:
+                interpreter.enable_explicit_stack()
+                optimizer = None
+            if optimizer is not None:
+                statement = optimizer.visit(statement)
+                if statement is None:
+                    continue
+            interpreter.run(statement)
+
+        if optimizer is not None and opt_report:
+            report_optimizations(optimizer, filename)
+
+    except Exception as e:
+        print(f"Error in {filename}: {describe_error(e, engine)}")
+        sys.exit(1)
+    finally:
+        if quicken_stats:
+            report_quickening(interpreter, filename)
+        if memo_stats:
+            report_memoization(interpreter, filename)
+
+def disassemble_file(code, filename, optimize=False):
+    """Print the bytecode the VM would run for a file"""
+    try:
+        ast = prepare_program(code, filename, VirtualMachine(), optimize=optimize)
+        print("\n".join(disassemble(Compiler().compile_program(ast))))
+    except Exception as e:
+        print(f"Error in {filename}: {e}")
+        sys.exit(1)
+
+def emit_python(code, filename, optimize=False):
+    """Print the Python the transpile engine generates for each function in a file"""
+    try:
+        interpreter = TranspilingInterpreter()
+        ast = prepare_program(code, filename, interpreter, optimize=optimize)
+        print("\n".join(interpreter.transpiler.emit_program(ast)))
     except Exception as e:
         print(f"Error in {filename}: {e}")
         sys.exit(1)
 
-def run_help():
-    print("bim <filename.bim>    # Run a BIM file")
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog="bim", description="Run a BIM file")
+    arg_parser.add_argument("filename", help="the .bim file to run")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="read the file in chunks and run each top-level statement as soon as it is parsed")
+    arg_parser.add_argument("--mmap", action="store_true",
+                            help="with --stream, read the file through mmap")
+    arg_parser.add_argument("-O", dest="optimize", action="store_true",
+                            help="fold constants and remove unreachable code before running")
+    arg_parser.add_argument("--opt-report", action="store_true",
+                            help="with -O, print what the optimizer folded and removed to stderr")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                            help="tree: walk the AST (default); closure: compile the AST into Python closures first; "
+                                 "vm: compile to bytecode and run it on a stack VM; "
+                                 "transpile: walk the AST but run hot functions as generated Python")
+    arg_parser.add_argument("--max-depth", type=int, metavar="N",
+                            help=f"with --engine=vm, fail when calls nest deeper than this (default: {MAX_CALL_DEPTH}); "
+                                 "the VM keeps calls on its own stack, so deep recursion is limited by this and memory "
+                                 "instead of Python's recursion limit")
+    arg_parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                            help="results each memoized function keeps before evicting the least recently used "
+                                 "(default: %(default)d)")
+    arg_parser.add_argument("--memo-stats", action="store_true",
+                            help="print the cache hits/misses/evictions of each memoized function to stderr")
+    arg_parser.add_argument("--quicken-stats", action="store_true",
+                            help="with --engine=tree, print the inline cache hits/misses of each binary operator site "
+                                 "to stderr")
+    arg_parser.add_argument("--dis", action="store_true",
+                            help="print the VM bytecode for the file instead of running it")
+    arg_parser.add_argument("--emit-python", action="store_true",
+                            help="print the Python generated for each function instead of running the file")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help=f"always re-parse instead of using the {cache.CACHE_DIR_NAME} program cache")
+    arg_parser.add_argument("--cache-size", type=float, default=cache.DEFAULT_MAX_CACHE_BYTES / (1024 * 1024), metavar="MB",
+                            help="evict least recently used cache entries beyond this size (default: %(default)g MB)")
+    return arg_parser
 
 def main():
-    if len(sys.argv) < 2:
-        run_help()
-        sys.exit(1)
-    
-    arg = sys.argv[1]
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args()
+    filename = args.filename
+        
+    if not filename.endswith('.bim'):
+        print("Warning: BIM files should have a .bim extension")
     
-    if arg == "--help" or arg == "-h":
-        run_help()
+    if not os.path.exists(filename):
+        print(f"Error: File '{filename}' not found")
+        sys.exit(1)
+
+    if args.dis:
+        disassemble_file(read_file(filename), filename, optimize=args.optimize)
+        return
+
+    if args.emit_python:
+        emit_python(read_file(filename), filename, optimize=args.optimize)
+        return
+
+    if args.max_depth is None:
+        args.max_depth = MAX_CALL_DEPTH
+    elif args.engine != 'vm':
+        #the other engines recurse in Python, so their depth is bounded by Python's recursion limit instead
+        arg_parser.error("--max-depth only applies to --engine=vm")
+    if args.quicken_stats and args.engine != 'tree':
+        #only the tree walker's binary operator sites quicken
+        arg_parser.error("--quicken-stats only applies to --engine=tree")
+
+    if args.stream or args.mmap:
+        run_bim_file_streaming(filename, use_mmap=args.mmap, optimize=args.optimize, opt_report=args.opt_report,
+                               engine=args.engine, quicken_stats=args.quicken_stats, max_depth=args.max_depth,
+                               memo_size=args.memo_size, memo_stats=args.memo_stats)
         return
     
-    else:
-        filename = arg
-        
-        if not filename.endswith('.bim'):
-            print("Warning: BIM files should have a .bim extension")
-        
-        if not os.path.exists(filename):
-            print(f"Error: File '{filename}' not found")
-            sys.exit(1)
-        
-        code = read_file(filename)
-        run_bim_code(code, filename)
+    code = read_file(filename)
+    run_bim_code(code, filename, use_cache=not args.no_cache, cache_size=int(args.cache_size * 1024 * 1024),
+                 optimize=args.optimize, opt_report=args.opt_report, engine=args.engine,
+                 quicken_stats=args.quicken_stats, max_depth=args.max_depth, memo_size=args.memo_size,
+                 memo_stats=args.memo_stats)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from bim.ast_nodes import *
+from bim.resolver import child_nodes
+
+#results cached per memoized function before the least recently used one is evicted
+DEFAULT_MEMO_SIZE = 1024
+
+#array, string builder, map and set methods that change the object they are called on
+MUTATING_METHODS = frozenset(('push', 'pop', 'insert', 'remove', 'sort', 'reverse', 'extend', 'append', 'add', 'delete'))
+#array methods that call the function named by their first argument
+CALLING_METHODS = frozenset(('sort', 'map', 'filter', 'reduce'))
+#builtins with side effects
+IMPURE_BUILTINS = frozenset(('print',))
+
+#argument and result types that are cached; arrays are mutable, so calls involving them are not
+CACHED_TYPES = frozenset((float, int, str, bool, type(None), range))
+
+#lookup() result for a key that is not cached
+MISSING = object()
+
+def mutation_root(node):
+    """The expression whose array a[i][j] = x or a.push(x) changes: a, or the call/literal it starts from"""
+    while type(node) is IndexNode or type(node) is MethodCallNode:
+        node = node.array if type(node) is IndexNode else node.object_expr
+    return node
+
+def function_purity(parameters, body):
+    """(reason the body is impure or None, names of the functions it calls) for a resolved function body.
+
+    The body is impure if it can change an array it did not create: one passed in as an argument, a global,
+    or anything assigned from them. Whether the functions it calls are pure depends on what they are when it
+    is memoized, so those are only collected.
+    """
+    #frame slots that may hold an array from outside the call
+    outside = set(range(len(parameters)))
+    #(slot, value) for every local assignment and for loop; a slot assigned from an outside value is outside too
+    flows = []
+    mutations = []
+    callees = []
+    work = [body]
+    while work:
+        node = work.pop()
+        node_type = type(node)
+        if node_type is FunctionDefNode:
+            continue
+        if node_type is AssignmentNode and node.slot is not None:
+            flows.append((node.slot, node.value))
+        elif node_type is ForNode:
+            flows.append((node.slot, node.iterable))
+        elif node_type is IndexAssignmentNode:
+            mutations.append(node.array)
+        elif node_type is MethodCallNode:
+            if node.method_name in MUTATING_METHODS:
+                mutations.append(node.object_expr)
+            if node.method_name in CALLING_METHODS and node.arguments:
+                #a.map("f") calls f
+                function_name = node.arguments[0]
+                if type(function_name) is not StringNode:
+                    return f"calls a function chosen at run time in {node.method_name}()", callees
+                if function_name.value not in callees:
+                    callees.append(function_name.value)
+        elif node_type is FunctionCallNode and node.function_name not in callees:
+            callees.append(node.function_name)
+        work.extend(child_nodes(node))
+
+    def from_outside(node):
+        """Whether the value of node may be (part of) an array from outside the call"""
+        work = [node]
+        while work:
+            node = work.pop()
+            if type(node) is VariableNode and (node.slot is None or node.slot in outside):
+                return True
+            if type(node) is FunctionCallNode:
+                #a call can return one of its arguments or a global
+                return True
+            work.extend(child_nodes(node))
+        return False
+
+    changed = True
+    while changed:
+        changed = False
+        for slot, value in flows:
+            if slot not in outside and from_outside(value):
+                outside.add(slot)
+                changed = True
+
+    for target in mutations:
+        root = mutation_root(target)
+        if type(root) is VariableNode:
+            if root.slot is None:
+                return f"changes the global '{root.name}'", callees
+            if root.slot < len(parameters):
+                return f"changes its argument '{root.name}'", callees
+            if root.slot in outside:
+                return f"changes '{root.name}', which may be an argument or a global", callees
+        elif type(root) is not ArrayNode and type(root) is not MapNode and from_outside(root):
+            return "changes an array returned by a call", callees
+    return None, callees
+
+class MemoCache:
+    """Bounded LRU cache of a function's results keyed by its argument values, with hit/miss counters"""
+    __slots__ = ('name', 'max_size', 'entries', 'hits', 'misses', 'evictions', 'uncached')
+
+    def __init__(self, name, max_size=DEFAULT_MEMO_SIZE):
+        self.name = name
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0  # calls with an array argument or result, which always run
+
+    def key(self, arg_values):
+        """Cache key for a call, or None if an argument cannot be a key"""
+        for value in arg_values:
+            if type(value) not in CACHED_TYPES:
+                self.uncached += 1
+                return None
+        #with the types, since true == 1 and 1 == 1.0 but they print differently
+        return tuple(map(type, arg_values)) + tuple(arg_values)
+
+    def lookup(self, key):
+        """Cached result for a key (marked as recently used), or MISSING"""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def store(self, key, value):
+        """Remember a result, evicting the least recently used one when the cache is full"""
+        if type(value) not in CACHED_TYPES:
+            self.uncached += 1
+            return
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def report(self):
+        return (f"{self.name}: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+                f"{self.uncached} uncached calls, {len(self.entries)}/{self.max_size} entries")
@@ -0,0 +1,180 @@
+from bim.ast_nodes import *
+from bim.interpreter import Interpreter
+
+#folded strings longer than this are left as expressions to keep the AST small
+MAX_FOLDED_STRING = 4096
+
+LITERAL_NODES = (NumberNode, StringNode, BooleanNode)
+
+#simplifies the AST between parsing and interpreting
+class Optimizer:
+    """Constant folding, dead branch elimination and literal precomputation"""
+    def __init__(self, interpreter=None):
+        #the interpreter supplies the language's own operator and truthiness semantics
+        self.interpreter = interpreter or Interpreter()
+        self.removed = []  # descriptions of what was folded or removed
+        self.stats = {
+            'folded': 0,
+            'branches_removed': 0,
+            'loops_removed': 0,
+            'unreachable_removed': 0,
+            'arrays_precomputed': 0,
+        }
+
+    def optimize(self, node):
+        """Optimize a program (the tree is updated in place) and return the new root"""
+        result = self.visit(node)
+        return result if result is not None else BlockNode([])
+
+    def visit(self, node):
+        """Optimize a node and return its replacement (None removes a statement)"""
+        method_name = f'optimize_{type(node).__name__}'
+        optimizer = getattr(self, method_name, None)
+        if optimizer is not None:
+            return optimizer(node)
+        return self.optimize_children(node)
+
+    def optimize_children(self, node):
+        """Optimize every child node in place"""
+        for field in type(node).__slots__:
+            value = getattr(node, field, None)
+            if isinstance(value, ASTNode):
+                setattr(node, field, self.visit(value))
+            elif isinstance(value, list):
+                setattr(node, field, [self.visit(item) if isinstance(item, ASTNode) else item for item in value])
+        return node
+
+    def literal(self, value, description):
+        """Node for a folded value, or None if the value has no literal form"""
+        if type(value) is float:
+            node = NumberNode(value)
+        elif type(value) is bool:
+            node = BooleanNode(value)
+        elif type(value) is str and len(value) <= MAX_FOLDED_STRING:
+            node = StringNode(value)
+        else:
+            return None
+        self.stats['folded'] += 1
+        self.removed.append(f"folded {description} to {node!r}")
+        return node
+
+    def optimize_UnaryOpNode(self, node):
+        node.operand = self.visit(node.operand)
+        if isinstance(node.operand, NumberNode) or (node.op == OP_NOT and isinstance(node.operand, LITERAL_NODES)):
+            folded = self.literal(self.interpreter.unary_operation(node.op, node.operand.value), repr(node))
+            if folded is not None:
+                return folded
+        return node
+
+    def optimize_LogicalNode(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        if isinstance(node.left, LITERAL_NODES):
+            #a literal left side decides statically whether the right side runs
+            decided = self.interpreter.is_truthy(node.left.value) == (node.op == OP_OR)
+            result = node.left if decided else node.right
+            self.stats['folded'] += 1
+            self.removed.append(f"folded {node!r} to {result!r}")
+            return result
+        return node
+
+    def optimize_BinaryOpNode(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        if isinstance(node.left, LITERAL_NODES) and isinstance(node.right, LITERAL_NODES):
+            try:
+                value = self.interpreter.binary_operation(node.op, node.left.value, node.right.value)
+            except Exception:
+                #errors such as division by zero must still happen at run time
+                return node
+            folded = self.literal(value, repr(node))
+            if folded is not None:
+                return folded
+        return node
+
+    def optimize_ArrayNode(self, node):
+        node.elements = [self.visit(element) for element in node.elements]
+        if node.elements and all(isinstance(element, LITERAL_NODES) for element in node.elements):
+            #build each new array from a precomputed tuple instead of visiting every element
+            node.constant = tuple(element.value for element in node.elements)
+            self.stats['arrays_precomputed'] += 1
+        return node
+
+    def optimize_FStringNode(self, node):
+        node.parts = [self.visit(part) for part in node.parts]
+        if all(isinstance(part, LITERAL_NODES) for part in node.parts):
+            folded = self.literal(''.join(str(part.value) for part in node.parts), repr(node))
+            if folded is not None:
+                return folded
+        return node
+
+    def optimize_BlockNode(self, node):
+        statements = []
+        for index, statement in enumerate(node.statements):
+            statement = self.visit(statement)
+            if statement is None:
+                continue
+            statements.append(statement)
+            if isinstance(statement, (BreakNode, ContinueNode, ReturnNode)):
+                unreachable = len(node.statements) - index - 1
+                if unreachable:
+                    self.stats['unreachable_removed'] += unreachable
+                    self.removed.append(f"removed {unreachable} unreachable statement(s) after {statement!r}")
+                break
+        node.statements = statements
+        return node
+
+    def optimize_IfNode(self, node):
+        """Drop branches whose condition is a literal and collapse the if when the taken branch is known"""
+        clauses = [(node.condition, node.if_body)] + list(node.elif_clauses)
+        kept = []
+        else_body = node.else_body
+
+        for position, (condition, body) in enumerate(clauses):
+            condition = self.visit(condition)
+            if not isinstance(condition, LITERAL_NODES):
+                kept.append((condition, self.visit(body)))
+                continue
+
+            if self.interpreter.is_truthy(condition.value):
+                #an always-true branch becomes the else branch and every branch after it is unreachable
+                skipped = len(clauses) - position - 1 + (else_body is not None)
+                if skipped:
+                    self.stats['branches_removed'] += skipped
+                    self.removed.append(f"removed {skipped} branch(es) after always-true condition {condition!r}")
+                else_body = body
+                break
+
+            self.stats['branches_removed'] += 1
+            self.removed.append(f"removed branch with always-false condition {condition!r}")
+
+        if else_body is not None:
+            else_body = self.visit(else_body)
+        if not kept:
+            #either the taken branch is known or nothing runs at all
+            return else_body
+
+        node.condition, node.if_body = kept[0]
+        node.elif_clauses = kept[1:]
+        node.else_body = else_body
+        return node
+
+    def optimize_WhileNode(self, node):
+        node.condition = self.visit(node.condition)
+        if isinstance(node.condition, LITERAL_NODES) and not self.interpreter.is_truthy(node.condition.value):
+            self.stats['loops_removed'] += 1
+            self.removed.append(f"removed while loop with always-false condition {node.condition!r}")
+            return None
+        node.body = self.visit(node.body)
+        return node
+
+    def summary(self):
+        """One line per kind of optimization that was applied"""
+        labels = {
+            'folded': "constant expressions folded",
+            'branches_removed': "if/else branches removed",
+            'loops_removed': "while loops removed",
+            'unreachable_removed': "unreachable statements removed",
+            'arrays_precomputed': "constant arrays precomputed",
+        }
+        return [f"{count} {labels[name]}" for name, count in self.stats.items() if count]
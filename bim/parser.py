@@ -1,156 +1,404 @@
 from bim.bim_token import *
 from bim.ast_nodes import *
+from bim.lexer import Lexer
+
+#binary operators: token type -> (precedence, right associative, operator code), higher precedence binds tighter
+BINARY_OPERATORS = {
+    TokenType.OR: (1, False, OP_OR),
+    TokenType.AND: (2, False, OP_AND),
+    TokenType.EQUAL: (4, False, OP_EQUAL),
+    TokenType.NOT_EQUAL: (4, False, OP_NOT_EQUAL),
+    TokenType.LESS_THAN: (4, False, OP_LESS_THAN),
+    TokenType.GREATER_THAN: (4, False, OP_GREATER_THAN),
+    TokenType.LESS_EQUAL: (4, False, OP_LESS_EQUAL),
+    TokenType.GREATER_EQUAL: (4, False, OP_GREATER_EQUAL),
+    TokenType.IN: (4, False, OP_IN),
+    TokenType.PLUS: (5, False, OP_PLUS),
+    TokenType.MINUS: (5, False, OP_MINUS),
+    TokenType.MULTIPLY: (6, False, OP_MULTIPLY),
+    TokenType.DIVIDE: (6, False, OP_DIVIDE),
+}
+
+#`not` (and `!`) applies to a whole comparison like Python's: not a == b is not (a == b), not a and b is (not a) and b
+NOT_PRECEDENCE = 3
+
+#the words and, or and not are identifiers to the lexer and only operators where an operator can go, so scripts
+#that use them as variable or function names keep working: and/or after an operand, not before one
+WORD_OPERATORS = {'and': TokenType.AND, 'or': TokenType.OR}
+OPERAND_STARTS = frozenset((TokenType.IDENTIFIER, TokenType.NUMBER, TokenType.STRING, TokenType.FSTRING,
+                            TokenType.TRUE, TokenType.FALSE, TokenType.LPAREN, TokenType.LBRACKET, TokenType.LBRACE,
+                            TokenType.PLUS, TokenType.MINUS, TokenType.NOT))
+
+#kinds of frames on the expression parser's stack
+TOP_FRAME = 0
+GROUP_FRAME = 1
+ARRAY_FRAME = 2
+CALL_FRAME = 3
+METHOD_FRAME = 4
+INDEX_FRAME = 5
+MAP_FRAME = 6
+
+class ExpressionFrame:
+    """A partially parsed expression on the parser's explicit stack"""
+    __slots__ = ('kind', 'base', 'base_depth', 'operands', 'depths', 'operators', 'signs', 'items')
+
+    def __init__(self, kind, base=None, base_depth=0):
+        self.kind = kind
+        self.base = base  # function name, (object, method name) or indexed expression
+        self.base_depth = base_depth
+        self.operands = []
+        self.depths = []  # tree depth of each operand
+        self.operators = []  # (precedence, operator code) of pending binary operators
+        self.signs = []  # operator codes of pending unary +/- signs
+        self.items = []  # finished array elements, call arguments or map keys and values
+
+    def reduce(self, operator):
+        """Combine pending operators that bind at least as tightly as the incoming one"""
+        precedence, right_associative, _ = operator
+        operators = self.operators
+        while operators:
+            top = operators[-1][0]
+            if top < precedence or (top == precedence and right_associative):
+                return
+            self.combine()
+
+    def reduce_all(self):
+        """Combine everything left in the frame and return (node, depth)"""
+        while self.operators:
+            self.combine()
+        return self.operands.pop(), self.depths.pop()
+
+    def combine(self):
+        _, op = self.operators.pop()
+        if op == OP_NOT:
+            #prefix operator: applies to the operand parsed after it
+            self.operands[-1] = UnaryOpNode(OP_NOT, self.operands[-1])
+            self.depths[-1] += 1
+            return
+        right = self.operands.pop()
+        right_depth = self.depths.pop()
+        node_type = LogicalNode if op == OP_AND or op == OP_OR else BinaryOpNode
+        self.operands[-1] = node_type(self.operands[-1], op, right)
+        self.depths[-1] = max(self.depths[-1], right_depth) + 1
 
 class Parser:
-    def __init__(self, lexer):
-        self.lexer = lexer
-        self.current_token = self.lexer.get_next_token()
+    def __init__(self, lexer, intern_constants=True):
+        #accepts either a Lexer (tokens pulled on demand) or a buffered TokenStream from Lexer.tokenize()
+        if isinstance(lexer, TokenStream):
+            self.lexer = None
+            self.tokens = lexer
+            #read straight from the stream's arrays, so no Token object is built per token
+            self.kinds = lexer.kinds
+            self.values = lexer.values
+            self.index = -1
+            self.advance = self.advance_buffered
+        else:
+            self.lexer = lexer
+            self.tokens = None
+            self.advance = self.advance_lexer
+        #type and value of the current token
+        self.token_type = None
+        self.token_value = None
+        self.advance()
+
+        #deepest expression tree built so far (used to pick the explicit-stack evaluator)
+        self.max_depth = 0
+        #(node type, value) -> shared literal node, so repeated constants are stored once
+        self.constants = {} if intern_constants else None
+
+    def advance_buffered(self):
+        """Move to the next token of the buffered stream (EOF past its end)"""
+        index = self.index = self.index + 1
+        if index < len(self.kinds):
+            self.token_type = TOKEN_TYPES[self.kinds[index]]
+            self.token_value = self.values[index]
+        else:
+            self.token_type = TokenType.EOF
+            self.token_value = ""
+
+    def advance_lexer(self):
+        """Move to the next token the lexer produces"""
+        token = self.lexer.get_next_token()
+        self.token_type = token.type
+        self.token_value = token.value
+
+    def peek_token(self, n=1):
+        """Look at the token type n positions ahead (requires a buffered TokenStream)"""
+        if self.tokens is None:
+            raise Exception("Lookahead requires a buffered token stream")
+        return self.tokens.kind(self.index + n)
     
     def eat(self, token_type):
         """Move forward if everything is correct"""
-        if self.current_token.type == token_type:
-            self.current_token = self.lexer.get_next_token()
+        if self.token_type == token_type:
+            self.advance()
         else:
-            raise Exception(f"Expected {token_type}, got {self.current_token.type}")
-        
+            raise Exception(f"Expected {token_type}, got {self.token_type}")
+        
+    def constant(self, node_type, value):
+        """Return a literal node, reusing an identical one when constants are interned"""
+        if self.constants is None:
+            return node_type(value)
+        key = (node_type, value)
+        node = self.constants.get(key)
+        if node is None:
+            node = self.constants[key] = node_type(value)
+        return node
+
     def skip_newlines(self):
         """Skip any newline tokens"""
-        while self.current_token.type == TokenType.NEWLINE:
+        while self.token_type == TokenType.NEWLINE:
             self.eat(TokenType.NEWLINE)
 
     
-    def factor(self):
-        """Higher priority (numbers, paranthesis, strings, functions, etc)"""
-        token = self.current_token
-        
-        if token.type == TokenType.PLUS:
-            self.eat(TokenType.PLUS)
-            return UnaryOpNode(token, self.factor()) 
-        
-        elif token.type == TokenType.MINUS:
-            self.eat(TokenType.MINUS)
-            return UnaryOpNode(token, self.factor())
+    def expression(self):
+        """Parse an expression with an explicit stack of frames instead of recursion, so nesting depth is unlimited
 
-        elif token.type == TokenType.NUMBER:
-            self.eat(TokenType.NUMBER)
-            return self.parse_postfix(NumberNode(float(token.value)))
-    
-        elif token.type == TokenType.STRING:
-            self.eat(TokenType.STRING)
-            return self.parse_postfix(StringNode(token.value))
-        
-        elif token.type == TokenType.TRUE:
-            self.eat(TokenType.TRUE)
-            return self.parse_postfix(BooleanNode(True))
-        
-        elif token.type == TokenType.FALSE:
-            self.eat(TokenType.FALSE)
-            return self.parse_postfix(BooleanNode(False))
-        
-        elif token.type == TokenType.LBRACKET:
-            # Array literal
-            return self.parse_postfix(self.parse_array())
-        
-        elif token.type == TokenType.IDENTIFIER:
-            function_name = token.value
-            self.eat(TokenType.IDENTIFIER)
-            
-            if self.current_token.type == TokenType.LPAREN:
-                # Function call
-                self.eat(TokenType.LPAREN)
-                arguments = self.parse_arguments()
-                self.eat(TokenType.RPAREN)
-                return self.parse_postfix(FunctionCallNode(function_name, arguments))
+        Binary operators are combined by precedence climbing over BINARY_OPERATORS. Parentheses,
+        array and map literals, call arguments and index brackets each push a frame that is popped when its
+        closing token is reached.
+        """
+        frames = []
+        frame = ExpressionFrame(TOP_FRAME)
+
+        while True:
+            #expecting an operand: prefix signs, then an atom or an opening bracket
+            token_type = self.token_type
+            value = self.token_value
+
+            if token_type is TokenType.IDENTIFIER:
+                self.advance()
+                if (value == 'not' and self.token_type in OPERAND_STARTS
+                        and self.token_value not in WORD_OPERATORS):
+                    self.push_not(frame)
+                    continue
+                if self.token_type is TokenType.LPAREN:
+                    # Function call
+                    self.advance()
+                    if self.token_type != TokenType.RPAREN:
+                        frames.append(frame)
+                        frame = ExpressionFrame(CALL_FRAME, value)
+                        continue
+                    self.advance()
+                    node = FunctionCallNode(value, [])
+                else:
+                    # Variable
+                    node = VariableNode(value)
+            elif token_type is TokenType.NUMBER:
+                self.advance()
+                node = self.constant(NumberNode, float(value))
+            elif token_type is TokenType.PLUS or token_type is TokenType.MINUS:
+                #sign applies to the next complete operand (including its postfix operations)
+                self.advance()
+                frame.signs.append(OP_PLUS if token_type is TokenType.PLUS else OP_MINUS)
+                continue
+            elif token_type is TokenType.NOT:
+                self.advance()
+                self.push_not(frame)
+                continue
+            elif token_type is TokenType.LPAREN:
+                self.advance()
+                frames.append(frame)
+                frame = ExpressionFrame(GROUP_FRAME)
+                continue
+            elif token_type is TokenType.STRING:
+                self.advance()
+                node = self.constant(StringNode, value)
+            elif token_type is TokenType.FSTRING:
+                self.advance()
+                node = self.parse_fstring(value)
+            elif token_type is TokenType.TRUE or token_type is TokenType.FALSE:
+                self.advance()
+                node = self.constant(BooleanNode, token_type is TokenType.TRUE)
+            elif token_type is TokenType.LBRACKET:
+                # Array literal
+                self.advance()
+                if self.token_type != TokenType.RBRACKET:
+                    frames.append(frame)
+                    frame = ExpressionFrame(ARRAY_FRAME)
+                    continue
+                self.advance()
+                node = ArrayNode([])
+            elif token_type is TokenType.LBRACE:
+                # Map literal; may span several lines
+                self.advance()
+                self.skip_newlines()
+                if self.token_type != TokenType.RBRACE:
+                    frames.append(frame)
+                    frame = ExpressionFrame(MAP_FRAME)
+                    continue
+                self.advance()
+                node = MapNode([])
             else:
-                # Variable
-                return self.parse_postfix(VariableNode(function_name))
-        
-        elif token.type == TokenType.LPAREN:
-            self.eat(TokenType.LPAREN)
-            node = self.expression()
-            self.eat(TokenType.RPAREN)
-            return self.parse_postfix(node)
-            
-            raise Exception(f"Unexpected token: {token.type}")
-    
-    def term(self):
-        """parse and return AST for multiplication and division (medium-high priority in PEMDAS)"""
-        node = self.factor()
-        
-        while self.current_token.type in (TokenType.MULTIPLY, TokenType.DIVIDE):
-            token = self.current_token
-            if token.type == TokenType.MULTIPLY:
-                self.eat(TokenType.MULTIPLY)
-            elif token.type == TokenType.DIVIDE:
-                self.eat(TokenType.DIVIDE)
-            
-            node = BinaryOpNode(left=node, operator=token, right=self.factor())
-        
-        return node
-    
-    def arithmetic_expression(self):
-        """Parse and return AST for addition and subtraction (medium-low priority in PEMDAS)"""
-        node = self.term()
-        
-        while self.current_token.type in (TokenType.PLUS, TokenType.MINUS):
-            token = self.current_token
-            if token.type == TokenType.PLUS:
-                self.eat(TokenType.PLUS)
-            elif token.type == TokenType.MINUS:
-                self.eat(TokenType.MINUS)
-
-            node = BinaryOpNode(left=node, operator=token, right=self.term())
-        
-        return node
-    
-    def expression(self):
-        """Lowest precedence: comparison operators"""
-        node = self.arithmetic_expression()
-        possible = (TokenType.EQUAL, TokenType.NOT_EQUAL, TokenType.LESS_THAN, TokenType.GREATER_THAN, TokenType.LESS_EQUAL, TokenType.GREATER_EQUAL)
-        
-        while self.current_token.type in possible:
-            token = self.current_token
-            if token.type == TokenType.EQUAL:
-                self.eat(TokenType.EQUAL)
-            elif token.type == TokenType.NOT_EQUAL:
-                self.eat(TokenType.NOT_EQUAL)
-            elif token.type == TokenType.LESS_THAN:
-                self.eat(TokenType.LESS_THAN)
-            elif token.type == TokenType.GREATER_THAN:
-                self.eat(TokenType.GREATER_THAN)
-            elif token.type == TokenType.LESS_EQUAL:
-                self.eat(TokenType.LESS_EQUAL)
-            elif token.type == TokenType.GREATER_EQUAL:
-                self.eat(TokenType.GREATER_EQUAL)
-            
-            node = BinaryOpNode(left=node, operator=token, right=self.arithmetic_expression())
-        
-        return node
+                raise Exception(f"Unexpected token: {token_type}")
+            depth = 1
+
+            #have a complete operand: postfix operations, then a binary operator or the end of the frame
+            while True:
+                token_type = self.token_type
+
+                if token_type is TokenType.LBRACKET:
+                    # Array indexing (arr[index])
+                    self.advance()
+                    frames.append(frame)
+                    frame = ExpressionFrame(INDEX_FRAME, node, depth)
+                    break
+
+                if token_type is TokenType.DOT:
+                    # Method call (arr.method(args))
+                    self.advance()
+                    if self.token_type != TokenType.IDENTIFIER:
+                        raise Exception("Expected method name after '.'")
+                    method_name = self.token_value
+                    self.advance()
+
+                    if self.token_type is TokenType.LPAREN:
+                        self.advance()
+                        if self.token_type != TokenType.RPAREN:
+                            frames.append(frame)
+                            frame = ExpressionFrame(METHOD_FRAME, (node, method_name), depth)
+                            break
+                        self.advance()
+                    # access without parentheses is treated as a method call with no args
+                    node = MethodCallNode(node, method_name, [])
+                    depth += 1
+                    continue
+
+                signs = frame.signs
+                while signs:
+                    node = UnaryOpNode(signs.pop(), node)
+                    depth += 1
+                frame.operands.append(node)
+                frame.depths.append(depth)
+
+                if token_type is TokenType.IDENTIFIER:
+                    token_type = WORD_OPERATORS.get(self.token_value, token_type)
+                operator = BINARY_OPERATORS.get(token_type)
+                if operator is not None:
+                    frame.reduce(operator)
+                    frame.operators.append((operator[0], operator[2]))
+                    self.advance()
+                    break
+
+                #end of this frame's expression
+                node, depth = frame.reduce_all()
+                kind = frame.kind
+
+                if kind == TOP_FRAME:
+                    if depth > self.max_depth:
+                        self.max_depth = depth
+                    return node
+
+                if kind == GROUP_FRAME:
+                    self.eat(TokenType.RPAREN)
+                    frame = frames.pop()
+                    continue
+
+                if kind == INDEX_FRAME:
+                    self.eat(TokenType.RBRACKET)
+                    node = IndexNode(frame.base, node)
+                    depth = max(depth, frame.base_depth) + 1
+                    frame = frames.pop()
+                    continue
+
+                #comma separated list: array elements, call arguments or key: value pairs
+                frame.items.append(node)
+                if depth > frame.base_depth:
+                    frame.base_depth = depth
+
+                if kind == MAP_FRAME:
+                    self.skip_newlines()
+                    if len(frame.items) % 2:
+                        #a key was parsed, its value follows
+                        self.eat(TokenType.COLON)
+                        self.skip_newlines()
+                        break
+                    if self.token_type is TokenType.COMMA:
+                        self.advance()
+                        self.skip_newlines()
+                        if self.token_type is not TokenType.RBRACE:
+                            break
+                    self.eat(TokenType.RBRACE)
+                    node = MapNode(frame.items)
+                    depth = frame.base_depth + 1
+                    frame = frames.pop()
+                    continue
+
+                if self.token_type is TokenType.COMMA:
+                    self.advance()
+                    break
+
+                if kind == ARRAY_FRAME:
+                    self.eat(TokenType.RBRACKET)
+                    node = ArrayNode(frame.items)
+                elif kind == CALL_FRAME:
+                    self.eat(TokenType.RPAREN)
+                    node = FunctionCallNode(frame.base, frame.items)
+                else:
+                    self.eat(TokenType.RPAREN)
+                    node = MethodCallNode(frame.base[0], frame.base[1], frame.items)
+                depth = frame.base_depth + 1
+                frame = frames.pop()
     
+    @staticmethod
+    def push_not(frame):
+        """Add a `not` to a frame's pending operators"""
+        #pending like a binary operator, so it takes in everything that binds tighter than it; after a sign or a
+        #tighter operator it would also take in what follows that (- not x as not (-x)), so like in Python it needs
+        #parentheses there
+        if frame.signs or (frame.operators and frame.operators[-1][0] > NOT_PRECEDENCE):
+            raise Exception("'not' after a sign or a comparison or arithmetic operator needs parentheses, "
+                            "e.g. -(not x)")
+        frame.operators.append((NOT_PRECEDENCE, OP_NOT))
+
+    def parse_fstring(self, parts):
+        """Build an FStringNode from an f-string token's text and expression source parts"""
+        nodes = []
+        for i, part in enumerate(parts):
+            if i % 2 == 0:
+                if part:
+                    nodes.append(self.constant(StringNode, part))
+                continue
+            parser = Parser(Lexer(part), intern_constants=self.constants is not None)
+            if parser.token_type == TokenType.EOF:
+                raise Exception("Empty expression in f-string")
+            nodes.append(parser.expression())
+            if parser.token_type != TokenType.EOF:
+                raise Exception(f"Invalid expression in f-string: {{{part}}}")
+            self.max_depth = max(self.max_depth, parser.max_depth + 1)
+        return FStringNode(nodes)
+
     def statement(self):
         """Parse a statement (ie assignment or expression)"""
         self.skip_newlines()
 
         #control flow statements
-        if self.current_token.type == TokenType.IF:
+        if self.token_type == TokenType.IF:
             return self.parse_if()
-        elif self.current_token.type == TokenType.WHILE:
+        elif self.token_type == TokenType.WHILE:
             return self.parse_while()
-        elif self.current_token.type == TokenType.FOR:
+        elif self.token_type == TokenType.FOR:
             return self.parse_for()
-        elif self.current_token.type == TokenType.BREAK:
+        elif self.token_type == TokenType.BREAK:
             self.eat(TokenType.BREAK)
             return BreakNode()
-        elif self.current_token.type == TokenType.CONTINUE:
+        elif self.token_type == TokenType.CONTINUE:
             self.eat(TokenType.CONTINUE)
             return ContinueNode()
 
         #variable assignments
-        elif self.current_token.type == TokenType.IDENTIFIER:            
+        elif self.token_type == TokenType.IDENTIFIER:            
             # Parse the left side (could be variable or array access)
             left_expr = self.expression()
-            
-            if self.current_token.type == TokenType.ASSIGN:
+
+            #`memo` is only a keyword right before `function`, so it stays usable as a variable name
+            if (self.token_type == TokenType.FUNCTION and isinstance(left_expr, VariableNode)
+                    and left_expr.name == 'memo'):
+                node = self.parse_function_def()
+                node.memo = True
+                return node
+
+            if self.token_type == TokenType.ASSIGN:
                 self.eat(TokenType.ASSIGN)
                 value = self.expression()
                 
@@ -166,45 +414,27 @@ class Parser:
                 return left_expr
         
         #functions
-        elif self.current_token.type == TokenType.FUNCTION:
+        elif self.token_type == TokenType.FUNCTION:
             return self.parse_function_def()
-        elif self.current_token.type == TokenType.RETURN:
+        elif self.token_type == TokenType.RETURN:
             return self.parse_return()
 
         
         # Parse as expression
         return self.expression()
     
-    def parse_arguments(self):
-        """Parse comma separated function arguments"""
-        arguments = []
-        
-        #empty
-        if self.current_token.type == TokenType.RPAREN:
-            return arguments
-        
-        #first
-        arguments.append(self.expression())
-        
-        #the rest (comma separeted)
-        while self.current_token.type == TokenType.COMMA:
-            self.eat(TokenType.COMMA)
-            arguments.append(self.expression())
-        
-        return arguments
-
     def parse_block(self):
         """Parse a block of statements enclosed in braces"""
         self.eat(TokenType.LBRACE)        
         self.skip_newlines()
         statements = []
         
-        while self.current_token.type != TokenType.RBRACE and self.current_token.type != TokenType.EOF:
+        while self.token_type != TokenType.RBRACE and self.token_type != TokenType.EOF:
             stmt = self.statement()
             statements.append(stmt)
             
-            while self.current_token.type in (TokenType.SEMICOLON, TokenType.COMMA, TokenType.NEWLINE):
-                self.current_token = self.lexer.get_next_token()
+            while self.token_type in (TokenType.SEMICOLON, TokenType.COMMA, TokenType.NEWLINE):
+                self.advance()
         
         self.eat(TokenType.RBRACE)
         return BlockNode(statements)
@@ -222,7 +452,7 @@ class Parser:
         elif_clauses = []
         self.skip_newlines()
 
-        while self.current_token.type == TokenType.ELIF:
+        while self.token_type == TokenType.ELIF:
             self.eat(TokenType.ELIF)
             self.eat(TokenType.LPAREN)
             elif_condition = self.expression()
@@ -235,7 +465,7 @@ class Parser:
             self.skip_newlines()
         
         else_body = None
-        if self.current_token.type == TokenType.ELSE:
+        if self.token_type == TokenType.ELSE:
             self.eat(TokenType.ELSE)
             self.skip_newlines()
             else_body = self.parse_block()
@@ -259,9 +489,9 @@ class Parser:
         self.eat(TokenType.FOR)
         self.eat(TokenType.LPAREN)
         
-        if self.current_token.type != TokenType.IDENTIFIER:
+        if self.token_type != TokenType.IDENTIFIER:
             raise Exception("Expected variable name in for loop")
-        variable_name = self.current_token.value
+        variable_name = self.token_value
         self.eat(TokenType.IDENTIFIER)
         
         self.eat(TokenType.IN)
@@ -276,105 +506,50 @@ class Parser:
     
     def parse_program(self):
         """Parse complete program with multiple statements"""
-        statements = []
-        
-        while self.current_token.type != TokenType.EOF:
+        return BlockNode(list(self.iter_statements()))
+
+    def iter_statements(self):
+        """Parse top-level statements one at a time (lets callers run them without building the whole program)"""
+        while self.token_type != TokenType.EOF:
             self.skip_newlines() 
             
-            if self.current_token.type == TokenType.EOF:
+            if self.token_type == TokenType.EOF:
                 break
                 
             stmt = self.statement()
-            statements.append(stmt)
             
-            while self.current_token.type in (TokenType.SEMICOLON, TokenType.COMMA, TokenType.NEWLINE):
-                self.current_token = self.lexer.get_next_token()
-        
-        return BlockNode(statements)
+            while self.token_type in (TokenType.SEMICOLON, TokenType.COMMA, TokenType.NEWLINE):
+                self.advance()
 
-    def parse_array(self):
-        """Parse array literal"""
-        self.eat(TokenType.LBRACKET)
-        
-        elements = []
-        
-        # empty array
-        if self.current_token.type == TokenType.RBRACKET:
-            self.eat(TokenType.RBRACKET)
-            return ArrayNode(elements)
-        
-        # Parse first element
-        elements.append(self.expression())
-        
-        # Parse remaining elements
-        while self.current_token.type == TokenType.COMMA:
-            self.eat(TokenType.COMMA)
-            elements.append(self.expression())
-        
-        self.eat(TokenType.RBRACKET)
-        return ArrayNode(elements)
-
-    def parse_postfix(self, base_expr):
-        """Parse postfix operations like indexing [0] and method calls .method()"""
-        while True:
-            if self.current_token.type == TokenType.LBRACKET:
-                # Array indexing (arr[index])
-                self.eat(TokenType.LBRACKET)
-                index = self.expression()
-                self.eat(TokenType.RBRACKET)
-                base_expr = IndexNode(base_expr, index)
-            
-            elif self.current_token.type == TokenType.DOT:
-                # Method call (arr.method(args))
-                self.eat(TokenType.DOT)
-                
-                if self.current_token.type != TokenType.IDENTIFIER:
-                    raise Exception("Expected method name after '.'")
-                
-                method_name = self.current_token.value
-                self.eat(TokenType.IDENTIFIER)
-                
-                if self.current_token.type == TokenType.LPAREN:
-                    # Method call with parentheses
-                    self.eat(TokenType.LPAREN)
-                    arguments = self.parse_arguments()
-                    self.eat(TokenType.RPAREN)
-                    base_expr = MethodCallNode(base_expr, method_name, arguments)
-                else:
-                    # access (treat as method call with no args)
-                    base_expr = MethodCallNode(base_expr, method_name, [])
-            else:
-                break
-        
-        return base_expr
+            yield stmt
 
     def parse_function_def(self):
         """Parse function definition"""
         self.eat(TokenType.FUNCTION)
         
-        if self.current_token.type != TokenType.IDENTIFIER:
+        if self.token_type != TokenType.IDENTIFIER:
             raise Exception("Expected function name")
         
-        function_name = self.current_token.value
+        function_name = self.token_value
         self.eat(TokenType.IDENTIFIER)
         
         # Parse parameters
         self.eat(TokenType.LPAREN)
         parameters = []
         
-        if self.current_token.type != TokenType.RPAREN:
+        if self.token_type != TokenType.RPAREN:
             # first parameter
-            if self.current_token.type != TokenType.IDENTIFIER:
+            if self.token_type != TokenType.IDENTIFIER:
                 raise Exception("Expected parameter name")
-            parameters.append(self.current_token.value)
+            parameters.append(self.token_value)
             self.eat(TokenType.IDENTIFIER)
             
             # remaining parameters
-            while self.current_token.type == TokenType.COMMA:
+            while self.token_type == TokenType.COMMA:
                 self.eat(TokenType.COMMA)
-                if self.current_token.type != TokenType.IDENTIFIER:
+                if self.token_type != TokenType.IDENTIFIER:
                     raise Exception("Expected parameter name")
-                parameters.append(self.current_token.value)
+                parameters.append(self.token_value)
                 self.eat(TokenType.IDENTIFIER)
         
         self.eat(TokenType.RPAREN)
@@ -389,7 +564,7 @@ class Parser:
         """Parse return statement"""
         self.eat(TokenType.RETURN)
         
-        if self.current_token.type in (TokenType.NEWLINE, TokenType.SEMICOLON, TokenType.RBRACE, TokenType.EOF):
+        if self.token_type in (TokenType.NEWLINE, TokenType.SEMICOLON, TokenType.RBRACE, TokenType.EOF):
             return ReturnNode(None)
         else:
             value = self.expression()
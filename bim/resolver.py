@@ -0,0 +1,99 @@
+from bim.ast_nodes import *
+
+#work item that closes the scope of a for loop variable
+LEAVE_LOOP = object()
+
+def child_nodes(node):
+    """Every AST node directly below node"""
+    for field in type(node).__slots__:
+        value = getattr(node, field, None)
+        if isinstance(value, ASTNode):
+            yield value
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, ASTNode):
+                    yield item
+                elif isinstance(item, tuple):
+                    yield from item
+
+def assigned_names(body):
+    """Names assigned anywhere in a function body, in order, without looking into nested functions"""
+    names = {}
+    work = [body]
+    while work:
+        node = work.pop()
+        if type(node) is AssignmentNode:
+            names[node.variable_name] = None
+        elif type(node) is FunctionDefNode:
+            continue
+        work.extend(reversed(list(child_nodes(node))))
+    return list(names)
+
+#assigns variables to frame slots before a program runs
+class Resolver:
+    """Resolves every variable reference to a slot in the current call's frame or to a global.
+
+    A function's frame has a slot for each parameter, each variable the function assigns and each for loop
+    variable; names it only reads are globals. Top-level code keeps its variables in the globals table and
+    only uses frame slots for loop variables. A for loop variable is scoped to its loop: it gets its own slot
+    and after the loop the name means the outer variable again.
+    """
+    def resolve_program(self, node):
+        """Annotate a program (or a single top-level statement); returns the names of the top-level frame's slots"""
+        slot_names = []
+        self.resolve_body(node, {}, slot_names)
+        return slot_names
+
+    def resolve_function(self, node):
+        """Annotate a function definition; parameters take the first slots of its frame"""
+        slot_names = list(node.parameters)
+        local_slots = {name: slot for slot, name in enumerate(node.parameters)}
+        for name in assigned_names(node.body):
+            if name not in local_slots:
+                local_slots[name] = len(slot_names)
+                slot_names.append(name)
+        self.resolve_body(node.body, local_slots, slot_names)
+        node.slot_names = slot_names
+
+    def resolve_body(self, body, local_slots, slot_names):
+        """Resolve one function body (or the top level) without recursion; nested functions are resolved after it"""
+        #innermost scope last: the function's variables, then one scope per enclosing for loop
+        scopes = [local_slots]
+        functions = []
+        work = [body]
+        while work:
+            node = work.pop()
+            if node is LEAVE_LOOP:
+                scopes.pop()
+                continue
+            node_type = type(node)
+            if node_type is tuple:
+                #(loop variable, slot) when the loop body is entered
+                scopes.append({node[0]: node[1]})
+            elif node_type is VariableNode:
+                node.slot = self.lookup(scopes, node.name)
+            elif node_type is AssignmentNode:
+                node.slot = self.lookup(scopes, node.variable_name)
+                work.append(node.value)
+            elif node_type is ForNode:
+                node.slot = len(slot_names)
+                slot_names.append(node.variable)
+                work.append(LEAVE_LOOP)
+                work.append(node.body)
+                work.append((node.variable, node.slot))
+                work.append(node.iterable)
+            elif node_type is FunctionDefNode:
+                functions.append(node)
+            else:
+                work.extend(child_nodes(node))
+
+        for function in functions:
+            self.resolve_function(function)
+
+    def lookup(self, scopes, name):
+        """Slot of the innermost variable called name, or None for a global"""
+        for scope in reversed(scopes):
+            slot = scope.get(name)
+            if slot is not None:
+                return slot
+        return None
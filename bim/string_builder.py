@@ -0,0 +1,32 @@
+class StringBuilder:
+    """Mutable string built by appending pieces, so building a string of n characters costs O(n).
+
+    s = s + piece copies s every time; append() keeps the pieces in a list and to_string() joins them once.
+    The joined string is kept as the only piece, so asking for it again between appends costs nothing.
+    """
+    __slots__ = ('parts', 'size')
+
+    def __init__(self, initial=""):
+        self.parts = [initial] if initial else []
+        self.size = len(initial)
+
+    def append(self, value):
+        """Add str(value) to the end, like + with a string"""
+        piece = str(value)
+        self.parts.append(piece)
+        self.size += len(piece)
+
+    def to_string(self):
+        parts = self.parts
+        if len(parts) > 1:
+            parts[:] = [''.join(parts)]
+        return parts[0] if parts else ""
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return f"StringBuilder({self.to_string()!r})"
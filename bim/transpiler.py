@@ -0,0 +1,413 @@
+import functools
+import math
+from bim.exceptions import *
+from bim.ast_nodes import *
+from bim.interpreter import Interpreter, iterate, contains
+from bim.containers import build_map
+from bim.resolver import Resolver, child_nodes
+
+#functions are transpiled on this call, so functions that run once do not pay for compile()
+HOT_FUNCTION_CALLS = 2
+
+#comparison operator code -> Python operator
+PYTHON_COMPARISONS = {
+    OP_EQUAL: '==',
+    OP_NOT_EQUAL: '!=',
+    OP_LESS_THAN: '<',
+    OP_GREATER_THAN: '>',
+    OP_LESS_EQUAL: '<=',
+    OP_GREATER_EQUAL: '>=',
+}
+
+#arithmetic operator code -> (Python operator, helper with the full bim semantics)
+PYTHON_ARITHMETIC = {
+    OP_PLUS: ('+', '_add'),
+    OP_MINUS: ('-', '_sub'),
+    OP_MULTIPLY: ('*', '_mul'),
+    OP_DIVIDE: ('/', '_div'),
+}
+
+class Unsupported(Exception):
+    """A function uses something the Python tier cannot translate"""
+    pass
+
+class TranspiledFunction:
+    """A bim function compiled to a Python function"""
+    __slots__ = ('name', 'source', 'function', 'builtins_used')
+
+    def __init__(self, name, source, function, builtins_used):
+        self.name = name
+        self.source = source
+        self.function = function
+        self.builtins_used = builtins_used
+
+    def is_valid(self, user_functions):
+        """The translation calls builtins directly, so it is only used while no user function shadows them"""
+        for name in self.builtins_used:
+            if name in user_functions:
+                return False
+        return True
+
+class FunctionGenerator:
+    """Generates the Python source for one function definition"""
+    def __init__(self, node, builtin_names):
+        self.node = node
+        self.builtin_names = builtin_names
+        self.lines = []
+        self.consts = []
+        self.builtins_used = set()
+        #frame slot -> Python local; names used by more than one slot get the slot number too
+        slot_names = node.slot_names
+        self.locals = [f"v_{name}" if slot_names.count(name) == 1 else f"v_{name}_{slot}"
+                       for slot, name in enumerate(slot_names)]
+        #slots with a value on every path to the current statement; reading any other slot is unsupported
+        self.assigned = set(range(len(node.parameters)))
+        self.loop_depth = 0
+
+    def generate(self):
+        """Return the source of the Python function"""
+        parameters = ', '.join(self.locals[:len(self.node.parameters)])
+        self.lines.append(f"def f_{self.node.name}({parameters}):")
+        self.block(self.node.body, 1)
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, depth, line):
+        self.lines.append('    ' * depth + line)
+
+    def block(self, node, depth):
+        """Emit a statement (or block of statements) as an indented suite"""
+        start = len(self.lines)
+        self.statement(node, depth)
+        if len(self.lines) == start:
+            self.emit(depth, 'pass')
+
+    def statement(self, node, depth):
+        node_type = type(node)
+        if node_type is BlockNode:
+            for statement in node.statements:
+                self.statement(statement, depth)
+        elif node_type is AssignmentNode:
+            value = self.expression(node.value)[0]
+            self.emit(depth, f"{self.locals[node.slot]} = {value}")
+            self.assigned.add(node.slot)
+        elif node_type is IndexAssignmentNode:
+            array = self.expression(node.array)[0]
+            index = self.expression(node.index)[0]
+            value = self.expression(node.value)[0]
+            self.emit(depth, f"_assign_index({array}, {index}, {value})")
+        elif node_type is IfNode:
+            self.if_statement(node, depth)
+        elif node_type is WhileNode:
+            entry = set(self.assigned)
+            #a called function breaking out of the condition ends the loop, like in the tree walker
+            guarded = self.calls_user_function(node.condition)
+            if guarded:
+                self.emit(depth, "try:")
+                depth += 1
+            self.emit(depth, f"while {self.condition(node.condition)}:")
+            self.loop_body(node.body, depth + 1)
+            if guarded:
+                self.emit(depth - 1, "except _Break:")
+                self.emit(depth, "pass")
+            #the body may not run
+            self.assigned = entry
+        elif node_type is ForNode:
+            entry = set(self.assigned)
+            iterable = self.expression(node.iterable)[0]
+            self.emit(depth, f"for {self.locals[node.slot]} in _iter({iterable}):")
+            self.assigned.add(node.slot)
+            self.loop_body(node.body, depth + 1)
+            self.assigned = entry
+        elif node_type is BreakNode or node_type is ContinueNode:
+            if self.loop_depth == 0:
+                raise Unsupported("break/continue outside a loop")
+            self.emit(depth, 'break' if node_type is BreakNode else 'continue')
+        elif node_type is ReturnNode:
+            value = self.expression(node.value)[0] if node.value is not None else 'None'
+            self.emit(depth, f"return {value}")
+        elif node_type is FunctionDefNode:
+            raise Unsupported("nested function definition")
+        else:
+            self.emit(depth, self.expression(node)[0])
+
+    def loop_body(self, body, depth):
+        self.loop_depth += 1
+        if self.calls_user_function(body):
+            #break/continue in a called function unwind into this loop as exceptions
+            self.emit(depth, "try:")
+            self.block(body, depth + 1)
+            self.emit(depth, "except _Continue:")
+            self.emit(depth + 1, "continue")
+            self.emit(depth, "except _Break:")
+            self.emit(depth + 1, "break")
+        else:
+            self.block(body, depth)
+        self.loop_depth -= 1
+
+    def calls_user_function(self, node):
+        """Whether node calls a function that is not a builtin"""
+        work = [node]
+        while work:
+            node = work.pop()
+            if type(node) is FunctionCallNode and node.function_name not in self.builtin_names:
+                return True
+            work.extend(child_nodes(node))
+        return False
+
+    def if_statement(self, node, depth):
+        entry = self.assigned
+        branches = [(node.condition, node.if_body)] + list(node.elif_clauses)
+        #names assigned on every path through the if
+        outcome = None
+        for i, (condition, body) in enumerate(branches):
+            self.assigned = set(entry)
+            keyword = 'if' if i == 0 else 'elif'
+            self.emit(depth, f"{keyword} {self.condition(condition)}:")
+            self.block(body, depth + 1)
+            outcome = self.assigned if outcome is None else outcome & self.assigned
+        self.assigned = set(entry)
+        if node.else_body:
+            self.emit(depth, 'else:')
+            self.block(node.else_body, depth + 1)
+        self.assigned = outcome & self.assigned
+
+    def condition(self, node):
+        if type(node) is LogicalNode:
+            #only truthiness matters, so Python's own and/or can combine the two conditions
+            return f"({self.condition(node.left)} {OPERATOR_SYMBOLS[node.op]} {self.condition(node.right)})"
+        code, _, is_bool = self.expression(node)
+        return code if is_bool else f"_truthy({code})"
+
+    def constant(self, value):
+        """Python expression for a literal value"""
+        if type(value) is float and not math.isfinite(value):
+            self.consts.append(value)
+            return f"_consts[{len(self.consts) - 1}]"
+        text = repr(value)
+        return f"({text})" if text.startswith('-') else text
+
+    def expression(self, node):
+        """Return (code, simple, is_bool); simple code can be repeated without evaluating anything twice"""
+        node_type = type(node)
+        if node_type is NumberNode or node_type is StringNode or node_type is BooleanNode:
+            return self.constant(node.value), True, node_type is BooleanNode
+
+        if node_type is VariableNode:
+            if node.slot is not None:
+                if node.slot not in self.assigned:
+                    #the tree walker would read the global until the local is assigned
+                    raise Unsupported(f"'{node.name}' may be read before it is assigned")
+                return self.locals[node.slot], True, False
+            return f"_load({node.name!r})", False, False
+
+        if node_type is BinaryOpNode:
+            left, left_simple, _ = self.expression(node.left)
+            right, right_simple, _ = self.expression(node.right)
+            if node.op in PYTHON_COMPARISONS:
+                return f"({left} {PYTHON_COMPARISONS[node.op]} {right})", False, True
+            if node.op == OP_IN:
+                return f"_contains({left}, {right})", False, True
+            symbol, helper = PYTHON_ARITHMETIC[node.op]
+            if node.op == OP_PLUS and type(node.right) is StringNode:
+                return f"(str({left}) + {right})", False, False
+            if not (left_simple and right_simple) or StringNode in (type(node.left), type(node.right)) \
+                    or BooleanNode in (type(node.left), type(node.right)):
+                return f"{helper}({left}, {right})", False, False
+            #inline float fast path, the helper handles strings and errors
+            checks = [f"type({operand}) is float" for operand, operand_node in ((left, node.left), (right, node.right))
+                      if type(operand_node) is not NumberNode]
+            if node.op == OP_DIVIDE and not (type(node.right) is NumberNode and node.right.value != 0):
+                checks.append(f"{right} != 0")
+            if not checks:
+                return f"({left} {symbol} {right})", False, False
+            return f"({left} {symbol} {right} if {' and '.join(checks)} else {helper}({left}, {right}))", False, False
+
+        if node_type is UnaryOpNode:
+            if node.op == OP_NOT:
+                return f"(not {self.condition(node.operand)})", False, True
+            operand = self.expression(node.operand)[0]
+            return f"({'-' if node.op == OP_MINUS else '+'}{operand})", False, False
+
+        if node_type is LogicalNode:
+            left, left_simple, left_bool = self.expression(node.left)
+            right, _, right_bool = self.expression(node.right)
+            if left_bool and right_bool:
+                return f"({left} {OPERATOR_SYMBOLS[node.op]} {right})", False, True
+            #the deciding operand is the result, so the left value cannot go through _truthy() alone
+            if left_simple:
+                if node.op == OP_AND:
+                    return f"({right} if {self.condition(node.left)} else {left})", False, False
+                return f"({left} if {self.condition(node.left)} else {right})", False, False
+            helper = '_and' if node.op == OP_AND else '_or'
+            return f"{helper}({left}, lambda: {right})", False, False
+
+        if node_type is ArrayNode:
+            if node.constant is not None:
+                return f"[{', '.join(self.constant(value) for value in node.constant)}]", False, False
+            return f"[{', '.join(self.expression(element)[0] for element in node.elements)}]", False, False
+
+        if node_type is FStringNode:
+            parts = ', '.join(self.constant(part.value) if type(part) is StringNode else f"str({self.expression(part)[0]})"
+                              for part in node.parts)
+            return f"''.join(({parts},))", False, False
+
+        if node_type is MapNode:
+            return f"_map([{', '.join(self.expression(item)[0] for item in node.items)}])", False, False
+
+        if node_type is IndexNode:
+            array = self.expression(node.array)[0]
+            index = self.expression(node.index)[0]
+            return f"_index({array}, {index})", False, False
+
+        if node_type is MethodCallNode:
+            object_code = self.expression(node.object_expr)[0]
+            arguments = ', '.join(self.expression(argument)[0] for argument in node.arguments)
+            return f"_method({object_code}, {node.method_name!r}, [{arguments}])", False, False
+
+        if node_type is FunctionCallNode:
+            name = node.function_name
+            arguments = ', '.join(self.expression(argument)[0] for argument in node.arguments)
+            if name == self.node.name:
+                if len(node.arguments) != len(self.node.parameters):
+                    raise Unsupported(f"call to '{name}' with the wrong number of arguments")
+                return f"f_{name}({arguments})", False, False
+            if name in self.builtin_names:
+                self.builtins_used.add(name)
+                return f"_b_{name}([{arguments}])", False, False
+            #other user functions go through the interpreter, checked before the arguments are evaluated
+            return f"_call(_check({name!r}, {len(node.arguments)}), [{arguments}])", False, False
+
+        raise Unsupported(f"{node_type.__name__}")
+
+#translates function definitions to Python
+class Transpiler:
+    """Translates FunctionDefNodes into Python functions that keep bim semantics"""
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def namespace(self):
+        """Globals for generated code: helpers that reuse the interpreter's semantics"""
+        interpreter = self.interpreter
+
+        def check(name, argument_count):
+            interpreter.check_call(name, argument_count)
+            return name
+
+        namespace = {
+            '_add': functools.partial(interpreter.binary_operation, OP_PLUS),
+            '_sub': functools.partial(interpreter.binary_operation, OP_MINUS),
+            '_mul': functools.partial(interpreter.binary_operation, OP_MULTIPLY),
+            '_div': functools.partial(interpreter.binary_operation, OP_DIVIDE),
+            '_truthy': interpreter.is_truthy,
+            '_and': lambda left, right: right() if interpreter.is_truthy(left) else left,
+            '_or': lambda left, right: left if interpreter.is_truthy(left) else right(),
+            '_index': interpreter.index_value,
+            '_map': build_map,
+            '_contains': contains,
+            '_assign_index': interpreter.assign_index,
+            '_method': interpreter.call_method,
+            '_iter': iterate,
+            '_load': interpreter.load_global,
+            '_check': check,
+            '_call': interpreter.call_function,
+            '_Break': BreakException,
+            '_Continue': ContinueException,
+        }
+        for name, builtin in interpreter.builtin_functions.items():
+            namespace[f'_b_{name}'] = builtin
+        return namespace
+
+    def generate(self, node):
+        """Return (source, consts, builtins used) for a FunctionDefNode; raises Unsupported"""
+        generator = FunctionGenerator(node, self.interpreter.builtin_functions)
+        try:
+            source = generator.generate()
+        except RecursionError:
+            raise Unsupported("expression nested too deeply") from None
+        return source, generator.consts, generator.builtins_used
+
+    def transpile(self, node):
+        """Compile a FunctionDefNode to a TranspiledFunction; raises Unsupported"""
+        source, consts, builtins_used = self.generate(node)
+        namespace = self.namespace()
+        namespace['_consts'] = consts
+        try:
+            exec(compile(source, f"<bim function {node.name}>", 'exec'), namespace)
+        except (SyntaxError, RecursionError, MemoryError) as e:
+            raise Unsupported(f"compile() failed: {e}") from None
+        return TranspiledFunction(node.name, source, namespace[f'f_{node.name}'], builtins_used)
+
+    def emit_program(self, node):
+        """Generated Python for every function defined in a program, as lines"""
+        Resolver().resolve_program(node)
+        lines = []
+        for function in iter_function_defs(node):
+            if function.memo:
+                lines.append(f"# {function.name}({', '.join(function.parameters)}): not transpiled, memoized")
+                lines.append("")
+                continue
+            try:
+                source = self.generate(function)[0]
+                lines.append(f"# {function.name}({', '.join(function.parameters)})")
+                lines.extend(source.splitlines())
+            except Unsupported as e:
+                lines.append(f"# {function.name}({', '.join(function.parameters)}): not transpiled, {e}")
+            lines.append("")
+        return lines
+
+def iter_function_defs(node):
+    """Every FunctionDefNode reachable through statement blocks"""
+    if isinstance(node, FunctionDefNode):
+        yield node
+        yield from iter_function_defs(node.body)
+    elif isinstance(node, BlockNode):
+        for statement in node.statements:
+            yield from iter_function_defs(statement)
+    elif isinstance(node, IfNode):
+        yield from iter_function_defs(node.if_body)
+        for _, body in node.elif_clauses:
+            yield from iter_function_defs(body)
+        if node.else_body:
+            yield from iter_function_defs(node.else_body)
+    elif isinstance(node, (WhileNode, ForNode)):
+        yield from iter_function_defs(node.body)
+
+#tree walker with a Python tier for hot functions
+class TranspilingInterpreter(Interpreter):
+    """Tree walker that runs hot user functions as transpiled Python, falling back to visit() for the rest"""
+    def __init__(self):
+        super().__init__()
+        self.transpiler = Transpiler(self)
+        #(name, body) -> TranspiledFunction, or the reason it could not be transpiled
+        self.transpiled = {}
+
+    def visit_FunctionDefNode(self, node):
+        super().visit_FunctionDefNode(node)
+        self.user_functions[node.name]['node'] = node
+        self.user_functions[node.name]['calls'] = 0
+        return None
+
+    def _call_user_function(self, function_name, arg_values):
+        func_info = self.user_functions[function_name]
+        if func_info['memo'] is not None:
+            #memoized functions stay on the tree walker, whose calls (recursive ones included) go through the cache
+            return super()._call_user_function(function_name, arg_values)
+        func_info['calls'] += 1
+        if func_info['calls'] >= HOT_FUNCTION_CALLS:
+            transpiled = self.transpiled_function(func_info['node'])
+            if transpiled is not None and transpiled.is_valid(self.user_functions):
+                return transpiled.function(*arg_values)
+        #run directly rather than through super(), which would add a Python frame to every call
+        return self.run_user_function(func_info, arg_values)
+
+    def transpiled_function(self, node):
+        """TranspiledFunction for a definition, or None if it falls back to the tree walker"""
+        key = (node.name, node.body)
+        result = self.transpiled.get(key)
+        if result is None:
+            try:
+                result = self.transpiler.transpile(node)
+            except Unsupported as e:
+                result = str(e)
+            self.transpiled[key] = result
+        return result if isinstance(result, TranspiledFunction) else None
@@ -0,0 +1,237 @@
+import math
+import operator
+from array import array
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    #pure-Python fallback: array('d') storage, element-wise work done by map() over operator functions
+    numpy = None
+
+def is_number(value):
+    """Whether value can be stored in a typed array (true/false are not numbers here)"""
+    return type(value) is float or type(value) is int
+
+def check_number(value):
+    """value as a float, or the error for storing something else in a typed array"""
+    if type(value) is not float and type(value) is not int:
+        raise Exception("Typed arrays only hold numbers")
+    return float(value)
+
+class NumberArray:
+    """Array of 64-bit floats whose +, -, * and / work element-wise in one host call.
+
+    Stored in a NumPy array when NumPy is installed, with spare capacity so push() is amortized O(1),
+    and in an array('d') otherwise. Elements read from it are Python floats.
+    """
+    __slots__ = ('buffer', 'size')
+
+    def __init__(self, buffer, size=None):
+        self.buffer = buffer
+        self.size = len(buffer) if size is None else size
+
+    @classmethod
+    def zeros(cls, length):
+        if numpy is not None:
+            return cls(numpy.zeros(length))
+        return cls(array('d', bytes(8 * length)))
+
+    @classmethod
+    def full(cls, length, value):
+        if numpy is not None:
+            return cls(numpy.full(length, value, dtype=float))
+        return cls(array('d', [value]) * length)
+
+    @classmethod
+    def from_values(cls, values):
+        """Typed copy of an array, range or typed array of numbers"""
+        if isinstance(values, NumberArray):
+            return cls(values.values().copy() if numpy is not None else array('d', values.buffer))
+        if not all(map(is_number, values)):
+            raise Exception("Typed arrays only hold numbers")
+        if numpy is not None:
+            return cls(numpy.array(values, dtype=float))
+        return cls(array('d', values))
+
+    def values(self):
+        """The elements as the backend's array (a view for NumPy)"""
+        if numpy is not None:
+            return self.buffer[:self.size]
+        return self.buffer
+
+    def tolist(self):
+        return self.values().tolist()
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return str(self.tolist())
+
+    def __repr__(self):
+        return f"NumberArray({self.tolist()})"
+
+    def __iter__(self):
+        if numpy is None:
+            return iter(self.buffer)
+        return self.iterate_by_index()
+
+    def iterate_by_index(self):
+        #like list iteration: elements pushed during the loop are visited
+        index = 0
+        while index < self.size:
+            yield float(self.buffer[index])
+            index += 1
+
+    def index(self, value):
+        """Position of the first element equal to value; ValueError when there is none"""
+        if is_number(value):
+            if numpy is None:
+                return self.buffer.index(value)
+            found = numpy.flatnonzero(self.values() == value)
+            if len(found):
+                return int(found[0])
+        raise ValueError(value)
+
+    def __contains__(self, value):
+        try:
+            self.index(value)
+        except ValueError:
+            return False
+        return True
+
+    def position(self, index):
+        """index (negative counts from the end) as a position in the buffer; IndexError when out of range"""
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        return index
+
+    def __getitem__(self, index):
+        return float(self.buffer[self.position(index)])
+
+    def __setitem__(self, index, value):
+        self.buffer[self.position(index)] = check_number(value)
+
+    def reserve(self, size):
+        """Grow the NumPy buffer to hold at least size elements"""
+        if size > len(self.buffer):
+            buffer = numpy.empty(max(size, 2 * len(self.buffer), 8))
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+
+    def append(self, value):
+        value = check_number(value)
+        if numpy is None:
+            self.buffer.append(value)
+        else:
+            self.reserve(self.size + 1)
+            self.buffer[self.size] = value
+        self.size += 1
+
+    def pop(self, index=-1):
+        index = self.position(index)
+        if numpy is None:
+            value = self.buffer.pop(index)
+        else:
+            value = float(self.buffer[index])
+            self.buffer[index:self.size - 1] = self.buffer[index + 1:self.size]
+        self.size -= 1
+        return value
+
+    def insert(self, index, value):
+        """Insert before index, clamped to the array like list.insert"""
+        value = check_number(value)
+        if numpy is None:
+            self.buffer.insert(index, value)
+        else:
+            index = min(max(index + self.size, 0) if index < 0 else index, self.size)
+            self.reserve(self.size + 1)
+            self.buffer[index + 1:self.size + 1] = self.buffer[index:self.size]
+            self.buffer[index] = value
+        self.size += 1
+
+    def operand(self, other):
+        """The other operand of an element-wise operation: a float or the values of a typed array as long as this one"""
+        if isinstance(other, NumberArray):
+            if other.size != self.size:
+                raise Exception(f"Typed arrays have different lengths ({self.size} and {other.size})")
+            return other.values()
+        if type(other) is float or type(other) is int:
+            return float(other)
+        raise Exception(f"Cannot combine a typed array with {type(other).__name__}")
+
+    def elementwise(self, function, other, reverse=False):
+        """New typed array with function applied to each element and the matching element (or number) of other"""
+        left = self.values()
+        right = self.operand(other)
+        if reverse:
+            left, right = right, left
+        if numpy is not None:
+            return NumberArray(function(left, right))
+        if type(left) is float:
+            left = repeat(left)
+        elif type(right) is float:
+            right = repeat(right)
+        return NumberArray(array('d', map(function, left, right)))
+
+    def has_zero(self):
+        if numpy is not None:
+            return bool((self.values() == 0).any())
+        return 0.0 in self.buffer
+
+    def __add__(self, other):
+        return self.elementwise(operator.add, other)
+
+    def __radd__(self, other):
+        return self.elementwise(operator.add, other, reverse=True)
+
+    def __sub__(self, other):
+        return self.elementwise(operator.sub, other)
+
+    def __rsub__(self, other):
+        return self.elementwise(operator.sub, other, reverse=True)
+
+    def __mul__(self, other):
+        return self.elementwise(operator.mul, other)
+
+    def __rmul__(self, other):
+        return self.elementwise(operator.mul, other, reverse=True)
+
+    def __truediv__(self, other):
+        if other.has_zero() if isinstance(other, NumberArray) else other == 0:
+            raise Exception("Division by zero!")
+        return self.elementwise(operator.truediv, other)
+
+    def __rtruediv__(self, other):
+        if self.has_zero():
+            raise Exception("Division by zero!")
+        return self.elementwise(operator.truediv, other, reverse=True)
+
+    def __neg__(self):
+        if numpy is not None:
+            return NumberArray(-self.values())
+        return NumberArray(array('d', map(operator.neg, self.buffer)))
+
+    def __pos__(self):
+        return NumberArray.from_values(self)
+
+    def sum(self):
+        if numpy is not None:
+            return float(self.values().sum())
+        return math.fsum(self.buffer)
+
+    def mean(self):
+        if self.size == 0:
+            raise Exception("mean() of an empty typed array")
+        return self.sum() / self.size
+
+    def dot(self, other):
+        if not isinstance(other, NumberArray):
+            raise Exception("dot() takes a typed array")
+        other_values = self.operand(other)
+        if numpy is not None:
+            return float(numpy.dot(self.values(), other_values))
+        return math.fsum(map(operator.mul, self.buffer, other_values))
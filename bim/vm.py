@@ -0,0 +1,424 @@
+from bim.exceptions import *
+from bim.ast_nodes import *
+from bim.bytecode import *
+from bim.compiler import Compiler
+from bim.interpreter import Interpreter, COMPARISONS, UNSET, new_frame, iterate
+from bim.memo import MISSING
+from bim.containers import build_map
+
+#default limit on nested calls; frames live on the heap, so the limit only stops runaway recursion
+MAX_CALL_DEPTH = 1000000
+
+#comparison functions indexed by operator code
+COMPARE_FUNCTIONS = [COMPARISONS.get(op) for op in range(len(OPERATOR_SYMBOLS))]
+
+#FOR_ITER sentinel for an exhausted iterator
+EXHAUSTED = object()
+
+CONST_OPERAND_OPCODES = (LOAD_CONST, LOAD_FUNCTION, CALL_METHOD, COPY_CONST_ARRAY, MAKE_FUNCTION,
+                         BINARY_ADD_CONST, BINARY_SUBTRACT_CONST, INCREMENT_NAME, INCREMENT_FAST)
+NAME_OPERAND_OPCODES = (LOAD_NAME, STORE_NAME)
+
+def store_results(memo_calls, depth, value):
+    """Cache the value returned at a call depth for each memoized call waiting on it"""
+    while memo_calls and memo_calls[-1][0] == depth:
+        _, memo, key = memo_calls.pop()
+        memo.store(key, value)
+
+def decode(code_object):
+    """(opcode, operand) list with constants, names and comparison functions looked up once"""
+    if code_object.decoded is None:
+        decoded = []
+        for opcode, arg in code_object.instructions:
+            if opcode in CONST_OPERAND_OPCODES:
+                arg = code_object.consts[arg]
+            elif opcode in NAME_OPERAND_OPCODES:
+                arg = code_object.names[arg]
+            elif opcode == COMPARE_OP:
+                arg = COMPARE_FUNCTIONS[arg]
+            elif opcode == COMPARE_JUMP_IF_FALSE:
+                arg = (COMPARE_FUNCTIONS[arg & ((1 << COMPARE_SHIFT) - 1)], arg >> COMPARE_SHIFT)
+            decoded.append((opcode, arg))
+        code_object.decoded = decoded
+    return code_object.decoded
+
+#runs compiled bytecode
+class VirtualMachine(Interpreter):
+    """Stack-based VM for bytecode from bim.compiler.
+
+    Values live on one stack shared by all frames; a call pushes (caller code, return offset, stack base,
+    caller's local variable slots) on the frame stack instead of recursing, so recursion depth is limited by
+    max_depth and memory rather than by Python's recursion limit. A tail call (return f(...)) replaces the
+    current frame instead of pushing one. Builtins, methods and error messages are shared with Interpreter.
+    """
+    def __init__(self, max_depth=MAX_CALL_DEPTH):
+        super().__init__()
+        self.compiler = Compiler()
+        self.max_depth = max_depth
+
+    def run(self, node):
+        """Compile and execute a program (or a single top-level statement)"""
+        return self.execute(self.compiler.compile_program(node))
+
+    def run_user_function(self, func_info, arg_values):
+        """Run a function's code object for a call from host code (such as a builtin taking a function name)"""
+        return self.execute(func_info['code'], arg_values)
+
+    def execute(self, program, arg_values=None):
+        """Run a top-level code object, or with arg_values, a function's code object and return its result"""
+        variables = self.variables
+        user_functions = self.user_functions
+        builtin_functions = self.builtin_functions
+        is_truthy = self.is_truthy
+        binary_operation = self.binary_operation
+        max_depth = self.max_depth
+        #whether a return from the first frame ends this run with the value
+        returns_value = arg_values is not None
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        frames = []
+        #(call depth, MemoCache, key) for memoized calls that have not returned yet
+        memo_calls = []
+        frame = new_frame(arg_values or (), len(program.slot_names))
+        frame_code = program
+        instructions = decode(program)
+        pc = 0
+
+        while True:
+            try:
+                while True:
+                    op, arg = instructions[pc]
+                    pc += 1
+
+                    if op == LOAD_FAST:
+                        value = frame[arg]
+                        if value is UNSET:
+                            value = self.load_global(frame_code.slot_names[arg])
+                        push(value)
+
+                    elif op == STORE_FAST:
+                        frame[arg] = pop()
+
+                    elif op == LOAD_NAME:
+                        try:
+                            push(variables[arg])
+                        except KeyError:
+                            raise Exception(f"Undefined variable: {arg}") from None
+
+                    elif op == STORE_NAME:
+                        variables[arg] = pop()
+
+                    elif op == LOAD_CONST:
+                        push(arg)
+
+                    elif op == JUMP:
+                        pc = arg
+
+                    elif op == COMPARE_JUMP_IF_FALSE:
+                        compare, target = arg
+                        right_val = pop()
+                        if not compare(pop(), right_val):
+                            pc = target
+
+                    elif op == INCREMENT_FAST:
+                        slot, number = arg
+                        value = frame[slot]
+                        if value is UNSET:
+                            value = self.load_global(frame_code.slot_names[slot])
+                        if type(value) is float:
+                            frame[slot] = value + number
+                        elif isinstance(value, str):
+                            frame[slot] = value + str(number)
+                        else:
+                            frame[slot] = value + number
+
+                    elif op == INCREMENT_NAME:
+                        name, number = arg
+                        try:
+                            value = variables[name]
+                        except KeyError:
+                            raise Exception(f"Undefined variable: {name}") from None
+                        if type(value) is float:
+                            variables[name] = value + number
+                        elif isinstance(value, str):
+                            variables[name] = value + str(number)
+                        else:
+                            variables[name] = value + number
+
+                    elif op == BINARY_ADD:
+                        right_val = pop()
+                        left_val = stack[-1]
+                        if type(left_val) is float and type(right_val) is float:
+                            stack[-1] = left_val + right_val
+                        elif isinstance(left_val, str) or isinstance(right_val, str):
+                            stack[-1] = str(left_val) + str(right_val)
+                        else:
+                            stack[-1] = left_val + right_val
+
+                    elif op == BINARY_MULTIPLY:
+                        right_val = pop()
+                        left_val = stack[-1]
+                        if type(left_val) is float and type(right_val) is float:
+                            stack[-1] = left_val * right_val
+                        else:
+                            stack[-1] = binary_operation(OP_MULTIPLY, left_val, right_val)
+
+                    elif op == BINARY_ADD_CONST:
+                        left_val = stack[-1]
+                        if type(left_val) is float and type(arg) is float:
+                            stack[-1] = left_val + arg
+                        elif isinstance(left_val, str) or isinstance(arg, str):
+                            stack[-1] = str(left_val) + str(arg)
+                        else:
+                            stack[-1] = left_val + arg
+
+                    elif op == BINARY_SUBTRACT_CONST:
+                        left_val = stack[-1]
+                        if type(left_val) is float and type(arg) is float:
+                            stack[-1] = left_val - arg
+                        else:
+                            stack[-1] = binary_operation(OP_MINUS, left_val, arg)
+
+                    elif op == FOR_ITER:
+                        item = next(stack[-1], EXHAUSTED)
+                        if item is EXHAUSTED:
+                            pc = arg
+                        else:
+                            push(item)
+
+                    elif op == POP_JUMP_IF_FALSE:
+                        value = pop()
+                        if value is False or (value is not True and not is_truthy(value)):
+                            pc = arg
+
+                    elif op == POP_JUMP_IF_TRUE:
+                        value = pop()
+                        if value is True or (value is not False and is_truthy(value)):
+                            pc = arg
+
+                    elif op == BINARY_SUBTRACT:
+                        right_val = pop()
+                        left_val = stack[-1]
+                        if type(left_val) is float and type(right_val) is float:
+                            stack[-1] = left_val - right_val
+                        else:
+                            stack[-1] = binary_operation(OP_MINUS, left_val, right_val)
+
+                    elif op == BINARY_DIVIDE:
+                        right_val = pop()
+                        left_val = stack[-1]
+                        if type(left_val) is float and type(right_val) is float and right_val != 0:
+                            stack[-1] = left_val / right_val
+                        else:
+                            stack[-1] = binary_operation(OP_DIVIDE, left_val, right_val)
+
+                    elif op == COMPARE_OP:
+                        right_val = pop()
+                        stack[-1] = arg(stack[-1], right_val)
+
+                    elif op == CALL_METHOD:
+                        method_name, argument_count = arg
+                        base = len(stack) - argument_count
+                        arg_values = stack[base:]
+                        del stack[base:]
+                        stack[-1] = self.call_method(stack[-1], method_name, arg_values)
+
+                    elif op == POP_TOP:
+                        pop()
+
+                    elif op == BINARY_INDEX:
+                        index_val = pop()
+                        array_value = stack[-1]
+                        if type(array_value) is list and type(index_val) is float:
+                            try:
+                                stack[-1] = array_value[int(index_val)]
+                                continue
+                            except IndexError:
+                                pass
+                        stack[-1] = self.index_value(array_value, index_val)
+
+                    elif op == LOAD_FUNCTION:
+                        function_name, argument_count = arg
+                        function = user_functions.get(function_name)
+                        if function is None:
+                            function = builtin_functions.get(function_name)
+                        if function is None or (type(function) is dict and len(function['parameters']) != argument_count):
+                            self.check_call(function_name, argument_count)
+                        push(function)
+
+                    elif op == CALL_FUNCTION:
+                        base = len(stack) - arg
+                        function = stack[base - 1]
+                        if type(function) is dict:
+                            memo = function['memo']
+                            if memo is not None:
+                                key = memo.key(stack[base:])
+                                if key is not None:
+                                    value = memo.lookup(key)
+                                    if value is not MISSING:
+                                        del stack[base - 1:]
+                                        push(value)
+                                        continue
+                                    memo_calls.append((len(frames) + 1, memo, key))
+                            if len(frames) >= max_depth:
+                                raise Exception(f"maximum recursion depth exceeded ({max_depth} nested calls)")
+                            frames.append((frame_code, pc, base - 1, frame))
+                            frame = new_frame(stack[base:], function['frame_size'])
+                            del stack[base - 1:]
+                            frame_code = function['code']
+                            instructions = decode(frame_code)
+                            pc = 0
+                        else:
+                            arg_values = stack[base:]
+                            del stack[base - 1:]
+                            push(function(arg_values))
+
+                    elif op == TAIL_CALL:
+                        base = len(stack) - arg
+                        function = stack[base - 1]
+                        arg_values = stack[base:]
+                        del stack[base - 1:]
+                        if type(function) is dict:
+                            memo = function['memo']
+                            value = MISSING
+                            if memo is not None:
+                                key = memo.key(arg_values)
+                                if key is not None:
+                                    value = memo.lookup(key)
+                                    if value is MISSING:
+                                        #this call returns what the callee returns, so both results are stored then
+                                        memo_calls.append((len(frames), memo, key))
+                            if value is MISSING:
+                                #the callee returns straight to this call's caller, so the frame stack does not grow
+                                frame = new_frame(arg_values, function['frame_size'])
+                                frame_code = function['code']
+                                instructions = decode(frame_code)
+                                pc = 0
+                                continue
+                        else:
+                            value = function(arg_values)
+                        if memo_calls:
+                            store_results(memo_calls, len(frames), value)
+                        if not frames:
+                            #a function run by run_user_function returning
+                            return value
+                        frame_code, pc, base, frame = frames.pop()
+                        del stack[base:]
+                        instructions = decode(frame_code)
+                        push(value)
+
+                    elif op == RETURN_VALUE or op == RETURN_NONE:
+                        value = pop() if op == RETURN_VALUE else None
+                        if memo_calls:
+                            store_results(memo_calls, len(frames), value)
+                        if not frames:
+                            if returns_value:
+                                return value
+                            if op == RETURN_VALUE:
+                                #return outside a function fails like the tree walker's ReturnException
+                                raise ReturnException(value)
+                            return None
+                        frame_code, pc, base, frame = frames.pop()
+                        del stack[base:]
+                        instructions = decode(frame_code)
+                        push(value)
+
+                    elif op == STORE_INDEX:
+                        new_value = pop()
+                        index_val = pop()
+                        self.assign_index(pop(), index_val, new_value)
+
+                    elif op == BUILD_ARRAY:
+                        base = len(stack) - arg
+                        elements = stack[base:]
+                        del stack[base:]
+                        push(elements)
+
+                    elif op == BUILD_STRING:
+                        base = len(stack) - arg
+                        parts = stack[base:]
+                        del stack[base:]
+                        push(''.join(map(str, parts)))
+
+                    elif op == BUILD_MAP:
+                        base = len(stack) - 2 * arg
+                        items = stack[base:]
+                        del stack[base:]
+                        push(build_map(items))
+
+                    elif op == COPY_CONST_ARRAY:
+                        push(list(arg))
+
+                    elif op == UNARY_NEGATIVE:
+                        stack[-1] = -stack[-1]
+
+                    elif op == UNARY_POSITIVE:
+                        stack[-1] = +stack[-1]
+
+                    elif op == UNARY_NOT:
+                        value = stack[-1]
+                        stack[-1] = value is False or (value is not True and not is_truthy(value))
+
+                    elif op == JUMP_IF_FALSE_OR_POP:
+                        value = stack[-1]
+                        if value is False or (value is not True and not is_truthy(value)):
+                            pc = arg
+                        else:
+                            pop()
+
+                    elif op == JUMP_IF_TRUE_OR_POP:
+                        value = stack[-1]
+                        if value is True or (value is not False and is_truthy(value)):
+                            pc = arg
+                        else:
+                            pop()
+
+                    elif op == GET_ITER:
+                        stack[-1] = iterate(stack[-1])
+
+                    elif op == MAKE_FUNCTION:
+                        function_code = arg
+                        user_functions[function_code.name] = {
+                            'parameters': function_code.parameters,
+                            'code': function_code,
+                            'frame_size': len(function_code.slot_names),
+                            'purity': function_code.purity,
+                            'memo': None,
+                        }
+                        if function_code.memo:
+                            self.memoize_function(function_code.name)
+
+                    elif op == BREAK_OUT:
+                        raise BreakException()
+
+                    elif op == CONTINUE_OUT:
+                        raise ContinueException()
+
+                    elif op == BUILD_RANGE:
+                        base = len(stack) - arg
+                        bounds = stack[base:]
+                        del stack[base:]
+                        push(range(*(int(bound) for bound in bounds)))
+
+                    else:
+                        raise Exception(f"Unknown opcode {op}")
+
+            except (BreakException, ContinueException) as signal:
+                #break/continue outside a loop in its own code, here or in a function run for host code (such as
+                #an array method's callback): like the tree walker, leave calls until one was made inside a loop
+                is_continue = type(signal) is ContinueException
+                loop = frame_code.find_loop(pc - 1, is_continue)
+                while loop is None:
+                    if not frames:
+                        raise
+                    frame_code, pc, base, frame = frames.pop()
+                    del stack[base:]
+                    loop = frame_code.find_loop(pc - 1, is_continue)
+                while memo_calls and memo_calls[-1][0] > len(frames):
+                    memo_calls.pop()
+                frame_base = frames[-1][2] if frames else 0
+                del stack[frame_base + loop[4]:]
+                pc = loop[3] if is_continue else loop[2]
+                instructions = decode(frame_code)
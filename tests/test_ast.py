@@ -0,0 +1,51 @@
+"""Compact AST nodes: slots, operator codes and shared literals"""
+import pickle
+import pytest
+from bim import ast_nodes
+from bim.ast_nodes import ASTNode, BinaryOpNode, NumberNode, StringNode, OP_MULTIPLY
+from bim.bim_token import Token, TokenType
+from bim.interpreter import Interpreter
+from bim.lexer import Lexer
+from bim.parser import Parser
+
+NODE_CLASSES = [cls for cls in vars(ast_nodes).values() if isinstance(cls, type) and issubclass(cls, ASTNode)]
+
+SOURCE = 'x = 2 * 2\ny = "a"\nprint(x * 2, y + "a", [2, 2])\n'
+
+def parse(source, intern_constants=True):
+    return Parser(Lexer(source).tokenize(), intern_constants=intern_constants).parse_program()
+
+def literals(node, found):
+    """Collect every Number/String literal node reachable from node"""
+    if isinstance(node, (NumberNode, StringNode)):
+        found.append(node)
+    elif isinstance(node, ASTNode):
+        for slot in type(node).__mro__:
+            for name in getattr(slot, "__slots__", ()):
+                literals(getattr(node, name, None), found)
+    elif isinstance(node, (list, tuple)):
+        for item in node:
+            literals(item, found)
+    return found
+
+@pytest.mark.parametrize("cls", NODE_CLASSES, ids=lambda cls: cls.__name__)
+def test_nodes_have_slots(cls):
+    assert all("__dict__" not in vars(base) for base in cls.__mro__ if base is not object)
+
+def test_operator_code_and_token():
+    node = BinaryOpNode(NumberNode(1), Token(TokenType.MULTIPLY, "*"), NumberNode(2))
+    assert node.op == OP_MULTIPLY
+    assert (node.operator.type, node.operator.value) == (TokenType.MULTIPLY, "*")
+
+def test_literals_are_shared():
+    shared = literals(parse(SOURCE), [])
+    unshared = literals(parse(SOURCE, intern_constants=False), [])
+    assert len(unshared) == 7
+    assert len({id(node) for node in shared}) == 2
+    assert len({id(node) for node in unshared}) == 7
+
+@pytest.mark.parametrize("intern_constants", [True, False])
+def test_shared_and_pickled_trees_run_the_same(intern_constants, capsys):
+    ast = pickle.loads(pickle.dumps(parse(SOURCE, intern_constants)))
+    Interpreter().visit(ast)
+    assert capsys.readouterr().out == "8.0 aa [2.0, 2.0]\n"
@@ -0,0 +1,37 @@
+"""Compiled bytecode: serialization round trips and the disassembler"""
+import marshal
+import os
+import pytest
+from bim.bytecode import BYTECODE_MAGIC, PROGRAM_NAME, deserialize, disassemble, serialize
+from bim.compiler import Compiler
+from bim.lexer import Lexer
+from bim.parser import Parser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM_DIR = os.path.join(ROOT, "tests", "programs")
+PROGRAMS = sorted(name for name in os.listdir(PROGRAM_DIR) if name.endswith(".bim"))
+
+def compile_source(source):
+    return Compiler().compile_program(Parser(Lexer(source).tokenize()).parse_program())
+
+def read(name):
+    with open(os.path.join(PROGRAM_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_serialized_program_round_trips(program):
+    code = compile_source(read(program))
+    loaded = deserialize(serialize(code))
+    assert loaded.to_tuple() == code.to_tuple()
+    assert disassemble(loaded) == disassemble(code)
+
+def test_other_versions_are_not_loaded():
+    data = serialize(compile_source("print(1)\n"))
+    assert deserialize(b"XXXX" + data[len(BYTECODE_MAGIC):]) is None
+    assert deserialize(BYTECODE_MAGIC + marshal.dumps((-1, ()))) is None
+
+def test_disassembly_lists_functions():
+    lines = disassemble(compile_source("function add(a, b){\n    return a + b\n}\nprint(add(1, 2))\n"))
+    assert lines[0] == f"Disassembly of {PROGRAM_NAME}:"
+    assert "Disassembly of add(a, b):" in lines
+    assert any("(function add)" in line for line in lines)
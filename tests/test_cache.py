@@ -0,0 +1,129 @@
+"""Program cache entries: reuse, invalidation, stale entry removal, trusted files and eviction"""
+import os
+import subprocess
+import sys
+from bim import cache
+from bim.main import parse_code
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write(path, source):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(source)
+    return str(path)
+
+def store(filename, source, cache_dir=None, **options):
+    ast, max_depth = parse_code(source)
+    assert cache.store_program(filename, source, ast, max_depth, cache_dir, **options)
+
+def cache_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(cache.CACHE_SUFFIX))
+
+def test_cached_program_runs_the_same(tmp_path, monkeypatch):
+    monkeypatch.delenv("BIM_CACHE_DIR", raising=False)
+    filename = write(tmp_path / "main.bim", "x = 2\nprint(x * 3)\n")
+    runs = [subprocess.run([sys.executable, "-m", "bim.main", filename], cwd=ROOT, capture_output=True, text=True)
+            for _ in range(2)]
+    assert [run.stdout for run in runs] == ["6.0\n", "6.0\n"]
+    assert len(cache_files(tmp_path / cache.CACHE_DIR_NAME)) == 1
+
+def test_bytecode_is_cached_per_variant(tmp_path, monkeypatch):
+    monkeypatch.delenv("BIM_CACHE_DIR", raising=False)
+    filename = write(tmp_path / "main.bim", "x = 2\nprint(x * 3)\n")
+    for options in (["--engine=vm"], ["--engine=vm", "-O"]) * 2:
+        run = subprocess.run([sys.executable, "-m", "bim.main", *options, filename], cwd=ROOT, capture_output=True, text=True)
+        assert run.stdout == "6.0\n"
+    variants = sorted(name[len("main.bim.") + 16:] for name in cache_files(tmp_path / cache.CACHE_DIR_NAME))
+    assert variants == sorted(variant + cache.CACHE_SUFFIX for variant in ("", ".vm", ".vm-O"))
+
+def test_entry_is_only_used_for_the_same_source(tmp_path, monkeypatch):
+    monkeypatch.delenv("BIM_CACHE_DIR", raising=False)
+    filename = write(tmp_path / "main.bim", "print(1)\n")
+    store(filename, "print(1)\n")
+    ast, max_depth = cache.load_program(filename, "print(1)\n")
+    assert max_depth == parse_code("print(1)\n")[1]
+    assert cache.load_program(filename, "print(2)\n") is None
+
+def test_new_version_replaces_stale_entry(tmp_path, monkeypatch):
+    monkeypatch.delenv("BIM_CACHE_DIR", raising=False)
+    filename = write(tmp_path / "main.bim", "print(1)\n")
+    store(filename, "print(1)\n")
+    store(filename, "print(2)\n")
+    directory = cache.cache_dir_for(filename)
+    assert directory == str(tmp_path / cache.CACHE_DIR_NAME)
+    assert len(cache_files(directory)) == 1
+    assert cache.load_program(filename, "print(1)\n") is None
+    assert cache.load_program(filename, "print(2)\n") is not None
+
+def test_shared_cache_dir_keeps_files_with_the_same_name_apart(tmp_path, monkeypatch):
+    shared = tmp_path / "shared"
+    monkeypatch.setenv("BIM_CACHE_DIR", str(shared))
+    first = write(tmp_path / "a" / "main.bim", "print(1)\n")
+    second = write(tmp_path / "b" / "main.bim", "print(2)\n")
+    for _ in range(2):
+        store(first, "print(1)\n")
+        store(second, "print(2)\n")
+        assert cache.load_program(first, "print(1)\n") is not None
+        assert cache.load_program(second, "print(2)\n") is not None
+    assert len(cache_files(shared)) == 2
+
+    #a new version of one file still replaces only that file's entry
+    store(first, "print(3)\n")
+    assert cache.load_program(first, "print(1)\n") is None
+    assert cache.load_program(second, "print(2)\n") is not None
+    assert len(cache_files(shared)) == 2
+
+def test_stale_entry_removal_leaves_other_files_alone(tmp_path):
+    filename = write(tmp_path / "main.bim", "print(1)\n")
+    store(filename, "print(1)\n", tmp_path)
+    cache.store_bytecode(filename, "print(1)\n", ".vm", b"code", tmp_path)
+    prefix = cache.entry_prefix(filename, tmp_path)
+    #same length as an entry's name, but not an entry of main.bim
+    bystander = tmp_path / (prefix + "not-a-source-key" + cache.CACHE_SUFFIX)
+    bystander.write_bytes(b"")
+    store(filename, "print(2)\n", tmp_path)
+    assert cache.load_program(filename, "print(1)\n", tmp_path) is None
+    assert cache.load_bytecode(filename, "print(1)\n", ".vm", tmp_path) == b"code"
+    assert bystander.exists()
+
+def test_entries_others_could_have_written_are_not_loaded(tmp_path, monkeypatch):
+    filename = write(tmp_path / "main.bim", "print(1)\n")
+    store(filename, "print(1)\n", tmp_path)
+    [name] = cache_files(tmp_path)
+    path = tmp_path / name
+    assert cache.load_program(filename, "print(1)\n", tmp_path) is not None
+    os.chmod(path, 0o664)
+    assert cache.load_program(filename, "print(1)\n", tmp_path) is None
+    os.chmod(path, 0o644)
+    if hasattr(os, "getuid"):
+        monkeypatch.setattr(os, "getuid", lambda: path.stat().st_uid + 1)
+        assert cache.load_program(filename, "print(1)\n", tmp_path) is None
+
+def test_entries_are_stored_writable_by_the_owner_only(tmp_path):
+    old_umask = os.umask(0)
+    try:
+        filename = write(tmp_path / "main.bim", "print(1)\n")
+        store(filename, "print(1)\n", tmp_path)
+    finally:
+        os.umask(old_umask)
+    [name] = cache_files(tmp_path)
+    assert not (tmp_path / name).stat().st_mode & 0o022
+    assert cache.load_program(filename, "print(1)\n", tmp_path) is not None
+
+def test_corrupt_entry_is_ignored(tmp_path):
+    filename = write(tmp_path / "main.bim", "print(1)\n")
+    store(filename, "print(1)\n", tmp_path)
+    [name] = cache_files(tmp_path)
+    with open(tmp_path / name, "wb") as file:
+        file.write(cache.CACHE_MAGIC + b"not a pickle")
+    assert cache.load_program(filename, "print(1)\n", tmp_path) is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    for index in range(3):
+        filename = write(tmp_path / f"file{index}.bim", "print(1)\n")
+        store(filename, "print(1)\n", tmp_path)
+        os.utime(os.path.join(tmp_path, cache_files(tmp_path)[-1]), (index, index))
+    size = os.path.getsize(os.path.join(tmp_path, cache_files(tmp_path)[0]))
+    cache.evict(str(tmp_path), max_bytes=2 * size)
+    assert [name.split(".")[0] for name in cache_files(tmp_path)] == ["file1", "file2"]
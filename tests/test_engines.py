@@ -0,0 +1,156 @@
+"""Run bim programs on every engine and check they all print the expected output"""
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM_DIR = os.path.join("tests", "programs")
+
+ENGINES = ["tree", "closure", "vm", "transpile"]
+
+#each option set runs every sample program: as parsed, optimized and statement by statement
+OPTIONS = {
+    "plain": [],
+    "optimized": ["-O"],
+    "streamed": ["--stream"],
+}
+
+#tests/programs/<name>.bim prints tests/programs/<name>.out (ending with the error line if it fails)
+PROGRAMS = sorted(name[:-len(".bim")] for name in os.listdir(os.path.join(ROOT, PROGRAM_DIR)) if name.endswith(".bim"))
+
+NOT_NEEDS_PARENTHESES = "'not' after a sign or a comparison or arithmetic operator needs parentheses, e.g. -(not x)"
+
+#programs that fail, and the message every engine has to report
+ERRORS = {
+    "undefined variable": ("print(missing)", "Undefined variable: missing"),
+    "unknown function": ("nope(1)", "Unknown function: nope"),
+    "argument count": ("function f(a) {\n    return a\n}\nf(1, 2)", "Function 'f' expects 1 arguments, got 2"),
+    "caller's variable": ("function f() {\n    return hidden\n}\nfunction g() {\n    hidden = 1\n    return f()\n}\ng()",
+                          "Undefined variable: hidden"),
+    "break outside a loop": ("break", ""),
+    "break leaving the program": ("function f() {\n    break\n}\nf()", ""),
+    "return outside a function": ("return 5\nprint(1)", "5.0"),
+    "memo changing an argument": ("memo function f(a) {\n    a.push(1)\n    return 1\n}",
+                                  "Cannot memoize 'f': it changes its argument 'a'"),
+    "memo changing a global": ("g = [1]\nmemo function f() {\n    g[0] = 2\n    return 1\n}",
+                               "Cannot memoize 'f': it changes the global 'g'"),
+    "memo calling an impure function": ('function p() {\n    print(1)\n}\nfunction f() {\n    return p()\n}\nmemoize("f")',
+                                        "Cannot memoize 'f': it calls 'p', which calls print()"),
+    "memo calling an undefined function": ("memo function f() {\n    return later()\n}",
+                                           "Cannot memoize 'f': it calls 'later', which is not defined yet"),
+    "typed array element": ('a = zeros(2)\na[0] = "x"', "Typed arrays only hold numbers"),
+    "typed array lengths": ("print(from([1]) + from([1, 2]))", "Typed arrays have different lengths (1 and 2)"),
+    "unknown callback": ('print([1].map("nope"))', "Unknown function: nope"),
+    "sorting mixed types": ('print([1, "a"].sort())', "sort() cannot compare values of different types"),
+    "empty reduce": ('function add(a, b) {\n    return a + b\n}\nprint([].reduce("add"))',
+                     "reduce() of an empty array with no initial value"),
+    "memo sorting an argument": ("memo function f(a) {\n    a.sort()\n    return 1\n}",
+                                 "Cannot memoize 'f': it changes its argument 'a'"),
+    "memo with an impure callback": ('function g(x) {\n    print(x)\n    return x\n}\nmemo function f(a) {\n    return [a].map("g")\n}',
+                                     "Cannot memoize 'f': it calls 'g', which calls print()"),
+    "string builder method": ("b = builder()\nb.pop()", "String builder has no method 'pop'"),
+    "memo appending to an argument": ('memo function f(b) {\n    b.append("x")\n    return 1\n}',
+                                      "Cannot memoize 'f': it changes its argument 'b'"),
+    "string to number": ('print("x".to_number())', "Cannot convert 'x' to a number"),
+    "unknown string method": ('print("abc".nope())', "String has no method 'nope'"),
+    "split separator": ('print("abc".split(1))', "split() takes a string"),
+    "negative repeat": ('print("ab".repeat(-1))', "repeat() count must be a non-negative number"),
+    "missing map key": ('m = {"a": 1}\nprint(m["b"])', "Key not found: 'b'"),
+    "mutable map key": ("m = {}\nm[[1]] = 2", "Map keys and set elements must be numbers, strings, booleans or ranges, not list"),
+    "unterminated f-string": ('print(f"{x")', "Unterminated f-string"),
+    "not after a sign": ("print(- not 0)", NOT_NEEDS_PARENTHESES),
+    "not after a comparison": ("print(1 == !0)", NOT_NEEDS_PARENTHESES),
+    "not after arithmetic": ("x = 1\nprint(x * not x)", NOT_NEEDS_PARENTHESES),
+    "missing operand": ("print(1 +)", "Unexpected token: TokenType.RPAREN"),
+    "unclosed parenthesis": ("x = (1 + 2\nprint(x)", "Expected TokenType.RPAREN, got TokenType.NEWLINE"),
+}
+
+def run_bim(path, engine, *options):
+    """(stdout, exit code) of running a .bim file (relative to the repository root) on an engine"""
+    result = subprocess.run([sys.executable, "-m", "bim.main", "--no-cache", f"--engine={engine}", *options, path],
+                            cwd=ROOT, capture_output=True, text=True, timeout=120)
+    return result.stdout, result.returncode
+
+def read(path):
+    with open(os.path.join(ROOT, path), encoding="utf-8") as file:
+        return file.read()
+
+@pytest.mark.parametrize("options", list(OPTIONS), ids=list(OPTIONS))
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_sample_program(program, engine, options):
+    path = os.path.join(PROGRAM_DIR, f"{program}.bim")
+    expected = read(os.path.join(PROGRAM_DIR, f"{program}.out"))
+    output, code = run_bim(path, engine, *OPTIONS[options])
+    assert output == expected
+    assert code == (1 if "Error in " in expected else 0)
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("case", list(ERRORS))
+def test_error(case, engine, tmp_path):
+    source, message = ERRORS[case]
+    path = tmp_path / "error.bim"
+    path.write_text(source + "\n")
+    output, code = run_bim(str(path), engine)
+    assert output == f"Error in {path}: {message}\n"
+    assert code == 1
+
+#deeper than DEEP_EXPRESSION_DEPTH, so these are parsed and evaluated without recursion
+DEEP_EXPRESSIONS = {
+    "parentheses": ("(" * 3000 + "1" + " + 1)" * 3000, "3001.0"),
+    "operator chain": (" + ".join(["1"] * 100000), "100000.0"),
+    "arrays": ("[" * 3000 + "7" + "]" * 3000 + "[0]" * 3000, "7.0"),
+    "calls": ("abs(" * 3000 + "-2" + ")" * 3000, "2.0"),
+    "and chain": (" and ".join(["1"] * 3000), "1.0"),
+}
+
+@pytest.mark.parametrize("options", list(OPTIONS), ids=list(OPTIONS))
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("case", list(DEEP_EXPRESSIONS))
+def test_deeply_nested_expression(case, engine, options, tmp_path):
+    expression, printed = DEEP_EXPRESSIONS[case]
+    path = tmp_path / "deep.bim"
+    path.write_text(f"x = {expression}\nprint(x)\n")
+    assert run_bim(str(path), engine, *OPTIONS[options]) == (printed + "\n", 0)
+
+REC = "function rec(n){\n    if(n < 1){\n        return 0\n    }\n    return n + rec(n - 1)\n}\n"
+COUNT = "function count(n, acc){\n    if(n < 1){\n        return acc\n    }\n    return count(n - 1, acc + 1)\n}\n"
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_recursion_depth(engine, tmp_path):
+    #as deep as the original tree walker could recurse under Python's default recursion limit
+    path = tmp_path / "recursion.bim"
+    path.write_text(REC + "print(rec(108))\n")
+    assert run_bim(str(path), engine) == ("5886.0\n", 0)
+
+@pytest.mark.parametrize("engine", [engine for engine in ENGINES if engine != "vm"])
+def test_deep_recursion_points_to_the_vm(engine, tmp_path):
+    path = tmp_path / "recursion.bim"
+    path.write_text(REC + "print(rec(100000))\n")
+    assert run_bim(str(path), engine) == (f"Error in {path}: maximum recursion depth exceeded (the {engine} engine nests "
+                                          f"bim calls on Python's stack, so deep recursion needs --engine=vm)\n", 1)
+
+def test_vm_recursion_is_not_limited_by_python(tmp_path):
+    path = tmp_path / "recursion.bim"
+    path.write_text(REC + COUNT + "print(rec(100000), count(200000, 0))\n")
+    assert run_bim(str(path), "vm") == ("5000050000.0 200000.0\n", 0)
+    assert run_bim(str(path), "vm", "--max-depth=1000") == (f"Error in {path}: maximum recursion depth exceeded (1000 nested calls)\n", 1)
+
+def test_vm_tail_calls_reuse_their_frame(tmp_path):
+    path = tmp_path / "tail.bim"
+    path.write_text(COUNT + "print(count(200000, 0))\n")
+    assert run_bim(str(path), "vm", "--max-depth=50") == ("200000.0\n", 0)
+
+@pytest.mark.parametrize("engine", [engine for engine in ENGINES if engine != "vm"])
+def test_max_depth_is_only_for_the_vm(engine, tmp_path):
+    path = tmp_path / "recursion.bim"
+    path.write_text(REC + "print(rec(5))\n")
+    assert run_bim(str(path), engine, "--max-depth=50") == ("", 2)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_quicken_stats_is_only_for_the_tree_walker(engine, tmp_path):
+    path = tmp_path / "add.bim"
+    path.write_text("print(1 + 2)\n")
+    expected = ("3.0\n", 0) if engine == "tree" else ("", 2)
+    assert run_bim(str(path), engine, "--quicken-stats") == expected
@@ -0,0 +1,69 @@
+"""Interpreter internals: visitor dispatch, quickened binary operators and host iterators"""
+import pytest
+from bim.ast_nodes import BinaryOpNode, NumberNode, StringNode, OP_PLUS
+from bim.closure_engine import ClosureInterpreter
+from bim.interpreter import Interpreter, MAX_SPECIALIZATIONS, QUICKEN_AFTER
+from bim.lexer import Lexer
+from bim.parser import Parser
+from bim.transpiler import TranspilingInterpreter
+from bim.vm import VirtualMachine
+
+def test_visitors_are_resolved_once_per_class():
+    interpreter = Interpreter()
+    node = BinaryOpNode(NumberNode(1), OP_PLUS, NumberNode(2))
+    assert interpreter.visit(node) == 3.0
+    assert interpreter.dispatch[BinaryOpNode] == interpreter.visit_BinaryOpNode
+    assert interpreter.dispatch[NumberNode] == interpreter.visit_NumberNode
+    assert interpreter.visit(2.5) == 2.5
+
+def test_subclass_visitors_are_used():
+    class Shouting(Interpreter):
+        def visit_StringNode(self, node):
+            return node.value.upper()
+    assert Shouting().visit(StringNode("hi")) == "HI"
+
+def test_unknown_node():
+    with pytest.raises(Exception, match="No visit method for object"):
+        Interpreter().visit(object())
+
+def test_explicit_stack_replaces_resolved_visitors():
+    interpreter = Interpreter()
+    interpreter.visit(NumberNode(1))
+    interpreter.enable_explicit_stack()
+    assert not interpreter.dispatch
+    assert interpreter.visit(BinaryOpNode(NumberNode(1), OP_PLUS, NumberNode(2))) == 3.0
+    assert interpreter.dispatch[BinaryOpNode] == interpreter.evaluate
+
+ADD = "function add(a, b){\n    return a + b\n}\n"
+
+def quickening_report(source):
+    interpreter = Interpreter()
+    interpreter.run(Parser(Lexer(source).tokenize()).parse_program())
+    return interpreter.quickening_report()
+
+def calls(arguments, count):
+    """A loop calling add() count times with the same arguments"""
+    return f"for(i in range({count})){{\n    add({arguments})\n}}\n"
+
+def test_site_specializes_once_its_types_are_stable():
+    report = quickening_report(ADD + calls("1, 2", 20))
+    assert report == [f"a + b: specialized for float, float, {20 - QUICKEN_AFTER} hits, {QUICKEN_AFTER} misses"]
+
+def test_guard_failure_goes_back_to_the_generic_path():
+    report = quickening_report(ADD + calls("1, 2", QUICKEN_AFTER) + calls('"a", "b"', QUICKEN_AFTER - 1))
+    assert report == [f"a + b: generic, 0 hits, {2 * QUICKEN_AFTER - 1} misses"]
+
+def test_site_with_unstable_types_stays_generic():
+    rounds = calls("1, 2", QUICKEN_AFTER + 1) + calls('"a", "b"', QUICKEN_AFTER + 1)
+    report = quickening_report(ADD + rounds * MAX_SPECIALIZATIONS + calls("1, 2", 20))
+    assert report[0].startswith("a + b: generic (too many operand types)")
+
+@pytest.mark.parametrize("engine", [Interpreter, ClosureInterpreter, VirtualMachine, TranspilingInterpreter],
+                         ids=lambda engine: engine.__name__)
+def test_host_iterators_can_be_looped_over(engine, capsys):
+    interpreter = engine()
+    interpreter.builtin_functions['evens'] = lambda args: (x * 2 for x in range(int(args[0])))
+    interpreter.run(Parser(Lexer("for(i in evens(3)){\n    print(i)\n}\n"
+                                 "function total(n){\n    t = 0\n    for(i in evens(n)){\n        t = t + i\n    }\n    return t\n}\n"
+                                 "print(total(3), total(4))\n").tokenize()).parse_program())
+    assert capsys.readouterr().out == "0\n2\n4\n6.0 12.0\n"
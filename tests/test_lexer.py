@@ -0,0 +1,105 @@
+"""Both lexer backends have to produce the same tokens and errors"""
+import os
+import pytest
+from bim.bim_token import TokenType
+from bim.lexer import Lexer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAM_DIR = os.path.join(ROOT, "tests", "programs")
+PROGRAMS = sorted(name for name in os.listdir(PROGRAM_DIR) if name.endswith(".bim"))
+
+BACKENDS = ["regex", "char"]
+
+SNIPPETS = {
+    "else if": "if(a){\n} else   if(b){\n} else{\n}",
+    "semicolon": "x = 1; y = 2",
+    "escapes": 'print("a\\tb\\n\\"c\\" \\q")',
+    "operators": "a<=b>=c==d!=e<f>g=[h,i].j(k*l/m-n+o)",
+    "numbers": "1 2.5 300\n\n  x",
+    "logical": "a and b or not c && d || !e != f\nandx notx",
+    "f-strings": 'f"a{x}b" f"{y + 1}" f"\\{q\\}" f""',
+    "f-string braces": 'f"{ {"a": 1}["a"] }{{"}": f"{ {2: 3}[2] }"}}" x',
+}
+
+#source, message and the backends that report it (the character scanner never gets past an unknown character)
+ERRORS = {
+    "invalid character": ("x = 1 @ 2", "Invalid character: @", ["regex"]),
+    "unterminated string": ('print("abc)', "Unterminated string literal", BACKENDS),
+    "unterminated f-string": ('print(f"{x")', "Unterminated f-string", BACKENDS),
+    "unclosed brace in an f-string": ('print(f"{ {1: 2}")', "Unterminated f-string", BACKENDS),
+}
+
+def lex(source, backend):
+    """(type, value) of every token up to and including the first EOF"""
+    lexer = Lexer(source, backend=backend)
+    tokens = []
+    while True:
+        token = lexer.get_next_token()
+        tokens.append((token.type, token.value))
+        if token.type == TokenType.EOF:
+            return tokens
+
+def read(name):
+    with open(os.path.join(PROGRAM_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_backends_agree_on_programs(program):
+    source = read(program)
+    assert lex(source, "regex") == lex(source, "char")
+
+@pytest.mark.parametrize("case", list(SNIPPETS))
+def test_backends_agree_on_snippets(case):
+    assert lex(SNIPPETS[case], "regex") == lex(SNIPPETS[case], "char")
+
+def test_else_if_folds_into_elif():
+    types = [kind for kind, value in lex(SNIPPETS["else if"], "regex")]
+    assert types.count(TokenType.ELIF) == 1
+    assert types.count(TokenType.ELSE) == 1
+
+def test_semicolon_ends_the_input():
+    assert lex(SNIPPETS["semicolon"], "regex")[-1] == (TokenType.EOF, "")
+    assert len(lex(SNIPPETS["semicolon"], "regex")) == 4
+
+@pytest.mark.parametrize("case", list(ERRORS))
+def test_error(case):
+    source, message, backends = ERRORS[case]
+    for backend in backends:
+        with pytest.raises(Exception, match=message):
+            lex(source, backend)
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Lexer("x", backend="nope")
+
+def stream_tokens(source, backend):
+    return [(token.type, token.value) for token in Lexer(source, backend=backend).tokenize()]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_tokenize_matches_get_next_token(program, backend):
+    source = read(program)
+    assert stream_tokens(source, backend) == lex(source, backend)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_token_stream_is_compact(backend):
+    source = 'x = "a"\nprint(x, 12)'
+    stream = Lexer(source, backend=backend).tokenize()
+    assert stream.kinds.typecode == "B"
+    assert stream.offsets.typecode == "q"
+    assert [source[offset] for offset in stream.offsets[:3]] == ["x", "=", '"']
+    assert stream.kind(len(stream)) == TokenType.EOF
+    assert stream.token(0).value == "x"
+
+@pytest.mark.parametrize("use_mmap", [False, True], ids=["read", "mmap"])
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_streamed_file_lexes_like_the_whole_text(program, use_mmap):
+    #a tiny chunk size makes tokens straddle the sliding window
+    lexer = Lexer.from_file(os.path.join(PROGRAM_DIR, program), chunk_size=16, use_mmap=use_mmap)
+    tokens = []
+    while True:
+        token = lexer.get_next_token()
+        if token.type == TokenType.EOF:
+            break
+        tokens.append((token.type, token.value))
+    assert tokens == lex(read(program), "regex")[:-1]
@@ -0,0 +1,25 @@
+"""Memo caches: keys, LRU eviction and counters"""
+from bim.memo import MISSING, MemoCache
+
+def test_keys_keep_types_apart():
+    cache = MemoCache("f")
+    assert cache.key([1.0]) != cache.key([True])
+    assert cache.key([1.0, "a"]) == cache.key([1.0, "a"])
+
+def test_arrays_are_not_cached():
+    cache = MemoCache("f")
+    assert cache.key([[1.0]]) is None
+    key = cache.key([1.0])
+    cache.store(key, [1.0])
+    assert cache.lookup(key) is MISSING
+    assert cache.uncached == 2
+
+def test_least_recently_used_result_is_evicted():
+    cache = MemoCache("f", max_size=2)
+    for value in (1.0, 2.0):
+        cache.store(cache.key([value]), value * 10)
+    assert cache.lookup(cache.key([1.0])) == 10.0
+    cache.store(cache.key([3.0]), 30.0)
+    assert cache.lookup(cache.key([2.0])) is MISSING
+    assert cache.lookup(cache.key([1.0])) == 10.0
+    assert cache.report() == "f: 2 hits, 1 misses, 1 evictions, 0 uncached calls, 2/2 entries"
@@ -0,0 +1,44 @@
+"""What -O folds and removes, and that optimized programs still run the same"""
+from bim.ast_nodes import BinaryOpNode, BlockNode, NumberNode, StringNode
+from bim.interpreter import Interpreter
+from bim.lexer import Lexer
+from bim.optimizer import Optimizer
+from bim.parser import Parser
+
+def optimize(source):
+    """(optimizer, optimized program) for some bim source"""
+    optimizer = Optimizer()
+    ast = Parser(Lexer(source).tokenize()).parse_program()
+    return optimizer, optimizer.optimize(ast)
+
+def run(ast, capsys):
+    Interpreter().run(ast)
+    return capsys.readouterr().out
+
+def test_constants_are_folded():
+    optimizer, ast = optimize('x = 2 * 3 + 1\ny = "a" + "b"\nz = 1 < 2\n')
+    values = [statement.value for statement in ast.statements]
+    assert isinstance(values[0], NumberNode) and values[0].value == 7.0
+    assert isinstance(values[1], StringNode) and values[1].value == "ab"
+    assert values[2].value is True
+    assert optimizer.stats['folded'] == 4
+
+def test_errors_are_left_for_run_time():
+    optimizer, ast = optimize("x = 1 / 0\n")
+    assert isinstance(ast.statements[0].value, BinaryOpNode)
+    assert optimizer.stats['folded'] == 0
+
+def test_dead_code_is_removed(capsys):
+    optimizer, ast = optimize('if(1 > 2){\n    print("no")\n} else if(true){\n    print("yes")\n} else{\n    print("never")\n}\n'
+                              'while(false){\n    print("loop")\n}\n'
+                              'function f(){\n    return 1\n    print("after")\n}\n')
+    assert optimizer.stats['branches_removed'] == 2
+    assert optimizer.stats['loops_removed'] == 1
+    assert optimizer.stats['unreachable_removed'] == 1
+    assert isinstance(ast.statements[0], BlockNode)
+    assert run(ast, capsys) == "yes\n"
+
+def test_constant_arrays_are_copied(capsys):
+    optimizer, ast = optimize("function f(){\n    a = [1, 2]\n    a.push(3)\n    return a\n}\nprint(f(), f())\n")
+    assert optimizer.stats['arrays_precomputed'] == 1
+    assert run(ast, capsys) == "[1.0, 2.0, 3.0] [1.0, 2.0, 3.0]\n"
@@ -0,0 +1,52 @@
+"""Which functions the transpile engine runs as Python, and what it generates"""
+from bim.lexer import Lexer
+from bim.parser import Parser
+from bim.transpiler import TranspiledFunction, TranspilingInterpreter
+
+def run(source):
+    """The interpreter after running some bim source on the transpile engine"""
+    interpreter = TranspilingInterpreter()
+    interpreter.run(Parser(Lexer(source).tokenize()).parse_program())
+    return interpreter
+
+def transpiled(interpreter):
+    """function name -> True if it runs as Python, else the reason it does not"""
+    return {name: isinstance(result, TranspiledFunction) or result
+            for (name, body), result in interpreter.transpiled.items()}
+
+def test_hot_functions_are_transpiled(capsys):
+    interpreter = run("function square(x) {\n    return x * x\n}\n"
+                      "function once(x) {\n    return x\n}\n"
+                      "print(square(3), square(4), once(5))\n")
+    assert capsys.readouterr().out == "9.0 16.0 5.0\n"
+    assert transpiled(interpreter) == {"square": True}
+
+def test_calls_to_user_functions_are_transpiled(capsys):
+    interpreter = run("function one() {\n    return 1\n}\n"
+                      "function two() {\n    return one() + one()\n}\n"
+                      "print(two(), two())\n")
+    assert capsys.readouterr().out == "2.0 2.0\n"
+    assert transpiled(interpreter) == {"one": True, "two": True}
+
+def test_break_outside_a_loop_falls_back(capsys):
+    interpreter = run("function stop(x) {\n    if (x > 1) {\n        break\n    }\n    return x\n}\n"
+                      "for (i in range(5)) {\n    print(stop(i))\n}\n")
+    assert capsys.readouterr().out == "0\n1\n"
+    assert transpiled(interpreter)["stop"] == "break/continue outside a loop"
+
+def test_shadowed_builtin_disables_the_translation(capsys):
+    run("function size(x) {\n    return len(x)\n}\n"
+        "print(size(\"ab\"), size(\"abc\"))\n"
+        "function len(x) {\n    return 0\n}\n"
+        "print(size(\"ab\"))\n")
+    assert capsys.readouterr().out == "2 3\n0.0\n"
+
+def test_emit_program_lists_every_function():
+    interpreter = TranspilingInterpreter()
+    ast = Parser(Lexer("function f(a) {\n    return a + 1\n}\nfunction g() {\n    function h() {\n        return 1\n    }\n"
+                       "    return f(1)\n}\n").tokenize()).parse_program()
+    lines = interpreter.transpiler.emit_program(ast)
+    assert lines[0] == "# f(a)"
+    assert "def f_f(v_a):" in lines
+    assert "# g(): not transpiled, nested function definition" in lines
+    assert "# h()" in lines
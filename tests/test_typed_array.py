@@ -0,0 +1,52 @@
+"""NumberArray on each storage backend: NumPy when installed, array('d') always"""
+import pytest
+from bim import typed_array
+from bim.typed_array import NumberArray
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BACKENDS = ["array"] + (["numpy"] if numpy is not None else [])
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setattr(typed_array, "numpy", numpy if request.param == "numpy" else None)
+    return request.param
+
+def test_elementwise_arithmetic(backend):
+    a = NumberArray.from_values([1.0, 2.0, 4.0])
+    assert (a * 2 + 1).tolist() == [3.0, 5.0, 9.0]
+    assert (1 - a).tolist() == [0.0, -1.0, -3.0]
+    assert (a / a).tolist() == [1.0, 1.0, 1.0]
+    assert (-a).tolist() == [-1.0, -2.0, -4.0]
+    assert (a.sum(), a.mean(), a.dot(a)) == (7.0, 7.0 / 3, 21.0)
+
+def test_elements_are_python_floats(backend):
+    a = NumberArray.zeros(2)
+    a[1] = 3
+    assert [type(value) for value in a] == [float, float]
+    assert a[1] == 3.0
+
+def test_push_pop_and_insert(backend):
+    a = NumberArray.full(2, 0.5)
+    for value in range(100):
+        a.append(value)
+    assert len(a) == 102
+    assert a.pop() == 99.0
+    a.insert(0, 7)
+    assert a.tolist()[:3] == [7.0, 0.5, 0.5]
+
+def test_errors(backend):
+    a = NumberArray.from_values([1.0, 0.0])
+    with pytest.raises(Exception, match="Division by zero!"):
+        a / a
+    with pytest.raises(Exception, match="Division by zero!"):
+        1 / a
+    with pytest.raises(Exception, match="different lengths"):
+        a + NumberArray.zeros(3)
+    with pytest.raises(Exception, match="Typed arrays only hold numbers"):
+        NumberArray.from_values([True])
+    with pytest.raises(Exception, match="mean"):
+        NumberArray.zeros(0).mean()